@@ -0,0 +1,152 @@
+"""
+IP allowlist for the UltraDNS telemetry endpoints.
+
+The allowed addresses and CIDR ranges are compiled once into sorted,
+non-overlapping integer intervals per IP version, so checking an address is a
+binary search. X-Forwarded-For is only honoured for hops added by trusted
+proxies (e.g. Traefik), so a client cannot allow itself by sending the header.
+"""
+import bisect
+import ipaddress
+import logging
+import os
+import time
+from functools import lru_cache
+
+# Private and loopback ranges: the reverse proxy in front of the backend
+DEFAULT_TRUSTED_PROXIES = (
+    "127.0.0.0/8", "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "::1/128", "fc00::/7",
+)
+
+
+@lru_cache(maxsize=4096)
+def parse_address(text):
+    """
+    Return (version, integer) for an IP address string, or None if it is not
+    one. IPv4-mapped IPv6 addresses are treated as IPv4.
+    """
+    try:
+        address = ipaddress.ip_address(text.strip())
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.version, int(address)
+
+
+def parse_entries(lines):
+    """
+    Parse addresses and CIDR ranges, one per item. Blank items and `#`
+    comments are skipped; invalid entries raise ValueError.
+    """
+    networks = []
+    for line in lines:
+        entry = line.split("#", 1)[0].strip()
+        if not entry:
+            continue
+        network = ipaddress.ip_network(entry, strict=False)
+        mapped = network.network_address.ipv4_mapped if network.version == 6 else None
+        if mapped is not None and network.prefixlen >= 96:
+            network = ipaddress.ip_network(f"{mapped}/{network.prefixlen - 96}")
+        networks.append(network)
+    return networks
+
+
+class NetworkSet:
+    """
+    A set of IP networks supporting O(log n) membership tests of addresses
+    returned by parse_address().
+    """
+
+    def __init__(self, networks):
+        self._starts = {4: [], 6: []}
+        self._ends = {4: [], 6: []}
+        intervals = sorted(
+            (network.version, int(network.network_address), int(network.broadcast_address))
+            for network in networks
+        )
+        for version, start, end in intervals:
+            starts, ends = self._starts[version], self._ends[version]
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+
+    def __len__(self):
+        return len(self._starts[4]) + len(self._starts[6])
+
+    def __contains__(self, parsed):
+        if parsed is None:
+            return False
+        version, value = parsed
+        position = bisect.bisect_right(self._starts[version], value) - 1
+        return position >= 0 and value <= self._ends[version][position]
+
+
+class IpFilter:
+    """
+    Decides whether a request comes from an allowed address.
+
+    - `allowed` are the allowed addresses/CIDR ranges, used unless `path`
+      is given.
+    - `path` is a file with one entry per line. It is re-read when its
+      modification time changes, checked at most every `reload_interval`
+      seconds; a file that fails to parse keeps the previous list.
+    - `trusted_proxies` are the networks whose X-Forwarded-For hops are
+      believed.
+    - `logger` receives per-request details at DEBUG level.
+    """
+
+    def __init__(self, allowed=(), trusted_proxies=DEFAULT_TRUSTED_PROXIES, path=None,
+                 reload_interval=5.0, logger=None, clock=time.monotonic):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.clock = clock
+        self.trusted = NetworkSet(parse_entries(trusted_proxies))
+        self.allowed = NetworkSet(parse_entries(allowed))
+        self._mtime = None
+        self._next_check = 0.0
+        if path:
+            self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                allowed = NetworkSet(parse_entries(f))
+        except (OSError, ValueError) as e:
+            self.logger.error("Could not load IP allowlist %s: %s", self.path, e)
+            return
+        self.allowed = allowed
+        self._mtime = mtime
+        self.logger.info("Loaded %d allowed networks from %s", len(allowed), self.path)
+
+    def client_ip(self, remote_addr, forwarded_for=None):
+        """
+        The address of the client: the rightmost X-Forwarded-For hop not added
+        by a trusted proxy, or remote_addr when it is not a trusted proxy.
+        """
+        if not forwarded_for or parse_address(remote_addr or "") not in self.trusted:
+            return remote_addr
+        hops = forwarded_for.split(",")
+        for hop in reversed(hops):
+            hop = hop.strip()
+            if parse_address(hop) not in self.trusted:
+                return hop
+        return hops[0].strip()
+
+    def allows(self, remote_addr, forwarded_for=None):
+        if self.path and self.clock() >= self._next_check:
+            self._next_check = self.clock() + self.reload_interval
+            self._reload()
+
+        client_ip = self.client_ip(remote_addr, forwarded_for)
+        allowed = parse_address(client_ip or "") in self.allowed
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("IP filter: remote_addr=%s X-Forwarded-For=%s client=%s allowed=%s",
+                              remote_addr, forwarded_for, client_ip, allowed)
+        return allowed
@@ -1,35 +1,80 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, Response, request, jsonify, session
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from dotenv import load_dotenv
 from datetime import datetime
+import functools
+import hmac
+import json
 import os
-import requests
+import signal
+import sys
+import threading
 import uuid
 import sqlalchemy
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from allowlist import DEFAULT_TRUSTED_PROXIES, IpFilter
+from breaker import STATES, Breakers
+from cache import ConnectionCache, ConnectionInfo
+from dedup import DedupIndex
+from delivery import DeliveryQueue
+from history import EventHistory
+from ingest import Batch, InvalidPayload, read_payload, summarize, validate_events, without_repeats
+from keyfile import load_or_create_secrets
+import logs
+from metrics import (
+    CIRCUIT_FAILURES, CIRCUIT_STATE, CONTENT_TYPE, DUPLICATES, EVENTS_RECEIVED, INGEST_SECONDS, NOTIFICATIONS,
+    RENDER_SECONDS, ScrapedGauge, expose, merged, token_label
+)
+from migrations import migrate, pending
+from models import (
+    db, DATA_DIR, OutboxEvent, Route, Setting, User, WebhookConnection, configure_sqlite, database_uri,
+    sqlite_connect_args
+)
+from outbox import Outbox, RetryScheduler
+from platforms import Platforms
+from ratelimit import SharedTokenBucket
+from readiness import Readiness
+from renderer import DEFAULT_TEMPLATES, Renderer
+from routing import Destination, RouteTable, connection_token, route_key, validate_filters
+from shutdown import Shutdown
+from status import StatusBoard
+from transport import HttpTransport
 
 # Load .env file
 load_dotenv()
 
+# Configure logging before Flask sets up app.logger, so it goes through the queue too
+logs.configure(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    levels=logs.parse_levels(os.getenv("LOG_LEVELS")),
+    debug_sample=float(os.getenv("LOG_DEBUG_SAMPLE", "1")),
+    fmt=os.getenv("LOG_FORMAT", "json"),
+    queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+)
+
 app = Flask(__name__)
 CORS(app)
 
-# Key for sessions 
-app.secret_key = os.urandom(32).hex()
-
 # Configure SQLite database in the /data folder
-os.makedirs('data', exist_ok=True)
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# Session key and frontend API token are shared by all worker processes
+app_secrets = load_or_create_secrets(os.getenv("SECRETS_FILE", os.path.join(DATA_DIR, "secrets.json")))
+
+# Key for sessions
+app.secret_key = app_secrets["secret_key"]
 
-# Absolute path for the database
-base_dir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{base_dir}/data/data.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {"connect_args": sqlite_connect_args()}
 
-db = SQLAlchemy(app)
+db.init_app(app)
 
-# Generate an internal API token for the frontend to use
-INTERNAL_API_TOKEN = os.urandom(32).hex()
-print(f"Generated frontend API Token: {INTERNAL_API_TOKEN}", flush=True)  # Log this for the frontend
+# Internal API token for the frontend to use
+INTERNAL_API_TOKEN = app_secrets["api_token"]
 
 # Determine if IP filtering is enabled
 FILTER_IPS = os.getenv("FILTER_IPS", "false").lower() == "true"
@@ -52,77 +97,388 @@ def is_request_from_frontend():
     api_token = request.headers.get("X-Api-Token")
     return api_token == INTERNAL_API_TOKEN
 
-def is_request_from_allowed_ips():
+# Allowlist compiled once at startup. ALLOWED_IPS_FILE is reloaded when it changes.
+ip_filter = IpFilter(
+    allowed=os.getenv("ALLOWED_IPS", ",".join(ALLOWED_ULTRADNS_IPS)).split(","),
+    trusted_proxies=os.getenv("TRUSTED_PROXIES", ",".join(DEFAULT_TRUSTED_PROXIES)).split(","),
+    path=os.getenv("ALLOWED_IPS_FILE"),
+)
+
+def is_request_from_allowed_ips(client_ip=None, forwarded_for=None):
     """
     Conditionally check if the request comes from allowed UltraDNS IPs.
     - If IP filtering is disabled (FILTER_IPS=False), always return True.
-    - If enabled (FILTER_IPS=True), apply the X-Forwarded-For and client IP checks.
+    - If enabled (FILTER_IPS=True), check the client IP, taking X-Forwarded-For
+      into account when the request came through a trusted proxy.
+    Outside a Flask request (the ASGI ingest path), pass the client IP and
+    X-Forwarded-For header.
     """
     if not FILTER_IPS:
-        print("IP filtering is disabled. Allowing all requests.", flush=True)
         return True
-
-    # IP filtering logic
-    client_ip = request.remote_addr
-    headers = {key: value for key, value in request.headers.items()}
-
-    # Log headers and client IP for debugging
-    print(f"Client IP (remote_addr): {client_ip}", flush=True)
-    print(f"Request Headers: {headers}", flush=True)
-
-    # Check if the X-Forwarded-For header exists
-    x_forwarded_for = request.headers.get("X-Forwarded-For")
-    if x_forwarded_for:
-        # Extract the list of IPs from the header
-        ip_list = [ip.strip() for ip in x_forwarded_for.split(",")]
-        print(f"X-Forwarded-For IPs: {ip_list}", flush=True)
-
-        # Check if any IP in the list matches the allowed IPs
-        if any(ip in ALLOWED_ULTRADNS_IPS for ip in ip_list):
-            print("Request is from an allowed IP (via X-Forwarded-For).", flush=True)
-            return True
-    else:
-        # Fallback: check the client IP (remote_addr)
-        if client_ip in ALLOWED_ULTRADNS_IPS:
-            print("Request is from an allowed IP (via remote_addr).", flush=True)
-            return True
-
-    # If no match found
-    print("Request is NOT from an allowed IP.", flush=True)
-    return False
+    if client_ip is None:
+        client_ip = request.remote_addr
+        forwarded_for = request.headers.get("X-Forwarded-For")
+    return ip_filter.allows(client_ip, forwarded_for)
+
+# Prometheus metrics are public unless METRICS_PUBLIC=false, then they need METRICS_TOKEN as a bearer
+# token (never the frontend's API token, which /api/init hands out); set METRICS_PATH empty to disable them
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "true").lower() == "true"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Readiness probe, served without the API token; READY_PATH empty disables it
+READY_PATH = os.getenv("READY_PATH", "/ready")
+PUBLIC_PATHS = {path for path in (READY_PATH,) if path}
+
+def is_metrics_request_allowed():
+    """
+    Whether metrics may be served: with METRICS_PUBLIC, or to a request
+    carrying METRICS_TOKEN as a bearer token (what Prometheus sends with
+    `authorization` in its scrape config).
+    """
+    if METRICS_PUBLIC:
+        return True
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    return bool(METRICS_TOKEN) and scheme.lower() == "bearer" and hmac.compare_digest(credentials, METRICS_TOKEN)
 
 # Apply access control to internal API endpoints
 @app.before_request
 def restrict_access():
+    if request.path in PUBLIC_PATHS:
+        return
+
+    if METRICS_PATH and request.path == METRICS_PATH:
+        if not is_metrics_request_allowed():
+            return jsonify({"error": "Forbidden"}), 403
+        return
+
     # Protect internal endpoints
     if request.path.startswith(('/api/status', '/api/login', '/api/logout', '/api/setup', '/api/webhooks')):
         if not is_request_from_frontend():
             return jsonify({"error": "Forbidden"}), 403
 
     # Protect external endpoints
-    if request.path.startswith(('/api/slack', '/api/teams')):
+    if request.path.startswith(INGEST_PREFIXES):
         if not is_request_from_allowed_ips():
             return jsonify({"error": "Forbidden"}), 403
 
-# Setup global
-setup_complete = False
+# The schema is migrated by the gunicorn master or `python migrations.py`; a
+# standalone app (development server, benchmarks) applies pending migrations here
+with app.app_context():
+    configure_sqlite(db.engine)
+    migrate(db.engine)
+
+# Setup and webhook state served from memory; worker processes signal changes through the marker file
+status_board = StatusBoard(app, path=os.path.join(DATA_DIR, "status.marker"))
 
-# Define models
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(50), unique=True, nullable=False)
-    password = db.Column(db.String(255), nullable=False)
+def get_setup_complete():
+    """
+    Whether UltraDNS test telemetry has completed the setup. Kept in the
+    database so every worker process sees the same value.
+    """
+    return status_board.get("setup_complete")
 
-class WebhookConnection(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    type = db.Column(db.String(20), nullable=False)  # e.g., 'teams', 'slack', 'discord'
-    token = db.Column(db.String(100), unique=True, nullable=False)
-    webhook_url = db.Column(db.String(500), nullable=False)
-    status = db.Column(db.String(20), nullable=False)  # e.g., 'pending', 'verified'
+def set_setup_complete(value):
+    if get_setup_complete() != value:
+        db.session.merge(Setting(key='setup_complete', value='true' if value else 'false'))
+        db.session.commit()
+        status_board.update(setup_complete=value)
+
+def load_connection(token):
+    """
+    Load a webhook connection snapshot, with its compiled routes, for the
+    connection cache.
+    """
+    with app.app_context():
+        connection = WebhookConnection.query.filter_by(token=token).first()
+        if connection is None:
+            return None
+        routes = Route.query.filter_by(connection_id=connection.id).order_by(Route.id).all()
+        table = RouteTable(
+            [(Destination(connection.token, connection.type, connection.webhook_url), {})]
+            + [(Destination(route_key(token, route.id), route.type, route.webhook_url), route.filters)
+               for route in routes]
+        )
+        return ConnectionInfo(connection.id, connection.type, connection.token,
+                              connection.webhook_url, connection.status, table)
+
+# Verified connections are served from memory on the telemetry hot path; the
+# status marker tells every process when another one changed a connection
+connection_cache = ConnectionCache(
+    load_connection,
+    ttl=float(os.getenv("CONNECTION_CACHE_TTL", "60")),
+    max_size=int(os.getenv("CONNECTION_CACHE_SIZE", "1024")),
+    generation=status_board.marker,
+)
+
+def verification_statements(connection):
+    """
+    Statements that flag a connection as verified by UltraDNS test telemetry
+    and complete the setup (the frontend moves on to the dashboard). They are
+    committed together with the outbox rows of the payload.
+    """
+    statements = [
+        sqlite_insert(Setting).values(key='setup_complete', value='true')
+        .on_conflict_do_update(index_elements=[Setting.key], set_={"value": "true"})
+    ]
+    if connection.status != "verified":
+        statements.append(
+            update(WebhookConnection).where(WebhookConnection.token == connection.token).values(status="verified"))
+    return statements
 
-# Create database tables if they don't exist
+def resolve_destination(key):
+    """
+    Look up where a delivery job should be posted now, or None if its
+    connection or route was removed.
+    """
+    connection = connection_cache.get(connection_token(key))
+    return connection.routes.get(key) if connection is not None else None
+
+# Repeats of recently accepted events (UltraDNS retries) are dropped before rendering
+dedup = DedupIndex(
+    max_size=int(os.getenv("DEDUP_MAX_EVENTS", "100000")),
+    window=float(os.getenv("DEDUP_WINDOW", "86400")),
+    app=app if os.getenv("DEDUP_PERSIST", "true").lower() == "true" else None,
+)
+
+# Message templates are compiled once; MESSAGE_TEMPLATES can override them per platform
+renderer = Renderer.from_files(DEFAULT_TEMPLATES, os.getenv("MESSAGE_TEMPLATES"))
+
+# Services notifications can be posted to, each with its ingest endpoint /api/<platform>/<token>.
+# An event too large for one message is split into at most SPLIT_MAX_MESSAGES.
+platforms = Platforms(renderer, max_parts=int(os.getenv("SPLIT_MAX_MESSAGES", "10")))
+INGEST_PREFIXES = tuple(f"/api/{name}/" for name in platforms.names())
+
+# Ingest bodies above MAX_PAYLOAD_BYTES are refused with 413; those above
+# STREAM_PARSE_BYTES are parsed as they are read, and each event keeps at most
+# MAX_EVENT_CHANGES of its detail.changes.
+MAX_PAYLOAD_BYTES = int(os.getenv("MAX_PAYLOAD_BYTES", str(16 * 1024 * 1024)))
+STREAM_PARSE_BYTES = int(os.getenv("STREAM_PARSE_BYTES", str(1024 * 1024)))
+MAX_EVENT_CHANGES = int(os.getenv("MAX_EVENT_CHANGES", "1000"))
+
+# Pooled HTTP clients shared by every outbound webhook post
+transport = HttpTransport(
+    pool_size=int(os.getenv("HTTP_POOL_SIZE", "10")),
+    connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "10")),
+    keepalive=os.getenv("HTTP_KEEPALIVE", "true").lower() == "true",
+    http2=os.getenv("HTTP2", "false").lower() == "true",
+    headers=platforms.headers(),
+)
+
+# Received events and their delivery outcomes, written in batches by a background thread
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", "30"))
+history = None
+if HISTORY_RETENTION_DAYS > 0:
+    history = EventHistory(
+        app,
+        flush_interval=float(os.getenv("HISTORY_FLUSH_INTERVAL", "1")),
+        retention=HISTORY_RETENTION_DAYS * 86400,
+        max_rows=int(os.getenv("HISTORY_MAX_EVENTS", "1000000")),
+    )
+    history.start()
+
+# Outbound notifications are persisted to the outbox and delivered by background workers
+outbox = Outbox(
+    app,
+    max_attempts=int(os.getenv("DELIVERY_MAX_ATTEMPTS", "8")),
+    backoff_base=float(os.getenv("DELIVERY_BACKOFF_BASE", "2")),
+    backoff_max=float(os.getenv("DELIVERY_BACKOFF_MAX", "600")),
+    history=history,
+)
+# Destinations that keep failing are paused and their notifications parked in the outbox
+breakers = Breakers(
+    threshold=int(os.getenv("CIRCUIT_FAILURES", "5")),
+    cooldown=float(os.getenv("CIRCUIT_COOLDOWN", "30")),
+    max_cooldown=float(os.getenv("CIRCUIT_MAX_COOLDOWN", "600")),
+)
+# The rate limits are per webhook for the whole service: every worker process
+# draws from the same token buckets in the database (see ratelimit.py)
 with app.app_context():
-    db.create_all()
+    shared_buckets = functools.partial(SharedTokenBucket, db.engine)
+delivery_queue = DeliveryQueue(
+    transport.send,
+    workers=int(os.getenv("DELIVERY_WORKERS", "4")),
+    max_depth=int(os.getenv("DELIVERY_QUEUE_SIZE", "1000")),
+    outbox=outbox,
+    resolve=resolve_destination,
+    # DELIVERY_RATE_<PLATFORM> overrides the platform's default
+    rate_limits={name: float(os.getenv(f"DELIVERY_RATE_{name.upper()}", rate))
+                 for name, rate in platforms.rate_limits().items()},
+    burst=int(os.getenv("DELIVERY_BURST", "1")),
+    buckets=shared_buckets,
+    coalesce=platforms.coalesce,
+    max_batch=int(os.getenv("DIGEST_MAX_EVENTS", "50")),
+    breakers=breakers,
+)
+retry_scheduler = RetryScheduler(outbox, delivery_queue)
+# Queue what the previous process handed back at shutdown before serving requests
+retry_scheduler.run_once()
+retry_scheduler.start()
+
+def hand_back(timeout):
+    """
+    Deliver what is queued until the timeout, then return the rest to the
+    outbox, due at once.
+    """
+    jobs = delivery_queue.drain(timeout)
+    if jobs:
+        outbox.release(jobs)
+        app.logger.info("Handed %d queued notifications back to the outbox", len(jobs))
+
+# On SIGTERM, ingest answers 503 while queued notifications are delivered for up to
+# SHUTDOWN_TIMEOUT seconds; the rest is written back to the outbox (see shutdown.py)
+shutdown = Shutdown(timeout=float(os.getenv("SHUTDOWN_TIMEOUT", "20")))
+shutdown.add("retries", lambda timeout: retry_scheduler.stop())
+shutdown.add("delivery", hand_back)
+shutdown.add("acks", lambda timeout: outbox.flush_acks())
+if history is not None:
+    shutdown.add("history", lambda timeout: history.flush())
+
+def check_schema():
+    with app.app_context():
+        waiting = pending(db.engine)
+    if waiting:
+        raise RuntimeError(f"Database migrations pending: {', '.join(str(number) for number, _ in waiting)}")
+
+def warm_connections():
+    """
+    Load the webhook connections into the cache and create the HTTP clients
+    of their destinations.
+    """
+    _, state = status_board.snapshot()
+    tokens = [webhook["token"] for webhook in state["webhooks"]][:connection_cache.max_size]
+    urls = []
+    for token in tokens:
+        connection = connection_cache.get(token)
+        if connection is not None:
+            urls.extend(destination.webhook_url for destination in connection.routes.destinations)
+    transport.warm(urls)
+
+# READY_PATH answers 503 until the worker is warmed up
+readiness = Readiness()
+readiness.add("database", check_schema)
+readiness.add("connections", warm_connections)
+readiness.start()
+
+def count_outbox_rows():
+    """
+    Outbox rows by state, in one query.
+    """
+    with app.app_context():
+        rows = db.session.execute(
+            sqlalchemy.select(OutboxEvent.state, sqlalchemy.func.count()).group_by(OutboxEvent.state)
+        ).all()
+    counts = {("pending",): 0, ("inflight",): 0}
+    counts.update({(state,): count for state, count in rows})
+    return counts
+
+# Counted when /metrics is scraped rather than kept up to date by every worker
+OUTBOX_BACKLOG = ScrapedGauge(
+    "notifier_outbox_rows", "Notifications stored in the outbox, by state.", ["state"], count_outbox_rows)
+
+def collect_events(connection, events):
+    """
+    Count the validated events of an UltraDNS payload and pick the ones to
+    notify about. Test telemetry is sent as a readable test message.
+    Returns the events to send and whether test telemetry was among them.
+    """
+    received = {}
+    events_sent = []
+    tested = False
+    for event in events:
+        event_type = event["telemetryEventType"]
+        received[event_type] = received.get(event_type, 0) + 1
+        if event_type == "TEST_TELEMETRY_WEBHOOK":
+            tested = True
+            events_sent.append(format_test_telemetry(event))
+        else:
+            events_sent.append(event)
+    for event_type, count in received.items():
+        EVENTS_RECEIVED.labels(token_label(connection.token), event_type).inc(count)
+    return events_sent, tested
+
+def render_many(platform, events):
+    with RENDER_SECONDS.labels(platform).time():
+        return platforms.render_many(platform, events)
+
+def route_events(connection, events):
+    """
+    Match events against the routes of the connection and render each one
+    once per platform. Returns the outbox entries, one per destination.
+    """
+    return connection.routes.fan_out(events, render_many)
+
+def prepare_batch(connection, events):
+    """
+    Validate, pick, route and render all events of one payload, without
+    touching the database.
+    """
+    valid, errors = validate_events(events)
+    fresh, keys, duplicates = dedup.split(connection.token, valid)
+    if duplicates:
+        DUPLICATES.labels(token_label(connection.token)).inc(duplicates)
+    events_sent, tested = collect_events(connection, fresh)
+    entries = route_events(connection, events_sent)
+    statements = []
+    if tested:
+        statements = verification_statements(connection)
+        connection = connection._replace(status="verified")
+    recorded = []
+    if history is not None:
+        messages = {}
+        for entry in entries:
+            messages[id(entry[3])] = messages.get(id(entry[3]), 0) + 1
+        rows = history.rows(connection.token, [(event, messages.get(id(sent), 0))
+                                               for event, sent in zip(fresh, events_sent)])
+        recorded = list(zip(events_sent, rows))
+    return Batch(connection, entries, statements, events_sent, keys, recorded,
+                 summarize(len(fresh), errors, len(entries), duplicates))
+
+def commit_batch(batch):
+    """
+    Write the outbox rows, verification, dedup keys and history of a payload
+    in one transaction. Events another worker process (or this one before a
+    restart) accepted already make it fail on their dedup keys; they are
+    dropped and the rest is written again.
+    Returns the batch as written and the DeliveryJobs to queue.
+    """
+    try:
+        jobs = outbox.add_batch(batch.entries, batch.statements + dedup.statements(batch.keys), batch.history)
+    except IntegrityError:
+        repeated = dedup.stored(batch.keys)
+        batch = without_repeats(batch, repeated)
+        if repeated:
+            DUPLICATES.labels(token_label(batch.connection.token)).inc(len(repeated))
+        jobs = outbox.add_batch(batch.entries, batch.statements + dedup.statements(batch.keys, replace=True),
+                                batch.history)
+    dedup.remember(batch.keys)
+    if batch.statements:
+        connection_cache.put(batch.connection.token, batch.connection)
+        status_board.verified(batch.connection.token)
+    return batch, jobs
+
+def enqueue_or_reject(connection, events):
+    """
+    Persist the messages for events to the outbox, queue them for delivery
+    and acknowledge the request with a per-event summary. Returns 503 when
+    the delivery queue is full so UltraDNS retries later.
+    """
+    batch = prepare_batch(connection, events)
+    if not batch.entries and batch.summary["duplicates"]:
+        # Nothing new; acknowledge so UltraDNS stops retrying
+        return jsonify(batch.summary), 202
+    if not batch.entries:
+        return jsonify({"error": "No supported telemetry events found", **batch.summary}), 400
+    if not delivery_queue.has_room(len(batch.entries)):
+        app.logger.warning("Delivery queue is full, rejecting telemetry")
+        return jsonify({"error": "Delivery queue is full"}), 503, {"Retry-After": "5"}
+
+    batch, jobs = commit_batch(batch)
+    if not delivery_queue.submit_many(jobs):
+        # Lost a race for the last slots; the retry scheduler will pick them up
+        outbox.release(jobs)
+    return jsonify(batch.summary), 202
 
 @app.route('/api/gui-status', methods=['GET'])
 def get_gui_status():
@@ -139,28 +495,113 @@ def init():
     """
     return jsonify({"api_token": INTERNAL_API_TOKEN})
 
+def webhook_stats():
+    """
+    Events received and notifications delivered or dead-lettered per webhook
+    since the workers started, from the metrics of all processes. Keyed by
+    token_label() of the token.
+    """
+    stats = {}
+    def add(label, field, value):
+        counts = stats.setdefault(label, {"received": 0, "duplicates": 0, "delivered": 0, "failed": 0})
+        counts[field] += int(value)
+    received, duplicates, notifications = merged(EVENTS_RECEIVED, DUPLICATES, NOTIFICATIONS)
+    for labels, value in received:
+        add(labels["webhook"], "received", value)
+    for labels, value in duplicates:
+        add(labels["webhook"], "duplicates", value)
+    for labels, value in notifications:
+        add(labels["webhook"], labels["outcome"], value)
+    return stats
+
+def webhook_health():
+    """
+    Circuit state and consecutive failures per webhook, keyed by
+    token_label() of its token, the worst of all processes, plus the number
+    of its routes whose circuit is open.
+    """
+    health = {}
+    states, failures = ({labels["destination"]: value for labels, value in samples}
+                        for samples in merged(CIRCUIT_STATE, CIRCUIT_FAILURES))
+    for destination in states.keys() | failures.keys():
+        label = connection_token(destination)
+        entry = health.setdefault(label, {"circuit": "closed", "failures": 0, "open_routes": 0})
+        if destination == label:
+            entry["circuit"] = STATES.get(int(states.get(destination, 0)), "closed")
+            entry["failures"] = int(failures.get(destination, 0))
+        elif states.get(destination):
+            entry["open_routes"] += 1
+    return health
+
+def status_payload(logged_in):
+    """
+    The /api/status document, built from the status board without querying
+    the database.
+    """
+    _, state = status_board.snapshot()
+    has_webhooks = bool(state["webhooks"])
+    webhooks = []
+    if logged_in and has_webhooks:
+        stats = webhook_stats()
+        health = webhook_health()
+        empty = {"received": 0, "duplicates": 0, "delivered": 0, "failed": 0}
+        healthy = {"circuit": "closed", "failures": 0, "open_routes": 0}
+        for webhook in state["webhooks"]:
+            label = token_label(webhook["token"])
+            entry = health.get(label, healthy)
+            if entry["circuit"] != "closed":
+                # e.g. "circuit open" instead of "verified" while the destination is failing
+                webhook["status"] = f"circuit {entry['circuit']}"
+            webhooks.append({**webhook, **stats.get(label, empty), "health": entry})
+    return {
+        "has_admin_password": state["has_admin_password"],
+        "has_webhooks": has_webhooks,
+        "logged_in": logged_in,
+        "setup_complete": state["setup_complete"],
+        "webhooks": webhooks,
+    }
+
 @app.route('/api/status', methods=['GET'])
 def status():
-    admin = User.query.filter_by(username='admin').first()
-    has_admin_password = bool(admin)
-    has_webhooks = WebhookConnection.query.count() > 0
+    return jsonify(status_payload(session.get('logged_in', False))), 200
+
+# Each open stream holds a server thread, so their number is capped per worker process
+STATUS_STREAM_INTERVAL = float(os.getenv("STATUS_STREAM_INTERVAL", "5"))
+status_streams = threading.BoundedSemaphore(int(os.getenv("STATUS_STREAMS", "4")))
+
+@app.route('/api/status/stream', methods=['GET'])
+def status_stream():
+    """
+    Server-sent events with the /api/status document: once on connect, then
+    whenever the setup or a webhook changes, or the delivery stats move
+    (checked every STATUS_STREAM_INTERVAL seconds). A comment line is sent
+    when nothing changed, so dead connections are noticed. The stream ends
+    once the worker is shutting down, so it cannot hold the worker up; the
+    page then reconnects to another one.
+    """
+    if shutdown.draining:
+        return jsonify({"error": "Shutting down"}), 503, {"Retry-After": "1"}
+    if not status_streams.acquire(blocking=False):
+        return jsonify({"error": "Too many status streams"}), 503, {"Retry-After": "10"}
     logged_in = session.get('logged_in', False)
 
-    return jsonify({
-        "has_admin_password": has_admin_password,
-        "has_webhooks": has_webhooks,
-        "logged_in": logged_in,
-        "setup_complete": setup_complete,  # Include setup_complete flag
-        "webhooks": [
-            {
-                "type": connection.type,
-                "status": connection.status,  # Include the status field
-                "webhook_url": connection.webhook_url,
-                "token": connection.token,
-            }
-            for connection in WebhookConnection.query.all()
-        ] if logged_in and has_webhooks else [],
-    }), 200
+    def events():
+        yield "retry: 3000\n\n"
+        version = last = None
+        while not shutdown.draining:
+            version = status_board.wait(version, STATUS_STREAM_INTERVAL)
+            payload = status_payload(logged_in)
+            if payload == last:
+                yield ": idle\n\n"
+                continue
+            last = payload
+            yield f"id: {version}\nevent: status\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+    response = Response(events(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # The server closes the response when the client goes away
+    response.call_on_close(status_streams.release)
+    return response
 
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -182,6 +623,7 @@ def login():
         admin = User(username='admin', password=password)
         db.session.add(admin)
         db.session.commit()
+        status_board.update(has_admin_password=True)
         session['logged_in'] = True
         return jsonify({"message": "Password set and logged in."}), 200
     
@@ -202,7 +644,6 @@ def logout():
 
 @app.route('/api/setup', methods=['GET', 'POST'])
 def setup():
-    global setup_complete
     if request.method == 'POST':
         data = request.json
 
@@ -214,13 +655,14 @@ def setup():
                 admin = User(username='admin', password=password)
                 db.session.add(admin)
                 db.session.commit()
+                status_board.update(has_admin_password=True)
                 return jsonify({"message": "Admin password set."}), 200
 
-        # Handle webhook URL setup (Teams or Slack)
+        # Handle webhook URL setup (any registered platform)
         webhook_url = data.get('webhook_url')
-        platform = data.get('platform')  # Expect 'teams' or 'slack'
+        platform = data.get('platform')
 
-        if webhook_url and platform in ['teams', 'slack']:
+        if webhook_url and platform in platforms:
             token = str(uuid.uuid4())  # Generate a unique token
             connection = WebhookConnection(
                 type=platform,
@@ -235,6 +677,8 @@ def setup():
             except sqlalchemy.exc.IntegrityError:
                 db.session.rollback()
                 return jsonify({"message": "Duplicate token detected. Please retry."}), 400
+            connection_cache.invalidate(token)
+            status_board.put_webhook(token, type=platform, status='pending', webhook_url=webhook_url)
 
             # Get current time
             current_timestamp = datetime.now()
@@ -255,274 +699,180 @@ def setup():
             }
 
             try:
-                if platform == 'teams':
-                    teams_message = transform_to_teams_card(test_event)
-                    send_to_teams(webhook_url, teams_message)
-                elif platform == 'slack':
-                    slack_message = transform_to_slack_block(test_event)
-                    send_to_slack(webhook_url, slack_message)
+                send_message(platform, webhook_url, platforms.render(platform, test_event))
             except Exception as e:
                 return jsonify({"message": f"Failed to send test message: {e}"}), 500
 
             # Wait for the test telemetry event to be received
-            setup_complete = False  # Reset to false until test succeeds
+            set_setup_complete(False)  # Reset to false until test succeeds
             return jsonify({
-                "message": f"{platform.capitalize()} URL set and test message sent.",
+                "message": f"{platforms.get(platform).label} URL set and test message sent.",
                 "token": token,
                 "waiting_for_test": True
             }), 200
 
     # GET method checks setup status
-    admin_exists = User.query.filter_by(username='admin').first() is not None
-    webhook_exists = WebhookConnection.query.count() > 0
-    setup_complete = admin_exists and webhook_exists
+    _, state = status_board.snapshot()
+    setup_complete = state["has_admin_password"] and bool(state["webhooks"])
+    set_setup_complete(setup_complete)
     return jsonify({"setup_complete": setup_complete}), 200
 
 @app.route('/api/webhooks/<token>', methods=['DELETE'])
 def delete_webhook(token):
     webhook = WebhookConnection.query.filter_by(token=token).first()
     if webhook:
+        Route.query.filter_by(connection_id=webhook.id).delete()
         db.session.delete(webhook)
         db.session.commit()
+        connection_cache.invalidate(token)
+        status_board.remove_webhook(token)
         return jsonify({"message": "Webhook deleted successfully."}), 200
     else:
         return jsonify({"error": "Webhook not found."}), 404
 
-@app.route('/api/slack/<token>', methods=['POST'])
-def slack_webhook(token):
-    global setup_complete
-    # Validate the provided token
-    connection = WebhookConnection.query.filter_by(token=token, type="slack").first()
-    if not connection:
-        return jsonify({"error": "Invalid token"}), 404
-
-    # Parse the incoming request
-    payload = request.json
-    if not payload:
-        return jsonify({"error": "Invalid request format"}), 400
-
-    events = payload.get("telemetryEvents")
-    if not events or not isinstance(events, list):
-        app.logger.warning("Invalid telemetryEvents format")
-        return jsonify({"error": "Invalid telemetryEvents format"}), 400
-
-    for event in events:
-        telemetry_event_type = event.get("telemetryEventType")
-        if telemetry_event_type == "TEST_TELEMETRY_WEBHOOK":
-            # Update connection status
-            connection.status = "verified"
-            db.session.commit()
-
-            # Send test telemetry event to Slack
-            slack_block = transform_to_slack_block(format_test_telemetry(event))
-            try:
-                requests.post(
-                    connection.webhook_url,
-                    json=slack_block,
-                    headers={"Content-Type": "application/json"}
-                )
-            except requests.RequestException as e:
-                app.logger.error(f"Error sending Slack notification: {str(e)}")
-                return jsonify({"error": "Failed to send test to webhook"}), 500
-
-            # Complete the setup process
-            setup_complete = True  # Transition to the dashboard in frontend
-            return '', 200
-
-        # Handle regular telemetry events
-        else:
-            slack_block = transform_to_slack_block(event)
-            try:
-                requests.post(
-                    connection.webhook_url,
-                    json=slack_block,
-                    headers={"Content-Type": "application/json"}
-                )
-            except requests.RequestException as e:
-                app.logger.error(f"Error sending Slack notification: {str(e)}")
-                return jsonify({"error": "Failed to send notification"}), 500
-
-    return '', 200
-
-@app.route('/api/teams/<token>', methods=['POST'])
-def teams_webhook(token):
-    global setup_complete
-
-    # Validate the provided token
-    connection = WebhookConnection.query.filter_by(token=token).first()
-    if not connection:
-        return jsonify({"error": "Invalid token"}), 404
-
-    # Parse the incoming request
-    payload = request.json
-    if not payload:
-        return jsonify({"error": "Invalid request format"}), 400
-
-    print(payload, flush=True)
-    events = payload.get("telemetryEvents")
-    if not events or not isinstance(events, list):
-        app.logger.warning("Invalid telemetryEvents format")
-        return jsonify({"error": "Invalid telemetryEvents format"})
-
-    for event in events:
-        telemetry_event_type = event.get("telemetryEventType")
-        if telemetry_event_type == "TEST_TELEMETRY_WEBHOOK":
-            # Update connection status
-            connection.status = "verified"
-            db.session.commit()
-
-            # Send test telemetry event to Teams
-            teams_card = transform_to_teams_card(format_test_telemetry(event))
-            try:
-                # Post to Teams webhook
-                requests.post(
-                    connection.webhook_url,  # Webhook URL stored in the database
-                    json=teams_card,
-                    headers={"Content-Type": "application/json"}
-                )
-            except requests.RequestException as e:
-                app.logger.error(f"Error sending Teams notification: {str(e)}")
-                return jsonify({"error": "Failed to send test to webhook"}), 500
-
-            # Complete the setup process
-            setup_complete = True  # Transition to the dashboard in frontend
-            return '', 200
-
-        # Handle regular telemetry events
-        else:
-            teams_card = transform_to_teams_card(event)
-            try:
-                requests.post(
-                    connection.webhook_url,
-                    json=teams_card,
-                    headers={"Content-Type": "application/json"}
-                )
-            except requests.RequestException as e:
-                app.logger.error(f"Error sending Teams notification: {str(e)}")
-                return jsonify({"error": "Failed to send notification"}), 500
-
-            return '', 200
-
-    return jsonify({"error": "No supported telemetry events found"}), 400
+def serialize_route(token, route):
+    return {
+        "id": route.id,
+        "key": route_key(token, route.id),
+        "type": route.type,
+        "webhook_url": route.webhook_url,
+        "filters": route.filters,
+    }
 
-def transform_to_slack_block(event):
+@app.route('/api/webhooks/<token>/routes', methods=['GET'])
+def list_routes(token):
     """
-    Transform UltraDNS JSON event to Slack Blocks.
+    List the extra destinations of a webhook.
     """
-    telemetry_event = event.get('telemetryEvent', {})
-    account_name = event.get('accountName', 'Unknown Account')
-    telemetry_event_type = event.get('telemetryEventType', 'Unknown Event')
-    object_type = telemetry_event.get('objectType', 'Unknown Object')
-    change_type = telemetry_event.get('changeType', 'Unknown Change')
-    change_time = telemetry_event.get('changeTime', 'Unknown Time')
-    ultra_object = telemetry_event.get('object', 'Unknown Object')
-    ultra_user = telemetry_event.get('user', 'Unknown User')
-    change_source = telemetry_event.get('application', 'Unknown Application')
-
-    # Prepare fields
-    fields = [
-        {"type": "mrkdwn", "text": "*Time:*"}, {"type": "mrkdwn", "text": change_time},
-        {"type": "mrkdwn", "text": "*Object Type:*"}, {"type": "mrkdwn", "text": object_type},
-        {"type": "mrkdwn", "text": "*Change Type:*"}, {"type": "mrkdwn", "text": change_type},
-        {"type": "mrkdwn", "text": "*Object:*"}, {"type": "mrkdwn", "text": ultra_object},
-        {"type": "mrkdwn", "text": "*Account:*"}, {"type": "mrkdwn", "text": account_name},
-        {"type": "mrkdwn", "text": "*User:*"}, {"type": "mrkdwn", "text": ultra_user},
-        {"type": "mrkdwn", "text": "*Application:*"}, {"type": "mrkdwn", "text": change_source},
-    ]
+    webhook = WebhookConnection.query.filter_by(token=token).first()
+    if not webhook:
+        return jsonify({"error": "Webhook not found."}), 404
+    routes = Route.query.filter_by(connection_id=webhook.id).order_by(Route.id).all()
+    return jsonify({"routes": [serialize_route(token, route) for route in routes]}), 200
 
-    # Split fields into chunks of 10
-    field_sections = []
-    for i in range(0, len(fields), 10):
-        field_sections.append(fields[i:i+10])
-
-    # Construct Slack blocks
-    slack_blocks = [
-        {
-            "type": "header",
-            "text": {
-                "type": "plain_text",
-                "text": f"{account_name} {telemetry_event_type} {object_type} {change_type}",
-                "emoji": True
-            }
-        }
-    ]
+@app.route('/api/webhooks/<token>/routes', methods=['POST'])
+def add_route(token):
+    """
+    Add a destination to a webhook. Expects the platform, webhook_url and
+    optional filters, e.g. {"objectType": ["Zone"], "changeType": "DELETE"}.
+    """
+    webhook = WebhookConnection.query.filter_by(token=token).first()
+    if not webhook:
+        return jsonify({"error": "Webhook not found."}), 404
 
-    for section in field_sections:
-        slack_blocks.append({
-            "type": "section",
-            "fields": section
-        })
+    data = request.json or {}
+    platform = data.get('platform')
+    webhook_url = data.get('webhook_url')
+    if platform not in platforms or not webhook_url:
+        return jsonify({"error": "A supported platform and a webhook_url are required."}), 400
+    try:
+        filters = validate_filters(data.get('filters'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    route = Route(connection_id=webhook.id, type=platform, webhook_url=webhook_url, filters=filters)
+    db.session.add(route)
+    db.session.commit()
+    connection_cache.invalidate(token)
+    status_board.touch()
+    return jsonify(serialize_route(token, route)), 201
+
+@app.route('/api/webhooks/<token>/routes/<int:route_id>', methods=['DELETE'])
+def delete_route(token, route_id):
+    webhook = WebhookConnection.query.filter_by(token=token).first()
+    route = webhook and Route.query.filter_by(id=route_id, connection_id=webhook.id).first()
+    if not route:
+        return jsonify({"error": "Route not found."}), 404
+    db.session.delete(route)
+    db.session.commit()
+    connection_cache.invalidate(token)
+    status_board.touch()
+    return jsonify({"message": "Route deleted successfully."}), 200
+
+@app.route('/api/webhooks/dead-letters', methods=['GET'])
+def list_dead_letters():
+    """
+    List notifications that could not be delivered, newest first.
+    """
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({"dead_letters": outbox.dead_letters(limit)}), 200
 
-    return {"blocks": slack_blocks}
+@app.route('/api/webhooks/dead-letters/<int:dead_letter_id>/replay', methods=['POST'])
+def replay_dead_letter(dead_letter_id):
+    """
+    Queue a dead-lettered notification for another delivery attempt.
+    """
+    if outbox.replay(dead_letter_id):
+        return jsonify({"message": "Dead letter queued for redelivery."}), 200
+    return jsonify({"error": "Dead letter not found."}), 404
 
-def transform_to_teams_card(event):
+@app.route('/api/webhooks/events', methods=['GET'])
+@app.route('/api/webhooks/<token>/events', methods=['GET'])
+def list_events(token=None):
     """
-    Transform UltraDNS JSON event to a Teams Adaptive Card.
+    Received events with the outcome of their notifications, newest first.
+    Filter with token, accountName, objectType, telemetryEventType and
+    since/until (epoch seconds); pass next_cursor back as cursor for the
+    next page.
     """
-    # Top-level attributes
-    account_name = event.get('accountName', 'Unknown Account')
-    telemetry_event_type = event.get('telemetryEventType', 'Unknown Event')
-    telemetry_event_time = event.get('telemetryEventTime', 'Unknown Time')
+    if history is None:
+        return jsonify({"error": "Event history is disabled."}), 404
+    events, next_cursor = history.query(
+        token=token or request.args.get('token'),
+        account=request.args.get('accountName'),
+        object_type=request.args.get('objectType'),
+        event_type=request.args.get('telemetryEventType'),
+        since=request.args.get('since', type=float),
+        until=request.args.get('until', type=float),
+        cursor=request.args.get('cursor', type=int),
+        limit=request.args.get('limit', 50, type=int),
+    )
+    return jsonify({"events": events, "next_cursor": next_cursor}), 200
+
+def metrics_endpoint():
+    """
+    Prometheus metrics of all worker processes.
+    """
+    return expose(OUTBOX_BACKLOG), 200, {"Content-Type": CONTENT_TYPE}
 
-    # Nested telemetryEvent attributes
-    telemetry_event = event.get('telemetryEvent', {})
-    object_type = telemetry_event.get('objectType', 'Unknown Object')
-    change_type = telemetry_event.get('changeType', 'Unknown Change')
-    change_time = telemetry_event.get('changeTime', telemetry_event_time)
-    ultra_object = telemetry_event.get('object', 'Unknown Object')
-    ultra_user = telemetry_event.get('user', 'Unknown User')
-    change_source = telemetry_event.get('application', 'Unknown Application')
-
-    # Define Teams card
-    teams_message = {
-        "summary": f"{account_name} {telemetry_event_type} {object_type} {change_type}",
-        "attachments": [
-            {
-                "contentType": "application/vnd.microsoft.card.adaptive",
-                "content": {
-                    "type": "AdaptiveCard",
-                    "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
-                    "version": "1.2",
-                    "body": [
-                        {
-                            "type": "TextBlock",
-                            "text": f"**{account_name} {telemetry_event_type}**",
-                            "weight": "Bolder",
-                            "size": "Medium"
-                        },
-                        {
-                            "type": "FactSet",
-                            "facts": [
-                                {"title": "Time", "value": change_time},
-                                {"title": "Object Type", "value": object_type},
-                                {"title": "Change Type", "value": change_type},
-                                {"title": "Object", "value": ultra_object},
-                                {"title": "Account", "value": account_name},
-                                {"title": "User", "value": ultra_user},
-                                {"title": "Application", "value": change_source}
-                            ]
-                        }
-                    ]
-                }
-            }
-        ]
-    }
+if METRICS_PATH:
+    app.add_url_rule(METRICS_PATH, "metrics", metrics_endpoint, methods=['GET'])
 
-    # Handle additional changes if present
-    detail = telemetry_event.get('detail', {})
-    changes = detail.get('changes', [])
-    if changes:
-        additional_facts = []
-        for change in changes:
-            additional_facts.extend([
-                {"title": "Value", "value": change.get('value', '-')},
-                {"title": "From", "value": change.get('from', '-')},
-                {"title": "To", "value": change.get('to', '-')}
-            ])
-        # Append additional facts to the FactSet
-        teams_message["attachments"][0]["content"]["body"][1]["facts"].extend(additional_facts)
-
-    return teams_message
+def ready_endpoint():
+    """
+    200 once this worker process is warmed up, 503 before and while it
+    shuts down.
+    """
+    ready, checks = readiness.status()
+    if shutdown.draining:
+        ready, checks = False, {**checks, "shutdown": "draining"}
+    return jsonify({"ready": ready, "checks": checks}), 200 if ready else 503
+
+if READY_PATH:
+    app.add_url_rule(READY_PATH, "ready", ready_endpoint, methods=['GET'])
+
+@app.route(f"/api/<any({', '.join(platforms.names())}):platform>/<token>", methods=['POST'])
+def platform_webhook(platform, token):
+    with INGEST_SECONDS.labels(platform).time():
+        if shutdown.draining:
+            # UltraDNS retries, reaching the next process
+            return jsonify({"error": "Shutting down"}), 503, {"Retry-After": "5"}
+
+        # Validate the provided token
+        connection = connection_cache.get(token)
+        if not connection or connection.type != platform:
+            return jsonify({"error": "Invalid token"}), 404
+
+        # Parse the incoming request, streaming large bodies
+        try:
+            events = read_payload(request.stream, request.content_length, MAX_PAYLOAD_BYTES, MAX_EVENT_CHANGES,
+                                  STREAM_PARSE_BYTES)
+        except InvalidPayload as e:
+            app.logger.warning("Rejected %s payload: %s", platforms.get(platform).label, e)
+            return jsonify({"error": str(e)}), e.status
+
+        app.logger.debug("%s events: %s", platforms.get(platform).label, events)
+        return enqueue_or_reject(connection, events)
 
 def format_test_telemetry(event):
     account_name = event.get('accountName', 'Unknown Account')
@@ -533,6 +883,7 @@ def format_test_telemetry(event):
     # Format a test event that is actually parseable
     test_event = {
         "accountName": account_name,
+        "telemetryEventId": telemetry_event_id,  # keeps its delivery outcome in the history
         "telemetryEventType": telemetry_event_type,
         "telemetryEvent": {
             "objectType": "Setup",
@@ -547,20 +898,21 @@ def format_test_telemetry(event):
     return test_event
 
 
-def send_to_slack(webhook_url, message):
+def send_message(platform, webhook_url, message):
     try:
-        response = requests.post(webhook_url, json=message, headers={"Content-Type": "application/json"})
-        response.raise_for_status()  # Raise an exception for HTTP errors
-    except requests.RequestException as e:
-        print(f"Error sending to Slack: {e}", flush=True)
-
-def send_to_teams(webhook_url, message):
-    try:
-        requests.post(webhook_url, json=message)
-        response.raise_for_status()
+        transport.post(webhook_url, message, platforms.get(platform).headers)
     except Exception as e:
-        print(f"Error sending to Teams: {e}", flush=True)
+        app.logger.error("Error sending to %s: %s", platforms.get(platform).label, e)
+
+def handle_sigterm(signum, frame):
+    shutdown.begin()
+    sys.exit(0)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8087)
+    # Shut down like a gunicorn worker does on SIGTERM
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    try:
+        app.run(host='0.0.0.0', port=8087)
+    finally:
+        shutdown.run()
 
@@ -0,0 +1,217 @@
+"""
+ASGI entry point: `uvicorn asgi:application`, or gunicorn with ASYNC_INGEST=true.
+
+The UltraDNS ingest endpoints (/api/<platform>/<token>) are served natively
+on the event loop and fan out through an AsyncDispatcher with an async HTTP
+client. SQLite work (outbox writes, cache misses, setup state) runs in the
+default thread pool. Every other route is passed on to the Flask
+app unchanged.
+"""
+import asyncio
+import json
+import os
+import re
+
+from a2wsgi import WSGIMiddleware
+
+import app as backend
+from async_delivery import AsyncDispatcher
+from cache import MISSING
+from ingest import InvalidPayload, read_payload_async
+from metrics import INGEST_SECONDS
+from routing import connection_token
+from transport import AsyncHttpTransport
+
+INGEST_PATH = re.compile(r"^/api/(%s)/([^/]+)$" % "|".join(map(re.escape, backend.platforms.names())))
+
+transport = AsyncHttpTransport(
+    pool_size=int(os.getenv("HTTP_POOL_SIZE", "10")),
+    connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "10")),
+    keepalive=os.getenv("HTTP_KEEPALIVE", "true").lower() == "true",
+    http2=os.getenv("HTTP2", "false").lower() == "true",
+    headers=backend.platforms.headers(),
+)
+
+
+async def lookup(token):
+    """
+    Look a connection up in the cache, loading it from SQLite off the loop.
+    """
+    connection = backend.connection_cache.peek(token)
+    if connection is MISSING:
+        connection = await asyncio.to_thread(backend.connection_cache.get, token)
+    return connection
+
+
+async def resolve(key):
+    """
+    Async version of app.resolve_destination().
+    """
+    connection = await lookup(connection_token(key))
+    return connection.routes.get(key) if connection is not None else None
+
+
+dispatcher = AsyncDispatcher(
+    transport.send,
+    concurrency=int(os.getenv("DELIVERY_CONCURRENCY", "64")),
+    max_depth=int(os.getenv("DELIVERY_QUEUE_SIZE", "1000")),
+    outbox=backend.outbox,
+    resolve=resolve,
+    rate_limits=backend.delivery_queue.rate_limits,
+    burst=backend.delivery_queue.burst,
+    buckets=backend.delivery_queue.buckets,
+    coalesce=backend.delivery_queue.coalesce,
+    max_batch=backend.delivery_queue.max_batch,
+    breakers=backend.breakers,
+)
+
+flask_app = WSGIMiddleware(backend.app)
+
+backend.readiness.add("async_http", transport.warm)
+
+
+started = False
+
+
+def start():
+    """
+    Bind delivery to the running event loop. Called on lifespan startup, or
+    by the first ingest request on servers without lifespan support.
+    """
+    global started
+    if started:
+        return
+    started = True
+    # Outbox retries go to the event loop instead of the threaded delivery queue
+    dispatcher.bind()
+    backend.retry_scheduler.queue = dispatcher
+
+
+async def stop():
+    """
+    Shut down like app.shutdown does for the threaded delivery queue: post
+    what is queued until SHUTDOWN_TIMEOUT, then hand the rest back to the
+    outbox.
+    """
+    backend.shutdown.begin()
+    await asyncio.to_thread(backend.retry_scheduler.stop)
+    jobs = await dispatcher.drain(backend.shutdown.remaining())
+    if jobs:
+        await asyncio.to_thread(backend.outbox.release, jobs)
+        backend.app.logger.info("Handed %d queued notifications back to the outbox", len(jobs))
+    await asyncio.to_thread(backend.shutdown.run)
+
+
+async def respond(send, status, body=b"", headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def respond_json(send, status, data, headers=()):
+    body = json.dumps(data, separators=(",", ":")).encode() + b"\n"
+    await respond(send, status, body, [(b"content-type", b"application/json"), *headers])
+
+
+async def error(send, status, message, headers=()):
+    await respond_json(send, status, {"error": message}, headers)
+
+
+def body_reader(receive):
+    """
+    `await read()` returns the next chunk of the request body, b"" at the end.
+    """
+    more = True
+
+    async def read():
+        nonlocal more
+        while more:
+            message = await receive()
+            more = message.get("more_body", False)
+            chunk = message.get("body", b"")
+            if chunk:
+                return chunk
+        return b""
+    return read
+
+
+def content_length(scope):
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def ingest(scope, receive, send, platform, token):
+    if backend.shutdown.draining:
+        # UltraDNS retries, reaching the next process
+        return await error(send, 503, "Shutting down", [(b"retry-after", b"5")])
+
+    client_ip = scope["client"][0] if scope.get("client") else ""
+    forwarded_for = ",".join(value.decode("latin-1") for name, value in scope["headers"] if name == b"x-forwarded-for")
+    if not backend.is_request_from_allowed_ips(client_ip, forwarded_for):
+        return await error(send, 403, "Forbidden")
+
+    # Validate the provided token
+    connection = await lookup(token)
+    if not connection or connection.type != platform:
+        return await error(send, 404, "Invalid token")
+
+    # Parse the incoming request, streaming large bodies
+    try:
+        events = await read_payload_async(body_reader(receive), content_length(scope), backend.MAX_PAYLOAD_BYTES,
+                                          backend.MAX_EVENT_CHANGES, backend.STREAM_PARSE_BYTES)
+    except InvalidPayload as e:
+        backend.app.logger.warning("Rejected %s payload: %s", backend.platforms.get(platform).label, e)
+        return await error(send, e.status, str(e))
+
+    # Rendering a large payload would stall the event loop
+    batch = await asyncio.to_thread(backend.prepare_batch, connection, events)
+    if not batch.entries and batch.summary["duplicates"]:
+        # Nothing new; acknowledge so UltraDNS stops retrying
+        return await respond_json(send, 202, batch.summary)
+    if not batch.entries:
+        return await respond_json(send, 400, {"error": "No supported telemetry events found", **batch.summary})
+    if not dispatcher.has_room(len(batch.entries)):
+        backend.app.logger.warning("Delivery queue is full, rejecting telemetry")
+        return await error(send, 503, "Delivery queue is full", [(b"retry-after", b"5")])
+
+    batch, jobs = await asyncio.to_thread(backend.commit_batch, batch)
+    if not dispatcher.submit_many(jobs):
+        # Lost a race for the last slots; the retry scheduler will pick them up
+        await asyncio.to_thread(backend.outbox.release, jobs)
+    await respond_json(send, 202, batch.summary)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await stop()
+            await transport.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    if scope["type"] == "http" and scope["method"] == "POST":
+        match = INGEST_PATH.match(scope["path"])
+        if match:
+            start()
+            with INGEST_SECONDS.labels(match.group(1)).time():
+                return await ingest(scope, receive, send, match.group(1), match.group(2))
+
+    return await flask_app(scope, receive, send)
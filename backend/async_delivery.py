@@ -0,0 +1,246 @@
+"""
+asyncio counterpart of the threaded DeliveryQueue, used by the ASGI ingest
+path (see asgi.py).
+
+Jobs are queued per destination exactly like in DeliveryQueue, with the same
+token buckets and digest coalescing, but each destination is drained by a task
+on the event loop and messages are posted with an async HTTP client. A burst of
+events then costs coroutines rather than threads, and the events of one payload
+fan out concurrently up to the destination's limit. Circuit breakers work as
+in DeliveryQueue: a suspect destination has one post in flight at a time, and
+the jobs of an open circuit are parked in the outbox.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from delivery import ConnectionRemoved, is_destination_failure, plan_batch, take_batch, throttle_delay
+from metrics import PARKED
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class _AsyncLane:
+    """
+    Pending jobs, rate limiter and circuit breaker of a single destination,
+    drained by `task`. Rate-limited lanes send one message at a time so they
+    stay in order; unlimited lanes may have up to `concurrency` posts in
+    flight. `idle` is set when no post of the lane is in flight.
+    """
+    __slots__ = ('jobs', 'bucket', 'breaker', 'slots', 'inflight', 'idle', 'task')
+
+    def __init__(self, bucket, concurrency, breaker=None):
+        self.jobs = deque()
+        self.bucket = bucket
+        self.breaker = breaker
+        self.slots = asyncio.Semaphore(concurrency if bucket.rate <= 0 else 1)
+        self.inflight = 0
+        self.idle = asyncio.Event()
+        self.task = None
+
+
+async def _call(bucket, method, *args):
+    # A shared bucket reads and writes the database
+    if bucket.shared:
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+class AsyncDispatcher:
+    """
+    Bounded queue of DeliveryJobs delivered from an asyncio event loop.
+
+    - `send(job)` is a coroutine that delivers a single job and raises on failure.
+    - `concurrency` is the maximum number of posts in flight, across all
+      destinations and per unlimited destination.
+    - `max_depth`, `outbox`, `rate_limits`, `burst`, `buckets`, `coalesce`,
+      `max_batch`, `breakers` and `clock` behave as in DeliveryQueue; shared
+      rate limiters are called in a thread.
+    - `resolve(token)` is a coroutine returning the current connection of a job.
+
+    Except for submit_many(), which may be called from any thread once the
+    dispatcher is bound to a loop, it must only be used from that loop.
+    """
+
+    def __init__(self, send, concurrency=64, max_depth=1000, outbox=None, resolve=None,
+                 rate_limits=None, burst=1, buckets=None, coalesce=None, max_batch=50, breakers=None,
+                 clock=time.monotonic):
+        self._send = send
+        self.breakers = breakers
+        self.outbox = outbox
+        self.resolve = resolve
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.rate_limits = rate_limits or {}
+        self.burst = burst
+        self.buckets = buckets
+        self.coalesce = coalesce
+        self.max_batch = max_batch
+        self.clock = clock
+        self._lanes = {}
+        self._count = 0
+        self._closed = False
+        self._loop = None
+        self._thread = None
+        self._slots = None
+        self._tasks = set()
+
+    def bind(self):
+        """
+        Attach the dispatcher to the running event loop.
+        """
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._thread = threading.get_ident()
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self
+
+    def depth(self):
+        return self._count
+
+    def has_room(self, count):
+        return self._count + count <= self.max_depth
+
+    def submit_many(self, jobs):
+        """
+        Queue all jobs or none of them.
+        Returns False if the queue does not have room for the whole batch, if
+        the dispatcher is not bound to a loop yet or if it is draining.
+        """
+        if self._loop is None or self._closed:
+            return False
+        jobs = list(jobs)
+        if threading.get_ident() == self._thread:
+            return self._submit(jobs)
+
+        async def submit():
+            return self._submit(jobs)
+        return asyncio.run_coroutine_threadsafe(submit(), self._loop).result()
+
+    def _submit(self, jobs):
+        if self._closed or self._count + len(jobs) > self.max_depth:
+            return False
+        for job in jobs:
+            lane = self._lanes.get(job.token)
+            if lane is None:
+                rate = self.rate_limits.get(job.platform, 0)
+                if self.buckets is not None:
+                    bucket = self.buckets(job.token, rate, self.burst)
+                else:
+                    bucket = TokenBucket(rate, self.burst, self.clock)
+                breaker = self.breakers.get(job.token) if self.breakers is not None else None
+                lane = self._lanes[job.token] = _AsyncLane(bucket, self.concurrency, breaker)
+            lane.jobs.append(job)
+            if lane.task is None:
+                lane.task = self._loop.create_task(self._drain(lane))
+        self._count += len(jobs)
+        return True
+
+    async def drain(self, timeout):
+        """
+        Stop accepting jobs and keep delivering until the queue is empty and
+        no post is in flight, for up to `timeout` seconds. Returns the jobs
+        still queued then, removed from the queue.
+        """
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        while (self._count or self._tasks) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        left = []
+        for lane in self._lanes.values():
+            if lane.task is not None:
+                lane.task.cancel()
+            left.extend(lane.jobs)
+            lane.jobs.clear()
+        self._count -= len(left)
+        return left
+
+    async def _drain(self, lane):
+        try:
+            while lane.jobs:
+                if lane.breaker is not None and lane.breaker.failures and lane.inflight:
+                    # One post at a time to a suspect destination
+                    lane.idle.clear()
+                    await lane.idle.wait()
+                    continue
+                await lane.slots.acquire()
+                wait = await _call(lane.bucket, lane.bucket.take)
+                # Only jobs that waited behind the limiter are coalesced
+                throttled = wait > 0
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    wait = await _call(lane.bucket, lane.bucket.take)
+                await self._slots.acquire()
+
+                if lane.breaker is not None and not lane.breaker.allow():
+                    parked = list(lane.jobs)
+                    lane.jobs.clear()
+                    self._count -= len(parked)
+                    self._slots.release()
+                    lane.slots.release()
+                    await self._park(lane.breaker, parked)
+                    continue
+
+                batch = take_batch(lane.jobs, self.coalesce if throttled else None, self.max_batch)
+                job, covered, rest = plan_batch(batch, self.coalesce)
+                # Whatever did not fit goes back to the front of the lane
+                lane.jobs.extendleft(reversed(rest))
+                self._count -= len(covered)
+
+                lane.inflight += 1
+                task = self._loop.create_task(self._deliver(covered, job, lane))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            lane.task = None
+
+    async def _park(self, breaker, jobs):
+        """
+        Hand the jobs of a destination whose circuit is open back to the
+        outbox until it is worth trying again.
+        """
+        PARKED.labels(jobs[0].platform).inc(len(jobs))
+        if self.outbox is not None:
+            await asyncio.to_thread(self.outbox.release, jobs, breaker.retry_in())
+        else:
+            logger.error("Dropping %d %s notifications, circuit is open", len(jobs), jobs[0].platform,
+                         extra={"token": breaker.key})
+
+    async def _deliver(self, jobs, job, lane):
+        try:
+            if self.resolve is not None:
+                connection = await self.resolve(job.token)
+                if connection is None:
+                    raise ConnectionRemoved("Webhook connection was removed")
+                job = job._replace(webhook_url=connection.webhook_url)
+            await self._send(job)
+        except Exception as e:
+            delay = throttle_delay(e)
+            if delay is not None:
+                await _call(lane.bucket, lane.bucket.pause, delay)
+            if lane.breaker is not None and is_destination_failure(e):
+                lane.breaker.failure()
+            elif lane.breaker is not None:
+                lane.breaker.neutral()
+            for failed in jobs:
+                if self.outbox is not None:
+                    # Rescheduling touches SQLite, keep it off the event loop
+                    await asyncio.to_thread(self.outbox.failed, failed, e)
+                else:
+                    logger.error("Error delivering %s notification: %s", job.platform, e)
+        else:
+            if lane.breaker is not None:
+                lane.breaker.success()
+            if self.outbox is not None:
+                for delivered in jobs:
+                    self.outbox.delivered(delivered)
+        finally:
+            self._slots.release()
+            lane.slots.release()
+            lane.inflight -= 1
+            if not lane.inflight:
+                lane.idle.set()
+
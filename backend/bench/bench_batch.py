@@ -0,0 +1,68 @@
+"""
+Benchmark ingest throughput by payload size.
+
+Posts --total events to /api/<platform>/<token> in-process, as payloads of
+each --sizes number of events, and reports request latency and events
+acknowledged per second. Each payload is validated, rendered and written to
+the outbox in one transaction, so throughput should grow with the batch size:
+
+    python bench/bench_batch.py --sizes 1 100 10000 --total 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import make_payload
+from stub_server import StubReceiver
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--total", type=int, default=20000, help="events posted per size")
+    parser.add_argument("--platform", choices=["slack", "teams"], default="teams")
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp()
+    os.environ["DELIVERY_QUEUE_SIZE"] = str(args.total * len(args.sizes) * 2)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    stub = StubReceiver().start()
+
+    import app as backend
+
+    token = str(uuid.uuid4())
+    with backend.app.app_context():
+        backend.db.session.add(backend.WebhookConnection(
+            type=args.platform, token=token, webhook_url=stub.url, status="verified"))
+        backend.db.session.commit()
+    client = backend.app.test_client()
+    url = f"/api/{args.platform}/{token}"
+    client.post(url, json=make_payload(1))  # warm up
+
+    for size in args.sizes:
+        requests = max(1, args.total // size)
+        payloads = [make_payload(size) for _ in range(requests)]
+        latencies = []
+        start = time.perf_counter()
+        for payload in payloads:
+            t0 = time.perf_counter()
+            response = client.post(url, json=payload)
+            latencies.append(time.perf_counter() - t0)
+            assert response.status_code == 202, response.status_code
+            assert response.json["accepted"] == size
+        elapsed = time.perf_counter() - start
+        print(f"events/payload={size:5d} requests={requests:5d}: "
+              f"latency p50={statistics.median(latencies) * 1000:8.2f}ms "
+              f"max={max(latencies) * 1000:8.2f}ms  {requests * size / elapsed:7.0f} events/sec")
+
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
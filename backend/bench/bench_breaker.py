@@ -0,0 +1,110 @@
+"""
+Benchmark delivery to a healthy webhook next to a broken one.
+
+Runs the app in-process with two webhooks, each posting to its own stub
+receiver. The broken stub fails on command (--failure 503, or hang past the
+read timeout). The same events are sent to both webhooks, and the bench
+reports:
+- how fast the healthy one gets its notifications;
+- how many posts the broken one absorbed;
+- what /api/status shows;
+- how long the parked notifications take to arrive once the broken stub
+  recovers.
+Compare with the circuit breaker disabled:
+
+    python bench/bench_breaker.py --failure hang
+    python bench/bench_breaker.py --failure hang --circuit-failures 0
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import make_payload
+from stub_server import StubReceiver
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=400, help="events sent to each webhook")
+    parser.add_argument("--batch", type=int, default=10, help="events per payload")
+    parser.add_argument("--failure", default="hang", help='status code of the broken stub, or "hang"')
+    parser.add_argument("--circuit-failures", default="5", help="CIRCUIT_FAILURES, 0 disables the breaker")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--recovery-timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    os.environ.update({
+        "DATA_DIR": tempfile.mkdtemp(),
+        "DELIVERY_WORKERS": str(args.workers),
+        "DELIVERY_QUEUE_SIZE": str(args.events * 4),
+        # Unlimited destinations may use every worker, the worst case for a hanging one
+        "DELIVERY_RATE_TEAMS": "0",
+        "DIGEST_MAX_EVENTS": "1",
+        "HTTP_READ_TIMEOUT": "1",
+        "DELIVERY_BACKOFF_BASE": "1",
+        "DELIVERY_BACKOFF_MAX": "5",
+        "DELIVERY_MAX_ATTEMPTS": "100",
+        "CIRCUIT_FAILURES": args.circuit_failures,
+        "CIRCUIT_COOLDOWN": "2",
+        "CIRCUIT_MAX_COOLDOWN": "4",
+        "HISTORY_RETENTION_DAYS": "0",
+    })
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    healthy, broken = StubReceiver().start(), StubReceiver().start()
+    broken.hang = 2
+    broken.fail(args.failure if args.failure == "hang" else int(args.failure))
+
+    import app as backend
+
+    client = backend.app.test_client()
+    headers = {"X-Api-Token": backend.INTERNAL_API_TOKEN}
+    client.post("/api/login", json={"password": "bench"}, headers=headers)
+    tokens = {}
+    for name, stub in (("healthy", healthy), ("broken", broken)):
+        tokens[name] = str(uuid.uuid4())
+        with backend.app.app_context():
+            backend.db.session.add(backend.WebhookConnection(
+                type="teams", token=tokens[name], webhook_url=stub.url, status="verified"))
+            backend.db.session.commit()
+
+    start = time.perf_counter()
+    for _ in range(args.events // args.batch):
+        for token in tokens.values():
+            response = client.post(f"/api/teams/{token}", json=make_payload(args.batch))
+            assert response.status_code == 202, (response.status_code, response.json)
+    accepted = time.perf_counter() - start
+    if not healthy.wait_for(args.events, timeout=300):
+        print(f"healthy webhook only got {healthy.received}/{args.events}")
+        return
+    elapsed = time.perf_counter() - start
+    print(f"circuit failures={args.circuit_failures}, broken stub {args.failure}: "
+          f"ingest took {accepted:.2f}s, healthy webhook got {args.events} in {elapsed:.2f}s "
+          f"({args.events / elapsed:.0f}/sec), broken stub absorbed {broken.failed} posts")
+    deadline = time.monotonic() + 10
+    while True:
+        webhooks = client.get("/api/status", headers=headers).json["webhooks"]
+        broken_status = next(webhook for webhook in webhooks if webhook["token"] == tokens["broken"])
+        if broken_status["health"]["circuit"] != "closed" or time.monotonic() > deadline:
+            break
+        time.sleep(0.1)
+    print(f"  /api/status of the broken webhook: status={broken_status['status']!r} health={broken_status['health']}")
+
+    broken.recover()
+    recovered = time.perf_counter()
+    if broken.wait_for(args.events, timeout=args.recovery_timeout):
+        print(f"  after recovery the broken webhook got all {args.events} within "
+              f"{time.perf_counter() - recovered:.1f}s")
+    else:
+        print(f"  after recovery the broken webhook got {broken.received}/{args.events} "
+              f"within {args.recovery_timeout:.0f}s")
+    healthy.stop()
+    broken.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark telemetry requests/sec with and without the connection cache.
+
+Counts the SELECTs issued per request as well, to show that steady-state
+ingest no longer looks connections up in SQLite:
+
+    python bench/bench_cache.py
+    python bench/bench_cache.py --no-cache
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import make_payload
+from stub_server import StubReceiver
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATA_DIR"] = tmp
+    os.environ["CONNECTION_CACHE_TTL"] = "0" if args.no_cache else "60"
+    os.environ["DELIVERY_QUEUE_SIZE"] = str(args.requests * 2)
+    stub = StubReceiver().start()
+
+    import app as backend
+
+    token = str(uuid.uuid4())
+    with backend.app.app_context():
+        backend.db.session.add(backend.WebhookConnection(
+            type="slack", token=token, webhook_url=stub.url, status="verified"))
+        backend.db.session.commit()
+        engine = backend.db.engine
+
+    # Only count queries issued by the request thread, not the delivery workers
+    ingest_thread = threading.current_thread()
+    lookups = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_lookups(conn, cursor, statement, *rest):
+        if threading.current_thread() is ingest_thread and "FROM webhook_connection" in statement:
+            lookups.append(statement)
+
+    # Cost of a single lookup on its own
+    iterations = 10000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        backend.connection_cache.get(token)
+    lookup_us = (time.perf_counter() - start) / iterations * 1e6
+
+    client = backend.app.test_client()
+    payload = make_payload(1)
+    client.post(f"/api/slack/{token}", json=payload)  # warm up
+    lookups.clear()
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        response = client.post(f"/api/slack/{token}", json=payload)
+        assert response.status_code == 202, response.status_code
+    elapsed = time.perf_counter() - start
+    stub.stop()
+
+    print(f"cache {'off' if args.no_cache else 'on'}: {lookup_us:.1f}us per connection lookup")
+    print(f"  {args.requests} requests in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s), "
+          f"{len(lookups) / args.requests:.2f} connection queries per request")
+
+
+if __name__ == "__main__":
+    main()
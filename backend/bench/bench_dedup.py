@@ -0,0 +1,100 @@
+"""
+Benchmark the telemetryEventId dedup index.
+
+Times DedupIndex.split() for payloads of --events events that are all new
+and all repeats held in memory, the SeenEvent insert written with the outbox
+rows, and stored(), which finds repeats of another worker or a restart once
+that insert has failed on them. Also measures the memory held per remembered
+event:
+
+    python bench/bench_dedup.py --events 1 100 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from dedup import DedupIndex, event_key
+from models import configure_sqlite, db, sqlite_connect_args
+
+TOKEN = "0b6f4a8e-0d4c-4a54-9a5e-6a3c1f8e2b11"
+
+
+def make_events(count):
+    return [{"telemetryEventId": str(uuid.uuid4()), "telemetryEventType": "ZONE_CHANGE"} for _ in range(count)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tempfile.mkdtemp()}/dedup.db"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": sqlite_connect_args()}
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine)
+        db.create_all()
+    return app
+
+
+def remember(index, app, keys):
+    with app.app_context():
+        for statement in index.statements(keys):
+            db.session.execute(statement)
+        db.session.commit()
+    index.remember(keys)
+
+
+def index_keys(events):
+    return [event_key(TOKEN, event) for event in events]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--max-size", type=int, default=100000)
+    args = parser.parse_args()
+
+    app = make_app()
+    index = DedupIndex(max_size=args.max_size, app=app)
+    index.split(TOKEN, make_events(1))  # warm up
+    # A fresh index only finds events in the SeenEvent table
+    restarted = DedupIndex(app=app)
+    for count in args.events:
+        payloads = [make_events(count) for _ in range(max(1, 2000 // count))]
+        total = count * len(payloads)
+        new_time, results = timed(lambda: [index.split(TOKEN, events) for events in payloads])
+        insert_time, _ = timed(lambda: [remember(index, app, keys) for _, keys, _ in results])
+        memory_time, results = timed(lambda: [index.split(TOKEN, events) for events in payloads])
+        assert sum(repeats for _, _, repeats in results) == total
+        stored_time, found = timed(lambda: [restarted.stored(index_keys(events)) for events in payloads])
+        assert sum(len(keys) for keys in found) == total
+        print(f"events={count:5d}: new {new_time / total * 1e6:6.1f}us/event  "
+              f"insert {insert_time / total * 1e6:6.1f}us/event  "
+              f"repeat in memory {memory_time / total * 1e6:6.2f}us/event  "
+              f"repeat in SQLite {stored_time / total * 1e6:6.1f}us/event")
+
+    memory_only = DedupIndex(max_size=args.max_size)
+    keys = [f"{TOKEN}:{uuid.uuid4()}" for _ in range(args.max_size)]
+    tracemalloc.start()
+    memory_only.remember(keys)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The key strings themselves are created by split() from the payload ids
+    print(f"{len(memory_only)} remembered events: {size / 2**20:.1f}MB, {size / len(memory_only):.0f} bytes/event "
+          f"(plus the keys, {sum(sys.getsizeof(key) for key in keys) / 2**20:.1f}MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark the event history at --rows stored events.
+
+Fills the event_history table with EventHistory.rows(), inserted in batches
+as ingest does in its outbox transaction, and times both, then keyset page
+queries with and without filters (first page and deep in the table), and
+retention compaction:
+
+    python bench/bench_history.py --rows 1000000
+
+Compare ingest throughput with and without history using bench_batch.py and
+HISTORY_RETENTION_DAYS=0.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_dedup import make_app
+from sqlalchemy import insert
+
+from history import EventHistory
+from models import db, EventRecord
+
+TOKENS = [str(uuid.uuid4()) for _ in range(20)]
+ACCOUNTS = [f"account{i}" for i in range(200)]
+OBJECT_TYPES = ["Zone", "Record", "User", "Pool", "Probe"]
+
+
+def make_event(rng):
+    return {
+        "accountName": rng.choice(ACCOUNTS),
+        "telemetryEventId": str(uuid.uuid4()),
+        "telemetryEventType": "ZONE_CHANGE",
+        "telemetryEventTime": "2025-01-21 10:00:00.000",
+        "telemetryEvent": {
+            "objectType": rng.choice(OBJECT_TYPES),
+            "changeType": "UPDATE",
+            "changeTime": "2025-01-21 10:00:00.000",
+            "object": "example.com.",
+            "user": "bench",
+            "application": "Portal",
+        },
+    }
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--batch", type=int, default=10000, help="events written per transaction")
+    args = parser.parse_args()
+
+    app = make_app()
+    history = EventHistory(app, max_rows=args.rows)
+    rng = random.Random(1)
+
+    def write(rows):
+        with app.app_context():
+            db.session.execute(insert(EventRecord).returning(EventRecord.id, sort_by_parameter_order=True), rows)
+            db.session.commit()
+
+    rows_time = insert_time = 0.0
+    written = 0
+    while written < args.rows:
+        token = rng.choice(TOKENS)
+        events = [(make_event(rng), 1) for _ in range(min(args.batch, args.rows - written))]
+        elapsed, rows = timed(lambda: history.rows(token, events))
+        rows_time += elapsed
+        elapsed, _ = timed(lambda: write(rows))
+        insert_time += elapsed
+        written += len(events)
+    with app.app_context():
+        database = db.engine.url.database
+    print(f"stored {written} events: rows() {rows_time / written * 1e6:.2f}us/event, "
+          f"insert {insert_time / written * 1e6:.2f}us/event in the ingest transaction, "
+          f"{os.path.getsize(database) / 2**20:.0f}MB")
+
+    history.compact()  # nothing to delete yet; refreshes the planner statistics
+    _, (page, cursor) = timed(lambda: history.query(limit=50))
+    middle = page[0]["id"] // 2
+    queries = [
+        ("newest", {}),
+        ("token", {"token": TOKENS[0]}),
+        ("account", {"account": ACCOUNTS[0]}),
+        ("objectType", {"object_type": "Probe"}),
+        ("account+objectType", {"account": ACCOUNTS[0], "object_type": "Probe"}),
+        ("last hour", {"since": time.time() - 3600}),
+    ]
+    for name, filters in queries:
+        first, (page, _) = timed(lambda: history.query(limit=50, **filters), repeat=20)
+        deep, _ = timed(lambda: history.query(limit=50, cursor=middle, **filters), repeat=20)
+        print(f"  page of 50 by {name:20s} first {first * 1000:6.2f}ms  from the middle {deep * 1000:6.2f}ms")
+
+    history.max_rows = args.rows // 2
+    elapsed, deleted = timed(history.compact)
+    print(f"compaction to {history.max_rows} rows: deleted {deleted} in {elapsed:.2f}s "
+          f"({deleted / elapsed:.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
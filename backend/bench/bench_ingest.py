@@ -0,0 +1,99 @@
+"""
+Benchmark ack latency and sustained delivery rate of the telemetry handlers.
+
+Runs the Flask app in-process against a temporary database and a local stub
+receiver. Compare inline delivery (the old behaviour) with the worker pool:
+
+    python bench/bench_ingest.py --workers 0
+    python bench/bench_ingest.py --workers 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubReceiver
+
+
+def make_payload(events):
+    return {
+        "telemetryEvents": [
+            {
+                "accountName": "bench",
+                "telemetryEventId": str(uuid.uuid4()),
+                "telemetryEventType": "ZONE_CHANGE",
+                "telemetryEventTime": "2025-01-21 10:00:00.000",
+                "telemetryEvent": {
+                    "objectType": "Zone",
+                    "changeType": "UPDATE",
+                    "changeTime": "2025-01-21 10:00:00.000",
+                    "object": f"example{i}.com.",
+                    "user": "bench",
+                    "application": "Portal",
+                },
+            }
+            for i in range(events)
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--events", type=int, default=1, help="events per payload")
+    parser.add_argument("--platform", choices=["slack", "teams"], default="slack")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub receiver latency in seconds")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATA_DIR"] = tmp
+    os.environ["DELIVERY_WORKERS"] = str(args.workers)
+    os.environ["DELIVERY_QUEUE_SIZE"] = str(args.queue_size)
+    # Measure raw delivery throughput: no per-destination limit, one post per event
+    os.environ["DELIVERY_RATE_SLACK"] = os.environ["DELIVERY_RATE_TEAMS"] = "0"
+    os.environ["DIGEST_MAX_EVENTS"] = "1"
+
+    stub = StubReceiver(latency=args.latency).start()
+
+    import app as backend
+
+    token = str(uuid.uuid4())
+    with backend.app.app_context():
+        backend.db.session.add(backend.WebhookConnection(
+            type=args.platform, token=token, webhook_url=stub.url, status="verified"))
+        backend.db.session.commit()
+
+    client = backend.app.test_client()
+    expected = args.requests * args.events
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        payload = make_payload(args.events)
+        t0 = time.perf_counter()
+        response = client.post(f"/api/{args.platform}/{token}", json=payload)
+        latencies.append(time.perf_counter() - t0)
+        assert response.status_code in (200, 202), response.status_code
+    acked = time.perf_counter() - start
+    stub.wait_for(expected)
+    delivered = time.perf_counter() - start
+    stub.stop()
+
+    latencies.sort()
+    print(f"workers={args.workers} requests={args.requests} events/payload={args.events} "
+          f"stub latency={args.latency * 1000:.0f}ms")
+    print(f"  ack latency  p50={statistics.median(latencies) * 1000:.2f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}ms")
+    print(f"  all acked in {acked:.2f}s, {stub.received}/{expected} delivered in {delivered:.2f}s "
+          f"({stub.received / delivered:.0f} events/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark the IP allowlist with FILTER_IPS enabled.
+
+Compares the old per-request check (header dict copy, flushed prints and a
+linear scan of the list) with the compiled IpFilter, first as raw checks per
+second for growing allowlists, then as Flask requests per second through the
+before_request guard:
+
+    python bench/bench_ipfilter.py --networks 7 1000 100000
+"""
+import argparse
+import contextlib
+import ipaddress
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allowlist import IpFilter
+
+CLIENT = "52.10.63.3"
+PROXY = "172.18.0.2"
+
+
+def legacy_check(allowed, client_ip, headers):
+    """
+    The check as it was: copy and print the headers, then scan the list.
+    """
+    headers = {key: value for key, value in headers.items()}
+    print(f"Client IP (remote_addr): {client_ip}", flush=True)
+    print(f"Request Headers: {headers}", flush=True)
+    x_forwarded_for = headers.get("X-Forwarded-For")
+    if x_forwarded_for:
+        ip_list = [ip.strip() for ip in x_forwarded_for.split(",")]
+        print(f"X-Forwarded-For IPs: {ip_list}", flush=True)
+        if any(ip in allowed for ip in ip_list):
+            print("Request is from an allowed IP (via X-Forwarded-For).", flush=True)
+            return True
+    elif client_ip in allowed:
+        print("Request is from an allowed IP (via remote_addr).", flush=True)
+        return True
+    print("Request is NOT from an allowed IP.", flush=True)
+    return False
+
+
+def make_allowlist(count, rng):
+    """
+    `count` entries, mixing single addresses and CIDR ranges, ending with CLIENT.
+    """
+    entries = []
+    for _ in range(count - 1):
+        address = ipaddress.IPv4Address(rng.getrandbits(32))
+        prefix = rng.choice([32, 32, 28, 24])
+        entries.append(str(ipaddress.ip_network(f"{address}/{prefix}", strict=False)))
+    return entries + [CLIENT]
+
+
+def rate(fn, duration):
+    count = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            fn()
+        count += 100
+    return count / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--networks", type=int, nargs="+", default=[7, 1000, 100000])
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    headers = {"Host": "notifier.example.com", "User-Agent": "UltraDNS", "Content-Type": "application/json",
+               "X-Forwarded-For": CLIENT, "X-Forwarded-Proto": "https"}
+
+    # The old code printed to the container log; send it to /dev/null here
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = []
+        for count in args.networks:
+            entries = make_allowlist(count, rng)
+            ip_filter = IpFilter(entries)
+            assert ip_filter.allows(PROXY, CLIENT) and legacy_check(entries, PROXY, headers)
+            legacy = rate(lambda: legacy_check(entries, PROXY, headers), args.duration)
+            compiled = rate(lambda: ip_filter.allows(PROXY, CLIENT), args.duration)
+            results.append((count, legacy, compiled))
+
+    for count, legacy, compiled in results:
+        print(f"networks={count:6d}: legacy {legacy:9.0f} checks/s  compiled {compiled:9.0f} checks/s "
+              f"({compiled / legacy:.0f}x)")
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp()
+    os.environ["FILTER_IPS"] = "true"
+    import app as backend
+
+    client = backend.app.test_client()
+    environ = {"REMOTE_ADDR": PROXY}
+    url = "/api/slack/unknown-token"  # passes the IP guard, then 404s without touching the database
+    assert client.post(url, headers=headers, environ_base=environ).status_code == 404
+
+    compiled_check = backend.is_request_from_allowed_ips
+    allowed = backend.ALLOWED_ULTRADNS_IPS
+    backend.is_request_from_allowed_ips = lambda: legacy_check(
+        allowed, backend.request.remote_addr, backend.request.headers)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        legacy = rate(lambda: client.post(url, headers=headers, environ_base=environ), args.duration)
+    backend.is_request_from_allowed_ips = compiled_check
+    compiled = rate(lambda: client.post(url, headers=headers, environ_base=environ), args.duration)
+    print(f"Flask requests: legacy {legacy:.0f} req/s  compiled {compiled:.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark ingesting very large payloads: parse memory and time, and splitting.
+
+Builds two synthetic bodies of about --megabytes each: one bulk event with a
+huge detail.changes list (a zone import), and many ordinary events. Each is
+parsed in memory with json.loads and incrementally with ijson, as
+ingest.read_payload() does above STREAM_PARSE_BYTES, reporting the time and
+the tracemalloc peak. The bulk event is then rendered for every platform to
+show how many messages it is split into and that each one is within the
+platform's limits. Finally both bodies are posted to the Flask app for Slack,
+to time the whole ingest request:
+
+    python bench/bench_large.py --megabytes 10
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubReceiver
+
+
+def make_event(i, changes=0):
+    event = {
+        "accountName": "bench",
+        "telemetryEventId": f"large-{i}",
+        "telemetryEventType": "ZONE_CHANGE",
+        "telemetryEventTime": "2025-01-21 10:00:00.000",
+        "telemetryEvent": {
+            "objectType": "RRSet",
+            "changeType": "UPDATE",
+            "changeTime": "2025-01-21 10:00:00.000",
+            "object": f"www{i}.example.com.",
+            "user": "bench",
+            "application": "Zone import",
+        },
+    }
+    if changes:
+        event["telemetryEvent"]["detail"] = {"changes": [
+            {"value": f"host{n}.example.com. 300 IN A", "from": None, "to": f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}"}
+            for n in range(changes)
+        ]}
+    return event
+
+
+def make_bodies(megabytes, tag):
+    """
+    (name, body) pairs of about `megabytes` each.
+    """
+    target = megabytes * 1024 * 1024
+    change = len(json.dumps(make_event(0, 1)["telemetryEvent"]["detail"]["changes"][0])) + 2
+    bulk = {"telemetryEvents": [make_event(f"{tag}-bulk", target // change)]}
+    event = len(json.dumps(make_event(0))) + 2
+    many = {"telemetryEvents": [make_event(f"{tag}-{i}") for i in range(target // event)]}
+    return [("one bulk event", json.dumps(bulk).encode()), ("many events", json.dumps(many).encode())]
+
+
+def measure(function):
+    """
+    (result, seconds, tracemalloc peak in MB) of a function. It is timed on
+    its own, as tracing slows allocations down, then run again traced.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def parse(body, max_changes):
+    import ingest
+    return {
+        "json.loads": lambda: ingest.read_payload(io.BytesIO(body), len(body), len(body), max_changes,
+                                                  stream_above=len(body)),
+        "streaming": lambda: ingest.read_payload(io.BytesIO(body), len(body), len(body), max_changes,
+                                                 stream_above=0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--megabytes", type=int, default=10)
+    parser.add_argument("--max-changes", type=int, default=1000, help="MAX_EVENT_CHANGES")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="bench-large-")
+    os.environ.update(DATA_DIR=data_dir, LOG_LEVEL="ERROR", HISTORY_RETENTION_DAYS="0", DELIVERY_QUEUE_SIZE="100000",
+                      MAX_PAYLOAD_BYTES=str((args.megabytes + 1) * 1024 * 1024),
+                      MAX_EVENT_CHANGES=str(args.max_changes))
+    import ingest
+    if ingest.ijson is None:
+        print("ijson is not installed; only the in-memory parser is available")
+
+    bodies = make_bodies(args.megabytes, "parse")
+    for name, body in bodies:
+        for method, function in parse(body, args.max_changes).items():
+            if method == "streaming" and ingest.ijson is None:
+                continue
+            events, elapsed, peak = measure(function)
+            print(f"{name:15} {len(body) / 1e6:5.1f} MB {method:10}: {elapsed * 1000:7.0f} ms, "
+                  f"peak {peak:6.1f} MB, {len(events)} events")
+
+    import app as backend
+    bulk = ingest.parse_payload(bodies[0][1], args.max_changes)[0]
+    print(f"bulk event kept {len(bulk['telemetryEvent']['detail']['changes'])} changes")
+    for name in backend.platforms.names():
+        platform = backend.platforms.get(name)
+        (messages,), elapsed, _ = measure(lambda: backend.platforms.render_many(name, [bulk]))
+        if isinstance(messages, bytes):
+            messages = [messages]
+        print(f"{name:8} {len(messages):>3} messages in {elapsed * 1000:5.0f} ms, "
+              f"largest {max(map(len, messages)):>7} bytes (limit {platform.max_bytes})")
+
+    stub = StubReceiver().start()
+    token = "bench-large"
+    with backend.app.app_context():
+        backend.db.session.add(backend.WebhookConnection(
+            type="slack", token=token, webhook_url=stub.url, status="verified"))
+        backend.db.session.commit()
+    client = backend.app.test_client()
+    for name, body in make_bodies(args.megabytes, "post"):
+        start = time.perf_counter()
+        response = client.post(f"/api/slack/{token}", data=body, content_type="application/json")
+        print(f"POST {name:15}: {response.status_code} in {(time.perf_counter() - start) * 1000:5.0f} ms, "
+              f"{response.json.get('messages')} messages")
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark the cost of logging in the Teams telemetry handler.
+
+Posts --requests payloads to /api/teams/<token> in-process, with stdout
+connected to a pipe like in a container (--reader-rate throttles the reading
+end, like a slow log driver), and compares the caller-side cost of a log call
+and the handler latency with:
+
+- off: LOG_LEVEL=INFO, the payload debug record is skipped
+- sync: a plain StreamHandler flushing every record (what print(..., flush=True) did)
+- queued: the JSON queue handler of logs.py at DEBUG
+
+    python bench/bench_logging.py --requests 2000 --events 10 --reader-rate 1000000
+"""
+import argparse
+import io
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import make_payload
+from stub_server import StubReceiver
+
+
+# Reads stdin in 4KB chunks at a limited number of bytes per second
+SLOW_READER = """
+import sys, time
+while sys.stdin.buffer.read1(4096):
+    time.sleep(4096 / RATE)
+"""
+
+
+def call_cost(logger, payload, number=2000):
+    start = time.perf_counter()
+    for _ in range(number):
+        logger.debug("Teams payload: %s", payload)
+    return (time.perf_counter() - start) / number
+
+
+def measure(client, url, payloads):
+    latencies = []
+    for payload in payloads:
+        t0 = time.perf_counter()
+        response = client.post(url, json=payload)
+        latencies.append(time.perf_counter() - t0)
+        assert response.status_code == 202, response.status_code
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=10, help="events per payload")
+    parser.add_argument("--reader-rate", type=float, default=0, help="bytes/sec read from the log pipe, 0 = unlimited")
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp()
+    os.environ["DELIVERY_RATE_TEAMS"] = "0"
+    os.environ["DELIVERY_QUEUE_SIZE"] = str(args.requests * args.events * 2)
+    stub = StubReceiver().start()
+
+    import app as backend
+    import logs
+
+    token = str(uuid.uuid4())
+    with backend.app.app_context():
+        backend.db.session.add(backend.WebhookConnection(
+            type="teams", token=token, webhook_url=stub.url, status="verified"))
+        backend.db.session.commit()
+    client = backend.app.test_client()
+    url = f"/api/teams/{token}"
+
+    # The container's stdout: a pipe read by another process
+    if args.reader_rate:
+        command = [sys.executable, "-c", SLOW_READER.replace("RATE", str(args.reader_rate))]
+    else:
+        command = ["cat"]
+    reader = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    pipe = io.TextIOWrapper(reader.stdin, line_buffering=True)
+    root = logging.getLogger()
+
+    def run(mode):
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        if mode == "sync":
+            logs.flush()
+            root.addHandler(logging.StreamHandler(pipe))
+            root.setLevel(logging.DEBUG)
+        else:
+            logs.configure(level="DEBUG" if mode == "queued" else "INFO", stream=pipe)
+        payloads = [make_payload(args.events) for _ in range(args.requests)]
+        measure(client, url, payloads[:100])  # warm up
+        latency = measure(client, url, payloads)
+        cost = call_cost(backend.app.logger, payloads[0])
+        return (cost, *latency)
+
+    results = [(mode, *run(mode)) for mode in ("off", "sync", "queued")]
+    logs.flush()
+    pipe.close()
+    reader.wait()
+    stub.stop()
+
+    print(f"requests={args.requests} events/payload={args.events} reader rate={args.reader_rate or 'unlimited'}")
+    for mode, cost, p50, p99 in results:
+        print(f"  {mode:6s} debug call {cost * 1e6:8.1f}us  "
+              f"handler latency p50={p50 * 1000:.3f}ms p99={p99 * 1000:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
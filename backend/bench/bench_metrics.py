@@ -0,0 +1,81 @@
+"""
+Benchmark the cost of the metrics instrumentation on the hot path.
+
+Times each kind of metric update, the timed SQLite cursor and /metrics
+exposition, then adds up what one request of --events events pays:
+
+    python bench/bench_metrics.py --events 1 10 100
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+
+from metrics import DB_QUERY_SECONDS, DELIVERED, EVENTS_RECEIVED, HTTP_SECONDS, INGEST_SECONDS, expose, token_label
+from models import sqlite_connect_args
+
+TOKEN = "0b6f4a8e-0d4c-4a54-9a5e-6a3c1f8e2b11"
+
+
+def per_call(statement, number, setup="pass", namespace=None):
+    return min(timeit.repeat(statement, setup, number=number, repeat=5, globals=namespace)) / number
+
+
+def query_overhead(number, rounds=20):
+    """
+    Cost of the timed cursor on a trivial SQLite query. Runs alternate
+    between the engines since a single query is noisy to time.
+    """
+    plain = create_engine(f"sqlite:///{tempfile.mkdtemp()}/plain.db")
+    timed = create_engine(f"sqlite:///{tempfile.mkdtemp()}/timed.db", connect_args=sqlite_connect_args())
+    connections = [plain.connect(), timed.connect()]
+    costs = [float("inf"), float("inf")]
+    query = text("SELECT 1")
+    for _ in range(rounds):
+        for i, connection in enumerate(connections):
+            cost = timeit.timeit(lambda: connection.execute(query), number=number) / number
+            costs[i] = min(costs[i], cost)
+    for connection in connections:
+        connection.close()
+    return costs[1] - costs[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    namespace = {
+        "EVENTS_RECEIVED": EVENTS_RECEIVED, "DELIVERED": DELIVERED, "HTTP_SECONDS": HTTP_SECONDS,
+        "INGEST_SECONDS": INGEST_SECONDS, "DB_QUERY_SECONDS": DB_QUERY_SECONDS, "TOKEN": TOKEN,
+        "token_label": token_label,
+    }
+    counter = per_call("EVENTS_RECEIVED.labels(token_label(TOKEN), 'ZONE_CHANGE').inc()", args.number, namespace=namespace)
+    observe = per_call("HTTP_SECONDS.labels('hooks.slack.com').observe(0.042)", args.number, namespace=namespace)
+    timer = per_call("with INGEST_SECONDS.labels('slack').time(): pass", args.number, namespace=namespace)
+    query = query_overhead(args.number // 50)
+    scrape = per_call("expose()", 100, namespace={"expose": expose})
+
+    print(f"counter inc        {counter * 1e6:6.2f}us")
+    print(f"histogram observe  {observe * 1e6:6.2f}us")
+    print(f"timer block        {timer * 1e6:6.2f}us")
+    print(f"timed cursor       {query * 1e6:6.2f}us per statement")
+    print(f"/metrics           {scrape * 1e3:6.2f}ms per scrape")
+
+    # Per event: delivered counter and one post (worst case, no digests).
+    # Per request: received counter, ingest and render timers and ~3 statements
+    # (insert, select ids, ack delete).
+    for events in args.events:
+        per_request = counter + 2 * timer + 3 * query
+        per_event = counter + observe + per_request / events
+        print(f"{events:4d} events/request: {per_event * 1e6:6.2f}us of instrumentation per event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark outbox insert throughput against a temporary SQLite database.
+
+The target is sustaining 10k events/min (~167 events/sec) of ingest:
+
+    python bench/bench_outbox.py --events 10000 --batch 10
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import make_payload
+
+TARGET_PER_MINUTE = 10000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=10000, help="total events to insert")
+    parser.add_argument("--batch", type=int, default=10, help="events per incoming payload")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATA_DIR"] = tmp
+
+    import app as backend
+
+    message = json.dumps({"blocks": [{"type": "section", "text": {"type": "mrkdwn", "text": "x" * 400}}]}).encode()
+    event = make_payload(1)["telemetryEvents"][0]
+    batches = max(args.events // args.batch, 1)
+
+    start = time.perf_counter()
+    for _ in range(batches):
+        backend.outbox.add_batch([("bench", "slack", message, event)] * args.batch)
+    elapsed = time.perf_counter() - start
+
+    inserted = batches * args.batch
+    per_minute = inserted / elapsed * 60
+    print(f"inserted {inserted} events in {batches} transactions in {elapsed:.2f}s")
+    print(f"  {inserted / elapsed:.0f} events/sec, {per_minute:.0f} events/min "
+          f"({per_minute / TARGET_PER_MINUTE:.1f}x the 10k/min target)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark rendering through the platform registry against calling the renderer.
+
+Renders the bench_render corpus in payload-sized chunks, once with
+Renderer.render_many(platform, events) and once through
+Platforms.render_many(platform, events) as the ingest path does, and checks
+that both produce the same bytes. The registry adds one dict lookup per
+payload, so the two should match within noise:
+
+    python bench/bench_platforms.py --events 100000 --payload 1 10 100
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_render import make_corpus
+from platforms import Platforms
+from renderer import DEFAULT_TEMPLATES, Renderer
+
+
+def best_of(repeat, *functions):
+    """
+    Fastest of `repeat` runs of each function, in seconds. The runs are
+    interleaved so that drift in machine load affects all of them alike.
+    """
+    best = [float("inf")] * len(functions)
+    for _ in range(repeat):
+        for i, function in enumerate(functions):
+            gc.collect()
+            start = time.perf_counter()
+            function()
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--payload", type=int, nargs="+", default=[1, 10, 100], help="events per payload")
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.events)
+    renderer = Renderer.from_files(DEFAULT_TEMPLATES)
+    platforms = Platforms(renderer)
+
+    for name in platforms.names():
+        for size in args.payload:
+            chunks = [corpus[i:i + size] for i in range(0, len(corpus), size)]
+            if name in renderer.platforms():
+                def direct():
+                    return [renderer.render_many(name, chunk) for chunk in chunks]
+            else:
+                render = platforms.get(name).render
+
+                def direct():
+                    return [render(chunk) for chunk in chunks]
+
+            def registry():
+                return [platforms.render_many(name, chunk) for chunk in chunks]
+
+            same = direct() == registry()
+            direct_time, registry_time = best_of(args.repeat, direct, registry)
+            print(f"{name:8} {size:>4} events/payload: direct {len(corpus) / direct_time:>10,.0f} renders/s, "
+                  f"registry {len(corpus) / registry_time:>10,.0f} renders/s "
+                  f"({(registry_time / direct_time - 1) * 100:+.1f}% time)"
+                  f"{'' if same else ', OUTPUT DIFFERS'}")
+
+
+if __name__ == "__main__":
+    main()
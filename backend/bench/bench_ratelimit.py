@@ -0,0 +1,91 @@
+"""
+Benchmark delivering a large UltraDNS payload to a throttling chat service.
+
+A stub receiver rejects more than --stub-rate posts per second with 429, like
+Slack incoming webhooks. With rate limiting and digests the events arrive in a
+handful of posts without being throttled:
+
+    python bench/bench_ratelimit.py --events 300
+    python bench/bench_ratelimit.py --events 30 --no-limit
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ingest import make_payload
+from stub_server import StubReceiver
+
+
+def count_events(platform, body):
+    message = json.loads(body)
+    if platform == "slack":
+        header = message["blocks"][0]["text"]["text"]
+    else:
+        header = message["summary"]
+    # Digests are titled "<n> UltraDNS events", single events are not
+    first = header.split(" ", 1)[0]
+    return int(first) if header.endswith("UltraDNS events") and first.isdigit() else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=300)
+    parser.add_argument("--platform", choices=["slack", "teams"], default="slack")
+    parser.add_argument("--stub-rate", type=int, default=1, help="posts/sec the stub accepts")
+    parser.add_argument("--no-limit", action="store_true", help="disable rate limiting and digests")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATA_DIR"] = tmp
+    os.environ["DELIVERY_QUEUE_SIZE"] = str(args.events * 2)
+    if args.no_limit:
+        os.environ["DELIVERY_RATE_SLACK"] = os.environ["DELIVERY_RATE_TEAMS"] = "0"
+        os.environ["DIGEST_MAX_EVENTS"] = "1"
+    else:
+        # Stay just under the stub's limit to absorb timing jitter at the window edge
+        os.environ["DELIVERY_RATE_SLACK"] = os.environ["DELIVERY_RATE_TEAMS"] = str(args.stub_rate * 0.9)
+
+    stub = StubReceiver(rate_limit=args.stub_rate).start()
+
+    import app as backend
+
+    token = str(uuid.uuid4())
+    with backend.app.app_context():
+        backend.db.session.add(backend.WebhookConnection(
+            type=args.platform, token=token, webhook_url=stub.url, status="verified"))
+        backend.db.session.commit()
+
+    payload = make_payload(args.events)
+    if args.platform == "teams":
+        # Teams only delivers the first event of each payload, so post them one by one
+        payloads = [{"telemetryEvents": [event]} for event in payload["telemetryEvents"]]
+    else:
+        payloads = [payload]
+
+    client = backend.app.test_client()
+    start = time.perf_counter()
+    for body in payloads:
+        client.post(f"/api/{args.platform}/{token}", json=body)
+
+    delivered = 0
+    deadline = time.monotonic() + 120
+    while delivered < args.events and time.monotonic() < deadline:
+        time.sleep(0.05)
+        delivered = sum(count_events(args.platform, body) for body in list(stub.bodies))
+    elapsed = time.perf_counter() - start
+    stub.stop()
+
+    print(f"{args.events} events, stub accepts {args.stub_rate} post/s, "
+          f"{'no limiter' if args.no_limit else 'limiter + digests'}")
+    print(f"  {delivered}/{args.events} events delivered in {len(stub.bodies)} posts "
+          f"in {elapsed:.2f}s, {stub.throttled} posts throttled with 429")
+
+
+if __name__ == "__main__":
+    main()
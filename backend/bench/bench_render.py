@@ -0,0 +1,222 @@
+"""
+Benchmark renders/sec of the template renderer over a 100k-event corpus.
+
+Also checks that the default templates are byte-compatible with the previous
+dict-building transform functions (kept below for comparison). The Slack
+template now lists detail.changes, which the old function left out, so Slack
+is only compared on events without them:
+
+    python bench/bench_render.py --events 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from renderer import DEFAULT_TEMPLATES, Renderer
+
+OBJECT_TYPES = ["Zone", "RRSet", "Pool", "User", "Account"]
+CHANGE_TYPES = ["CREATE", "UPDATE", "DELETE"]
+
+
+# Previous implementation, kept as the compatibility and speed baseline
+def transform_to_slack_block(event):
+    """
+    Transform UltraDNS JSON event to Slack Blocks.
+    """
+    telemetry_event = event.get('telemetryEvent', {})
+    account_name = event.get('accountName', 'Unknown Account')
+    telemetry_event_type = event.get('telemetryEventType', 'Unknown Event')
+    object_type = telemetry_event.get('objectType', 'Unknown Object')
+    change_type = telemetry_event.get('changeType', 'Unknown Change')
+    change_time = telemetry_event.get('changeTime', 'Unknown Time')
+    ultra_object = telemetry_event.get('object', 'Unknown Object')
+    ultra_user = telemetry_event.get('user', 'Unknown User')
+    change_source = telemetry_event.get('application', 'Unknown Application')
+
+    # Prepare fields
+    fields = [
+        {"type": "mrkdwn", "text": "*Time:*"}, {"type": "mrkdwn", "text": change_time},
+        {"type": "mrkdwn", "text": "*Object Type:*"}, {"type": "mrkdwn", "text": object_type},
+        {"type": "mrkdwn", "text": "*Change Type:*"}, {"type": "mrkdwn", "text": change_type},
+        {"type": "mrkdwn", "text": "*Object:*"}, {"type": "mrkdwn", "text": ultra_object},
+        {"type": "mrkdwn", "text": "*Account:*"}, {"type": "mrkdwn", "text": account_name},
+        {"type": "mrkdwn", "text": "*User:*"}, {"type": "mrkdwn", "text": ultra_user},
+        {"type": "mrkdwn", "text": "*Application:*"}, {"type": "mrkdwn", "text": change_source},
+    ]
+
+    # Split fields into chunks of 10
+    field_sections = []
+    for i in range(0, len(fields), 10):
+        field_sections.append(fields[i:i+10])
+
+    # Construct Slack blocks
+    slack_blocks = [
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": f"{account_name} {telemetry_event_type} {object_type} {change_type}",
+                "emoji": True
+            }
+        }
+    ]
+
+    for section in field_sections:
+        slack_blocks.append({
+            "type": "section",
+            "fields": section
+        })
+
+    return {"blocks": slack_blocks}
+
+def transform_to_teams_card(event):
+    """
+    Transform UltraDNS JSON event to a Teams Adaptive Card.
+    """
+    # Top-level attributes
+    account_name = event.get('accountName', 'Unknown Account')
+    telemetry_event_type = event.get('telemetryEventType', 'Unknown Event')
+    telemetry_event_time = event.get('telemetryEventTime', 'Unknown Time')
+
+    # Nested telemetryEvent attributes
+    telemetry_event = event.get('telemetryEvent', {})
+    object_type = telemetry_event.get('objectType', 'Unknown Object')
+    change_type = telemetry_event.get('changeType', 'Unknown Change')
+    change_time = telemetry_event.get('changeTime', telemetry_event_time)
+    ultra_object = telemetry_event.get('object', 'Unknown Object')
+    ultra_user = telemetry_event.get('user', 'Unknown User')
+    change_source = telemetry_event.get('application', 'Unknown Application')
+
+    # Define Teams card
+    teams_message = {
+        "summary": f"{account_name} {telemetry_event_type} {object_type} {change_type}",
+        "attachments": [
+            {
+                "contentType": "application/vnd.microsoft.card.adaptive",
+                "content": {
+                    "type": "AdaptiveCard",
+                    "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+                    "version": "1.2",
+                    "body": [
+                        {
+                            "type": "TextBlock",
+                            "text": f"**{account_name} {telemetry_event_type}**",
+                            "weight": "Bolder",
+                            "size": "Medium"
+                        },
+                        {
+                            "type": "FactSet",
+                            "facts": [
+                                {"title": "Time", "value": change_time},
+                                {"title": "Object Type", "value": object_type},
+                                {"title": "Change Type", "value": change_type},
+                                {"title": "Object", "value": ultra_object},
+                                {"title": "Account", "value": account_name},
+                                {"title": "User", "value": ultra_user},
+                                {"title": "Application", "value": change_source}
+                            ]
+                        }
+                    ]
+                }
+            }
+        ]
+    }
+
+    # Handle additional changes if present
+    detail = telemetry_event.get('detail', {})
+    changes = detail.get('changes', [])
+    if changes:
+        additional_facts = []
+        for change in changes:
+            additional_facts.extend([
+                {"title": "Value", "value": change.get('value', '-')},
+                {"title": "From", "value": change.get('from', '-')},
+                {"title": "To", "value": change.get('to', '-')}
+            ])
+        # Append additional facts to the FactSet
+        teams_message["attachments"][0]["content"]["body"][1]["facts"].extend(additional_facts)
+
+    return teams_message
+
+
+LEGACY = {"slack": transform_to_slack_block, "teams": transform_to_teams_card}
+
+
+def has_changes(event):
+    telemetry_event = event.get("telemetryEvent", {})
+    return bool(telemetry_event.get("detail", {}).get("changes"))
+
+
+# Events each legacy function still renders the way the template does
+COMPARABLE = {"slack": lambda event: not has_changes(event), "teams": lambda event: True}
+
+
+def make_corpus(size, seed=42):
+    """
+    Realistic events plus the awkward cases: missing fields, nulls, numbers,
+    non-ASCII text and detail.changes of varying length.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        event = {
+            "accountName": rng.choice(["acme", "exämple-корп", "ops"]),
+            "telemetryEventId": f"id-{i}",
+            "telemetryEventType": "ZONE_CHANGE",
+            "telemetryEventTime": "2025-01-21 10:00:00.000",
+            "telemetryEvent": {
+                "objectType": rng.choice(OBJECT_TYPES),
+                "changeType": rng.choice(CHANGE_TYPES),
+                "changeTime": "2025-01-21 10:00:00.000",
+                "object": f"www{i}.example.com.",
+                "user": rng.choice(["alice", "bob \"the admin\"", None]),
+                "application": "Portal",
+            },
+        }
+        roll = rng.random()
+        if roll < 0.3:
+            event["telemetryEvent"]["detail"] = {"changes": [
+                {"value": f"10.0.0.{n}", "from": n, "to": None} if n % 2 else {"value": "ttl"}
+                for n in range(rng.randint(1, 6))
+            ]}
+        elif roll < 0.35:
+            del event["telemetryEvent"]["changeTime"]
+            del event["accountName"]
+        elif roll < 0.37:
+            del event["telemetryEvent"]
+        corpus.append(event)
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--templates", default=DEFAULT_TEMPLATES)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.events)
+    renderer = Renderer.from_files(args.templates)
+
+    for platform, legacy in LEGACY.items():
+        start = time.perf_counter()
+        expected = [json.dumps(legacy(event)).encode() for event in corpus]
+        legacy_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rendered = renderer.render_many(platform, corpus)
+        elapsed = time.perf_counter() - start
+
+        comparable = COMPARABLE[platform]
+        mismatches = sum(1 for event, a, b in zip(corpus, expected, rendered) if comparable(event) and a != b)
+        print(f"{platform}: legacy {len(corpus) / legacy_elapsed:,.0f} renders/s, "
+              f"compiled {len(corpus) / elapsed:,.0f} renders/s "
+              f"({legacy_elapsed / elapsed:.1f}x), {mismatches} byte mismatches")
+
+
+if __name__ == "__main__":
+    main()
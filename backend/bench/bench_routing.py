@@ -0,0 +1,108 @@
+"""
+Benchmark route matching and fan-out against a linear scan of the filters.
+
+Builds a RouteTable of --routes destinations with random filters and compares
+matching --events events through the compiled index with checking every
+route's filters in turn, then times a full fan-out (match + render once per
+platform) against rendering every message per destination:
+
+    python bench/bench_routing.py --routes 10 100 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from renderer import DEFAULT_TEMPLATES, Renderer
+from routing import FILTER_FIELDS, Destination, RouteTable, event_fields
+
+EVENT_TYPES = ["ZONE_CHANGE", "RECORD_CHANGE", "USER_CHANGE", "TEST_TELEMETRY_WEBHOOK"]
+OBJECT_TYPES = ["Zone", "Record", "User", "Pool", "Probe"]
+CHANGE_TYPES = ["CREATE", "UPDATE", "DELETE", "LOGIN"]
+ACCOUNTS = [f"account{i}" for i in range(20)]
+CHOICES = [EVENT_TYPES, OBJECT_TYPES, CHANGE_TYPES, ACCOUNTS]
+
+
+def make_routes(count, rng):
+    routes = []
+    for i in range(count):
+        filters = {}
+        for field, choices in zip(FILTER_FIELDS, CHOICES):
+            if rng.random() < 0.4:
+                filters[field] = rng.sample(choices, rng.randint(1, 2))
+        platform = rng.choice(["slack", "teams"])
+        routes.append((Destination(f"token/{i}", platform, "http://127.0.0.1/"), filters))
+    return routes
+
+
+def make_event(rng):
+    return {
+        "accountName": rng.choice(ACCOUNTS),
+        "telemetryEventType": rng.choice(EVENT_TYPES),
+        "telemetryEventTime": "2025-01-21 10:00:00.000",
+        "telemetryEvent": {
+            "objectType": rng.choice(OBJECT_TYPES),
+            "changeType": rng.choice(CHANGE_TYPES),
+            "changeTime": "2025-01-21 10:00:00.000",
+            "object": "example.com.",
+            "user": "bench",
+            "application": "Portal",
+        },
+    }
+
+
+def scan(routes, event):
+    """
+    The naive approach: check every route's filters.
+    """
+    values = event_fields(event)
+    return [
+        destination for destination, filters in routes
+        if all(value in filters[field] for field, value in zip(FILTER_FIELDS, values) if field in filters)
+    ]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--routes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    renderer = Renderer.from_files(DEFAULT_TEMPLATES)
+    rng = random.Random(args.seed)
+    events = [make_event(rng) for _ in range(args.events)]
+
+    for count in args.routes:
+        routes = make_routes(count, rng)
+        table = RouteTable(routes)
+
+        scan_time, expected = timed(lambda: [scan(routes, event) for event in events])
+        index_time, got = timed(lambda: [table.select(table.match(event)) for event in events])
+        assert got == expected, "index and scan disagree"
+        messages = sum(len(matched) for matched in got)
+
+        fan_time, entries = timed(lambda: table.fan_out(events, renderer.render_many))
+        naive_time, _ = timed(lambda: [
+            renderer.render(destination.type, event) for event, matched in zip(events, expected) for destination in matched
+        ])
+        assert len(entries) == messages
+
+        print(f"routes={count}: {messages} messages for {len(events)} events")
+        print(f"  match  scan {scan_time / len(events) * 1e6:8.1f}us/event  "
+              f"index {index_time / len(events) * 1e6:6.1f}us/event  ({scan_time / index_time:.1f}x)")
+        print(f"  fan-out  render per destination {naive_time:.3f}s  "
+              f"render once per platform {fan_time:.3f}s  ({naive_time / fan_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
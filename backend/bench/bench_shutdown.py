@@ -0,0 +1,178 @@
+"""
+Stop the backend with SIGTERM in the middle of a load test and check that no
+accepted event is lost.
+
+Starts gunicorn against a temporary data directory with a generic webhook
+posting to a local stub receiver, rate limited so that a backlog builds up,
+and posts one-event payloads from concurrent clients. After --stop-after
+seconds the gunicorn master gets SIGTERM, as from `docker compose up -d`;
+the clients keep posting and count the 503s and refused connections. Once it
+has exited, the outbox rows left on the data volume are counted, gunicorn is
+started again on the same directory, and the script waits until every
+accepted event has reached the stub:
+
+    python bench/bench_shutdown.py --rate 20 --stop-after 5
+    python bench/bench_shutdown.py --asgi --shutdown-timeout 1
+
+Reports the events accepted, those delivered before and after the restart,
+duplicates and lost events, and how long the shutdown took.
+"""
+import argparse
+import itertools
+import json
+import os
+import signal
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench_workers import register_webhook, start_backend
+from stub_server import StubReceiver
+
+
+def make_event(event_id):
+    return {"telemetryEvents": [{
+        "accountName": "bench",
+        "telemetryEventId": event_id,
+        "telemetryEventType": "ZONE_CHANGE",
+        "telemetryEventTime": "2025-01-21 10:00:00.000",
+        "telemetryEvent": {
+            "objectType": "Zone",
+            "changeType": "UPDATE",
+            "changeTime": "2025-01-21 10:00:00.000",
+            "object": f"{event_id}.example.com.",
+            "user": "bench",
+            "application": "Portal",
+        },
+    }]}
+
+
+class Load:
+    """
+    Clients posting one new event per request until stopped.
+    """
+
+    def __init__(self, url, clients):
+        self.url = url
+        self.accepted = set()
+        self.statuses = Counter()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._client, daemon=True) for _ in range(clients)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _client(self):
+        session = requests.Session()
+        while not self._stop.is_set():
+            event_id = f"shutdown-{next(self._ids)}"
+            try:
+                response = session.post(self.url, json=make_event(event_id), timeout=10)
+                status = response.status_code
+            except requests.RequestException:
+                status = "refused"
+                time.sleep(0.05)
+            with self._lock:
+                self.statuses[status] += 1
+                if status == 202:
+                    self.accepted.add(event_id)
+
+
+def delivered_ids(stub):
+    """
+    Count of every bench event id in the posts the stub received.
+    """
+    ids = Counter()
+    for body in list(stub.bodies):
+        for event in json.loads(body).get("telemetryEvents", []):
+            if event.get("telemetryEventId", "").startswith("shutdown-"):
+                ids[event["telemetryEventId"]] += 1
+    return ids
+
+
+def outbox_rows(data_dir):
+    with sqlite3.connect(os.path.join(data_dir, "data.db")) as db:
+        return dict(db.execute("SELECT state, count(*) FROM outbox_event GROUP BY state").fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=20, help="DELIVERY_RATE_GENERIC, messages per second")
+    parser.add_argument("--stop-after", type=float, default=5, help="seconds of load before SIGTERM")
+    parser.add_argument("--shutdown-timeout", type=float, default=3, help="SHUTDOWN_TIMEOUT")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="seconds to wait for delivery after restart")
+    parser.add_argument("--port", type=int, default=18087)
+    parser.add_argument("--asgi", action="store_true", help="serve ingest from asgi.py")
+    args = parser.parse_args()
+
+    settings = {
+        "ASYNC_INGEST": "true" if args.asgi else "false",
+        "DELIVERY_RATE_GENERIC": str(args.rate),
+        # One post per event, so the backlog is not folded into a few digests
+        "DIGEST_MAX_EVENTS": "1",
+        "SHUTDOWN_TIMEOUT": str(args.shutdown_timeout),
+        "LOG_LEVEL": "WARNING",
+    }
+    stub = StubReceiver().start()
+    data_dir = tempfile.mkdtemp(prefix="bench-shutdown-")
+    process, base_url = start_backend(args.workers, args.port, data_dir, **settings)
+    token = register_webhook(base_url, data_dir, stub.url, "generic")
+
+    load = Load(f"{base_url}/api/generic/{token}", args.clients).start()
+    time.sleep(args.stop_after)
+    before = load.statuses.copy()
+    stopping = time.monotonic()
+    process.send_signal(signal.SIGTERM)
+    process.wait()
+    stopped = time.monotonic() - stopping
+    load.stop()
+    during = load.statuses - before
+    first_run = delivered_ids(stub)
+    left = outbox_rows(data_dir)
+
+    restarting = time.monotonic()
+    process, base_url = start_backend(args.workers, args.port, data_dir, **settings)
+    try:
+        deadline = time.monotonic() + args.drain_timeout
+        while not load.accepted <= delivered_ids(stub).keys() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        drained = time.monotonic() - restarting
+    finally:
+        process.terminate()
+        process.wait()
+        stub.stop()
+
+    delivered = delivered_ids(stub)
+    lost = load.accepted - delivered.keys()
+    duplicates = sum(count - 1 for count in delivered.values())
+    print(f"{'asgi' if args.asgi else 'wsgi'} workers={args.workers}, {args.rate:g} msg/s, "
+          f"SHUTDOWN_TIMEOUT={args.shutdown_timeout:g}s")
+    print(f"accepted {len(load.accepted)} events; statuses before SIGTERM {dict(before)}, after {dict(during)}")
+    print(f"shutdown took {stopped:.2f}s; {len(first_run)} events delivered before, outbox rows left {left}")
+    print(f"after restart all delivered in {drained:.2f}s" if not lost else
+          f"after restart {len(lost)} events still missing after {drained:.0f}s")
+    print(f"lost {len(lost)}, duplicates {duplicates}")
+    sys.exit(1 if lost else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark cold start: import time, bytecode, time to first request and memory.
+
+Runs each measurement in fresh processes against a migrated temporary data
+directory:
+
+- `python -X importtime -c "import app"`, reporting the total import time,
+  the modules that took longest on their own and the top-level imports that
+  took longest in all, and the resident memory after the import;
+- importing the app from a copy of its modules without bytecode and from one
+  precompiled with compileall, as the Docker image does (PYTHONDONTWRITEBYTECODE
+  keeps the first copy without bytecode);
+- gunicorn from launch until it answers its first request and until
+  READY_PATH reports ready, with the memory of its process tree.
+
+    python bench/bench_startup.py --runs 5 --workers 2
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from perf import process_tree_rss
+
+IMPORT_APP = ("import resource, time; start = time.perf_counter(); import app; "
+              "print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)")
+
+
+def environment(data_dir, **settings):
+    env = dict(os.environ, DATA_DIR=data_dir, LOG_LEVEL="ERROR", PYTHONDONTWRITEBYTECODE="1")
+    env.update(settings)
+    return env
+
+
+def migrate(data_dir):
+    subprocess.run([sys.executable, "migrations.py"], cwd=BACKEND_DIR, env=environment(data_dir),
+                   stdout=subprocess.DEVNULL, check=True)
+
+
+def import_app(cwd, env, *options):
+    """
+    (seconds, max RSS in bytes, stderr) of importing the app in a new process.
+    """
+    result = subprocess.run([sys.executable, *options, "-c", IMPORT_APP], cwd=cwd, env=env,
+                            capture_output=True, text=True, check=True)
+    seconds, rss = result.stdout.split()[-2:]
+    return float(seconds), int(rss), result.stderr
+
+
+def parse_importtime(stderr):
+    """
+    {module: (self µs, cumulative µs)} from -X importtime output.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+def report_importtime(data_dir, top):
+    _, rss, stderr = import_app(BACKEND_DIR, environment(data_dir), "-X", "importtime")
+    modules = parse_importtime(stderr)
+    print(f"import app: {modules['app'][1] / 1000:.0f} ms cumulative, {modules['app'][0] / 1000:.0f} ms own, "
+          f"{len(modules)} modules, max RSS {rss / 1e6:.0f} MB")
+    print(f"slowest {top} modules on their own:")
+    for name, (own, cumulative) in sorted(modules.items(), key=lambda item: -item[1][0])[:top]:
+        print(f"  {own / 1000:7.1f} ms  {name}")
+    print(f"slowest {top} top-level imports, cumulative:")
+    packages = {name: times for name, times in modules.items() if "." not in name and name != "app"}
+    for name, (own, cumulative) in sorted(packages.items(), key=lambda item: -item[1][1])[:top]:
+        print(f"  {cumulative / 1000:7.1f} ms  {name}")
+
+
+def copy_backend(target):
+    shutil.copytree(BACKEND_DIR, target, ignore=shutil.ignore_patterns("__pycache__", "data", "bench"))
+    return target
+
+
+def report_bytecode(data_dir, runs):
+    scratch = tempfile.mkdtemp(prefix="bench-startup-")
+    source = copy_backend(os.path.join(scratch, "source"))
+    compiled = copy_backend(os.path.join(scratch, "compiled"))
+    subprocess.run([sys.executable, "-m", "compileall", "-q", "--invalidation-mode", "unchecked-hash", compiled],
+                   check=True)
+    env = environment(data_dir)
+    for name, cwd in (("without bytecode", source), ("precompiled", compiled)):
+        times = [import_app(cwd, env)[0] for _ in range(runs)]
+        print(f"import app {name:16}: median {statistics.median(times) * 1000:5.0f} ms, "
+              f"min {min(times) * 1000:5.0f} ms")
+    shutil.rmtree(scratch)
+
+
+def time_gunicorn(data_dir, workers, port, ready_path):
+    """
+    (seconds to the first answer, seconds until ready, RSS of the process tree).
+    """
+    env = environment(data_dir, WEB_WORKERS=str(workers), PORT=str(port), READY_PATH=ready_path)
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], cwd=BACKEND_DIR,
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}{ready_path}"
+    first = ready = None
+    try:
+        while ready is None and time.perf_counter() - start < 30:
+            try:
+                response = requests.get(url, timeout=1)
+            except requests.ConnectionError:
+                time.sleep(0.01)
+                continue
+            first = first or time.perf_counter() - start
+            if response.status_code == 200:
+                ready = time.perf_counter() - start
+            else:
+                time.sleep(0.01)
+        rss = process_tree_rss(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+    if ready is None:
+        raise RuntimeError("backend did not get ready")
+    return first, ready, rss
+
+
+def report_gunicorn(data_dir, runs, workers, port):
+    results = [time_gunicorn(data_dir, workers, port, "/ready") for _ in range(runs)]
+    first, ready, rss = (statistics.median(values) for values in zip(*results))
+    print(f"gunicorn {workers} workers: first answer after {first * 1000:.0f} ms, ready after {ready * 1000:.0f} ms, "
+          f"RSS {rss / 1e6:.0f} MB (medians of {runs})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=18087)
+    parser.add_argument("--top", type=int, default=15, help="modules to list from -X importtime")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="bench-startup-data-")
+    migrate(data_dir)
+    report_importtime(data_dir, args.top)
+    report_bytecode(data_dir, args.runs)
+    report_gunicorn(data_dir, args.runs, args.workers, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Count the SQLite statements a dashboard causes, polling versus streaming.
+
+Runs the app on a local HTTP server against a temporary database. A simulated
+dashboard first polls /api/status and /api/setup every --interval seconds the
+way the frontend used to (the old handlers are replayed for comparison), then
+stays connected to /api/status/stream for --idle seconds. Finally UltraDNS
+test telemetry verifies the webhook, and the time until the stream reports it
+is measured:
+
+    python bench/bench_status.py --idle 30
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import event
+from werkzeug.serving import make_server
+
+from stub_server import StubReceiver
+
+
+class StatementCounter:
+    """
+    Counts statements on the tables behind the status endpoints. The outbox,
+    history and dedup threads keep their own schedule and are left out.
+    """
+    TABLES = re.compile(r"\b(user|setting|webhook_connection)\b")
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, connection, cursor, statement, *args):
+        if self.TABLES.search(statement):
+            self.count += 1
+
+
+def legacy_status(backend):
+    """
+    The queries of /api/status and GET /api/setup before the status board.
+    """
+    with backend.app.app_context():
+        backend.User.query.filter_by(username='admin').first()
+        backend.WebhookConnection.query.count()
+        backend.db.session.get(backend.Setting, 'setup_complete')
+        backend.WebhookConnection.query.all()
+        backend.User.query.filter_by(username='admin').first()
+        backend.WebhookConnection.query.count()
+        backend.db.session.get(backend.Setting, 'setup_complete')
+
+
+def read_events(response, received):
+    """
+    Collect the status documents of a server-sent event stream.
+    """
+    data = []
+    for line in response.iter_lines():
+        if line.startswith("data:"):
+            data.append(line[5:].strip())
+        elif not line and data:
+            received.append((time.perf_counter(), json.loads("\n".join(data))))
+            data = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--idle", type=float, default=30, help="seconds the dashboard stays idle")
+    parser.add_argument("--interval", type=float, default=3, help="polling interval of the old frontend")
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp()
+    os.environ["STATUS_STREAM_INTERVAL"] = "1"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LOG_LEVELS", "werkzeug=WARNING")
+    stub = StubReceiver().start()
+
+    import app as backend
+
+    server = make_server("127.0.0.1", 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = httpx.Client(base_url=f"http://127.0.0.1:{server.server_port}",
+                          headers={"X-Api-Token": backend.INTERNAL_API_TOKEN}, timeout=None)
+    assert client.post("/api/login", json={"password": "bench"}).status_code == 200
+    token = client.post("/api/setup", json={"webhook_url": stub.url, "platform": "teams"}).json()["token"]
+    with backend.app.app_context():
+        statements = StatementCounter(backend.db.engine)
+
+    polls = max(1, int(args.idle / args.interval))
+    statements.count = 0
+    for _ in range(polls):
+        legacy_status(backend)
+    legacy = statements.count
+    statements.count = 0
+    # GET /api/setup marks the setup complete once a webhook exists, then the snapshot is reloaded once
+    for _ in range(2):
+        client.get("/api/status").raise_for_status()
+        client.get("/api/setup").raise_for_status()
+    reload = statements.count
+    statements.count = 0
+    for _ in range(polls):
+        client.get("/api/status").raise_for_status()
+        client.get("/api/setup").raise_for_status()
+    print(f"{polls} polls in {args.idle:.0f}s: {legacy} statements before, {statements.count} now "
+          f"(plus {reload} once after the setup changed)")
+
+    received = []
+    with client.stream("GET", "/api/status/stream") as response:
+        assert response.status_code == 200, response.status_code
+        threading.Thread(target=read_events, args=(response, received), daemon=True).start()
+        statements.count = 0
+        time.sleep(args.idle)
+        print(f"stream idle for {args.idle:.0f}s: {statements.count} statements, {len(received)} status event(s)")
+
+        test = {"telemetryEvents": [{"accountName": "bench", "telemetryEventId": str(uuid.uuid4()),
+                                     "telemetryEventType": "TEST_TELEMETRY_WEBHOOK",
+                                     "telemetryEventTime": "2025-01-21 10:00:00.000", "telemetryEvent": {}}]}
+        statements.count = 0
+        sent = time.perf_counter()
+        assert client.post(f"/api/teams/{token}", json=test).status_code == 202
+        while not any(document["webhooks"][0]["status"] == "verified" for _, document in received):
+            time.sleep(0.001)
+        arrived = next(at for at, document in received if document["webhooks"][0]["status"] == "verified")
+        print(f"verification pushed {(arrived - sent) * 1000:.1f}ms after the test telemetry was posted "
+              f"({statements.count} statements, including the ingest itself)")
+
+    server.shutdown()
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
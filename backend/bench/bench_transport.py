@@ -0,0 +1,67 @@
+"""
+Micro-benchmark per-message latency of cold vs. pooled webhook connections.
+
+Posts to a local TLS stub receiver with a fresh connection per message (the old
+module-level requests.post) and through the pooled HttpTransport:
+
+    python bench/bench_transport.py --messages 300
+    python bench/bench_transport.py --messages 300 --http2
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubReceiver, make_self_signed_cert
+from transport import HttpTransport
+
+
+def measure(post, url, body, messages):
+    latencies = []
+    for _ in range(messages):
+        t0 = time.perf_counter()
+        post(url, body)
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    return latencies
+
+
+def report(label, latencies):
+    print(f"  {label:<8} p50={statistics.median(latencies) * 1000:.2f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}ms "
+          f"mean={statistics.mean(latencies) * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--http2", action="store_true", help="pool with httpx (HTTP/2 when negotiated)")
+    args = parser.parse_args()
+
+    certfile, keyfile = make_self_signed_cert(tempfile.mkdtemp())
+    stub = StubReceiver(tls=(certfile, keyfile)).start()
+    body = json.dumps({"text": "benchmark"}).encode()
+
+    def cold_post(url, data):
+        response = requests.post(url, data=data, headers={"Content-Type": "application/json"},
+                                 verify=certfile, timeout=(5, 10))
+        response.raise_for_status()
+
+    transport = HttpTransport(http2=args.http2, verify=certfile)
+
+    print(f"{args.messages} messages to {stub.url}")
+    report("cold", measure(cold_post, stub.url, body, args.messages))
+    report("pooled", measure(transport.post, stub.url, body, args.messages))
+    transport.close()
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Load test the backend under gunicorn with an increasing number of workers.
+
+Starts gunicorn against a temporary data directory and a local stub receiver,
+registers a Slack webhook through the API, then drives /api/slack/<token> from
+concurrent clients:
+
+    python bench/bench_workers.py --workers 1 2 4 --duration 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench_ingest import make_payload
+from stub_server import StubReceiver
+
+
+def start_backend(workers, port, data_dir, **settings):
+    env = dict(os.environ, DATA_DIR=data_dir, WEB_WORKERS=str(workers), PORT=str(port),
+               DELIVERY_RATE_SLACK="0", DELIVERY_QUEUE_SIZE="100000")
+    env.update(settings)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            requests.get(f"{base_url}/api/gui-status", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("backend did not start")
+
+
+def register_webhook(base_url, data_dir, webhook_url, platform="slack"):
+    with open(os.path.join(data_dir, "secrets.json")) as f:
+        headers = {"X-Api-Token": json.load(f)["api_token"]}
+    requests.post(f"{base_url}/api/setup", json={"password": "bench"}, headers=headers).raise_for_status()
+    response = requests.post(f"{base_url}/api/setup", headers=headers,
+                             json={"webhook_url": webhook_url, "platform": platform})
+    response.raise_for_status()
+    return response.json()["token"]
+
+
+def drive(url, clients, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    body = json.dumps(make_payload(1))
+
+    def client():
+        session = requests.Session()
+        local = []
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            response = session.post(url, data=body, headers={"Content-Type": "application/json"})
+            local.append(time.perf_counter() - t0)
+            if response.status_code != 202:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=18087)
+    args = parser.parse_args()
+
+    # Ingest is CPU bound; throughput can only scale up to the number of cores
+    print(f"{os.cpu_count()} CPU cores, {args.clients} clients, {args.duration:.0f}s per run")
+    stub = StubReceiver().start()
+    for workers in args.workers:
+        data_dir = tempfile.mkdtemp()
+        process, base_url = start_backend(workers, args.port, data_dir)
+        try:
+            token = register_webhook(base_url, data_dir, stub.url)
+            latencies, errors = drive(f"{base_url}/api/slack/{token}", args.clients, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"workers={workers}: {len(latencies) / args.duration:.0f} req/s, "
+              f"p50={statistics.median(latencies) * 1000:.1f}ms "
+              f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms, {errors} errors")
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
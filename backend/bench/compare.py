@@ -0,0 +1,81 @@
+"""
+Compare two perf.py result files and flag regressions.
+
+    python bench/compare.py bench/results/steady-1a2b3c4.json bench/results/steady-5d6e7f8.json
+    python bench/compare.py old.json new.json --threshold 5
+
+Prints each metric of the baseline and candidate runs with the change in
+percent. A metric that got worse by more than --threshold percent is marked
+as a regression, and the exit status is 1 if there is any, so the script can
+gate a CI job. Latency needs a few thousand requests to be stable; compare
+runs of the same scenario, rate and machine.
+"""
+import argparse
+import json
+import sys
+
+# Metric paths in the results, and whether a higher value is better
+METRICS = [
+    ("throughput_rps", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("latency_ms.max", False),
+    ("delivered.slack", True),
+    ("delivered.teams", True),
+    ("drain_seconds", False),
+    ("delivered_per_sec", True),
+    ("peak_rss_mb", False),
+]
+
+
+def lookup(results, path):
+    value = results
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(baseline, candidate, threshold):
+    """
+    Returns [(metric, old, new, change in percent, regressed)].
+    """
+    rows = []
+    for path, higher_is_better in METRICS:
+        old, new = lookup(baseline["results"], path), lookup(candidate["results"], path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        worse = -change if higher_is_better else change
+        rows.append((path, old, new, change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10, help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline["scenario"] != candidate["scenario"] or baseline["config"]["rps"] != candidate["config"]["rps"]:
+        print("warning: the runs used different scenarios or request rates", file=sys.stderr)
+
+    print(f"{baseline['scenario']}: {baseline['commit']} -> {candidate['commit']}")
+    rows = compare(baseline, candidate, args.threshold)
+    for path, old, new, change, regressed in rows:
+        print(f"  {path:20} {old:>10.1f} {new:>10.1f} {change:>+8.1f}%{'  REGRESSION' if regressed else ''}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:g}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
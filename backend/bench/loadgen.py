@@ -0,0 +1,139 @@
+"""
+Replay UltraDNS telemetry payloads against the backend and report latency.
+
+Starts the backend under gunicorn (the threaded Flask app, or the ASGI app with
+--asgi) against a temporary data directory and a local stub receiver, registers
+a webhook, then replays payloads from concurrent async clients:
+
+    python bench/loadgen.py --payloads bench/payloads/sample.jsonl --asgi
+    python bench/loadgen.py --events 20 --requests 500 --concurrency 64
+
+Payload files hold one JSON payload (as POSTed by UltraDNS) per line. Without
+--payloads, synthetic payloads of --events events are generated. Event ids are
+made unique on every replay unless --keep-ids is given.
+"""
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench_ingest import make_payload
+from bench_workers import register_webhook, start_backend
+from stub_server import StubReceiver
+
+
+def load_payloads(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def prepare(payloads, count, keep_ids):
+    """
+    Serialize `count` request bodies, cycling through the captured payloads.
+    """
+    bodies = []
+    for payload in itertools.islice(itertools.cycle(payloads), count):
+        if not keep_ids:
+            payload = copy.deepcopy(payload)
+            for event in payload.get("telemetryEvents", []):
+                event["telemetryEventId"] = str(uuid.uuid4())
+        bodies.append(json.dumps(payload).encode())
+    return bodies
+
+
+def expected_deliveries(bodies):
+    return sum(len(json.loads(body)["telemetryEvents"]) for body in bodies)
+
+
+async def replay(url, bodies, concurrency):
+    latencies = []
+    statuses = Counter()
+    pending = iter(bodies)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def worker():
+            for body in pending:
+                t0 = time.perf_counter()
+                try:
+                    response = await client.post(url, content=body, headers={"Content-Type": "application/json"})
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - t0)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return sorted(latencies), statuses
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[max(int(len(sorted_values) * fraction) - 1, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--payloads", help="JSONL file of captured UltraDNS payloads")
+    parser.add_argument("--events", type=int, default=10, help="events per synthetic payload")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--platform", choices=["slack", "teams"], default="slack")
+    parser.add_argument("--asgi", action="store_true", help="serve the ASGI ingest path")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn worker processes")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub receiver latency in seconds")
+    parser.add_argument("--pool-size", type=int, default=10, help="HTTP connections per webhook host")
+    parser.add_argument("--rate", type=float, default=0, help="per-destination messages/sec, 0 for unlimited")
+    parser.add_argument("--keep-ids", action="store_true")
+    parser.add_argument("--port", type=int, default=18087)
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.payloads) if args.payloads else [make_payload(args.events)]
+    bodies = prepare(payloads, args.requests, args.keep_ids)
+    expected = expected_deliveries(bodies)
+
+    stub = StubReceiver(latency=args.latency).start()
+    data_dir = tempfile.mkdtemp()
+    process, base_url = start_backend(
+        args.workers, args.port, data_dir,
+        ASYNC_INGEST="true" if args.asgi else "false",
+        HTTP_POOL_SIZE=str(args.pool_size),
+        DELIVERY_RATE_SLACK=str(args.rate), DELIVERY_RATE_TEAMS=str(args.rate),
+        # One post per event, so deliveries can be counted at the stub
+        DIGEST_MAX_EVENTS="1",
+    )
+    try:
+        token = register_webhook(base_url, data_dir, stub.url, args.platform)
+        baseline = stub.received  # the setup test message
+        start = time.perf_counter()
+        latencies, statuses = asyncio.run(replay(f"{base_url}/api/{args.platform}/{token}", bodies, args.concurrency))
+        acked = time.perf_counter() - start
+        if statuses.get(202) == len(bodies):
+            stub.wait_for(baseline + expected)
+        delivered = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+        stub.stop()
+
+    print(f"{'asgi' if args.asgi else 'wsgi'} workers={args.workers} requests={len(bodies)} "
+          f"concurrency={args.concurrency} events={expected} stub latency={args.latency * 1000:.0f}ms")
+    print(f"  ingest  p50={statistics.median(latencies) * 1000:.1f}ms p99={percentile(latencies, 0.99) * 1000:.1f}ms "
+          f"max={latencies[-1] * 1000:.1f}ms, {len(bodies) / acked:.0f} req/s, status {dict(statuses)}")
+    print(f"  {stub.received - baseline}/{expected} events delivered in {delivered:.2f}s "
+          f"({(stub.received - baseline) / delivered:.0f} events/sec)")
+
+
+if __name__ == "__main__":
+    main()
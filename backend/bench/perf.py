@@ -0,0 +1,340 @@
+"""
+Run named load scenarios against the backend and save the results as JSON.
+
+Starts the backend under gunicorn against a temporary data directory and two
+stub receivers standing in for Slack and Teams, registers a webhook for each,
+then posts simulated UltraDNS payloads (see simulator.py) to
+/api/slack/<token> and /api/teams/<token> in turn, at a fixed request rate.
+Requests are sent on schedule whether or not earlier ones have been answered,
+and latency is measured from the scheduled send time, so a stalled server
+shows up in the percentiles instead of slowing the load down.
+
+    python bench/perf.py steady
+    python bench/perf.py burst flaky --workers 4 --asgi
+    python bench/perf.py steady --rps 100 --duration 30 --output /tmp/steady.json
+
+Reports ingest throughput and p50/p95/p99/max latency, the notifications each
+stub received and how long delivery took to drain, stub 429s and errors, and
+the peak memory of the gunicorn processes. Results go to
+bench/results/<scenario>-<commit>.json; compare two runs with compare.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench_workers import register_webhook, start_backend
+from loadgen import percentile
+from simulator import PayloadSimulator, parse_mix
+from stub_server import StubReceiver
+
+PLATFORMS = ("slack", "teams")
+
+# Stub options apply to both receivers unless given per platform
+SCENARIOS = {
+    "steady": {
+        "description": "everyday traffic, mostly single changes",
+        "rps": 50, "duration": 20, "mix": "change=0.9,bulk=0.05,test=0.05", "events": (1, 3),
+        "stub": {"latency": 0.05, "jitter": 0.05},
+    },
+    "burst": {
+        "description": "a zone migration: many multi-event payloads at once",
+        "rps": 200, "duration": 10, "mix": "change=0.8,bulk=0.2", "events": (1, 10),
+        "stub": {"latency": 0.05, "jitter": 0.05},
+    },
+    "bulk": {
+        "description": "bulk record changes with long detail.changes lists",
+        "rps": 20, "duration": 20, "mix": "bulk=1", "bulk_changes": (50, 500),
+        "stub": {"latency": 0.1, "jitter": 0.1},
+    },
+    "throttled": {
+        "description": "destinations answering 429 beyond their rate limit",
+        "rps": 20, "duration": 20, "mix": "change=1",
+        "stub": {"latency": 0.05},
+        "slack": {"rate_limit": 10},
+        "teams": {"rate_limit": 4},
+        # Leave throttling to the receivers, so the 429 handling is exercised
+        "settings": {"DELIVERY_RATE_SLACK": "0", "DELIVERY_RATE_TEAMS": "0"},
+    },
+    "flaky": {
+        "description": "slow, jittery destinations failing 10% of posts",
+        "rps": 50, "duration": 20, "mix": "change=0.95,bulk=0.05",
+        "stub": {"latency": 0.2, "jitter": 0.8, "error_rate": 0.1},
+        "settings": {"DELIVERY_BACKOFF_BASE": "0.5", "DELIVERY_BACKOFF_MAX": "2"},
+    },
+}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, bool(dirty)
+
+
+def process_tree_rss(pid):
+    """
+    Resident memory in bytes of `pid` and all its descendants, from /proc.
+    """
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class MemorySampler:
+    """
+    Tracks the peak resident memory of a process tree while running.
+    """
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = process_tree_rss(self.pid)
+            self.samples.append(rss)
+            self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def build_requests(scenario, rps, duration, seed):
+    """
+    The scheduled requests: (send offset in seconds, platform, body, events).
+    """
+    simulator = PayloadSimulator(parse_mix(scenario["mix"]), events=scenario.get("events", (1, 1)),
+                                 bulk_changes=scenario.get("bulk_changes", (10, 50)), seed=seed)
+    planned = []
+    for n in range(int(rps * duration)):
+        _, payload = simulator.payload()
+        planned.append((n / rps, PLATFORMS[n % len(PLATFORMS)], json.dumps(payload).encode(),
+                        len(payload["telemetryEvents"])))
+    return planned
+
+
+async def run_schedule(urls, planned, max_connections):
+    """
+    Send every request at its offset. Returns (latencies, statuses, accepted
+    events per platform, elapsed seconds).
+    """
+    latencies = []
+    statuses = Counter()
+    accepted = Counter()
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async def send(offset, platform, body, events):
+            await asyncio.sleep(max(start + offset - loop.time(), 0))
+            try:
+                response = await client.post(urls[platform], content=body,
+                                             headers={"Content-Type": "application/json"})
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(loop.time() - start - offset)
+            statuses[status] += 1
+            if status == 202:
+                accepted[platform] += events
+
+        await asyncio.gather(*(send(*request) for request in planned))
+        elapsed = loop.time() - start
+    return sorted(latencies), statuses, accepted, elapsed
+
+
+def wait_for_delivery(stubs, expected, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(stubs[platform].received >= expected[platform] for platform in PLATFORMS):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def run(name, args):
+    scenario = SCENARIOS[name]
+    rps = args.rps or scenario["rps"]
+    duration = args.duration or scenario["duration"]
+    planned = build_requests(scenario, rps, duration, args.seed)
+
+    stubs = {}
+    for platform in PLATFORMS:
+        options = {**scenario.get("stub", {}), **scenario.get(platform, {})}
+        stubs[platform] = StubReceiver(seed=args.seed, **options).start()
+    settings = {
+        "ASYNC_INGEST": "true" if args.asgi else "false",
+        # One post per event, so deliveries can be counted at the stubs
+        "DIGEST_MAX_EVENTS": "1",
+        "DELIVERY_RATE_TEAMS": "0",
+        "DELIVERY_MAX_ATTEMPTS": "100",
+        "LOG_LEVEL": "ERROR",
+        **scenario.get("settings", {}),
+    }
+    data_dir = tempfile.mkdtemp()
+    process, base_url = start_backend(args.workers, args.port, data_dir, **settings)
+    memory = MemorySampler(process.pid).start()
+    try:
+        urls = {}
+        for platform in PLATFORMS:
+            token = register_webhook(base_url, data_dir, stubs[platform].url, platform)
+            urls[platform] = f"{base_url}/api/{platform}/{token}"
+        baseline = {platform: stubs[platform].received for platform in PLATFORMS}  # setup test messages
+        idle_rss = process_tree_rss(process.pid)
+
+        start = time.monotonic()
+        latencies, statuses, accepted, elapsed = asyncio.run(
+            run_schedule(urls, planned, args.max_connections))
+        expected = {platform: baseline[platform] + accepted[platform] for platform in PLATFORMS}
+        drained = wait_for_delivery(stubs, expected, args.drain_timeout)
+        drain = time.monotonic() - start
+    finally:
+        memory.stop()
+        process.terminate()
+        process.wait()
+        for stub in stubs.values():
+            stub.stop()
+
+    commit, dirty = git_commit()
+    events = sum(request[3] for request in planned)
+    return {
+        "scenario": name,
+        "commit": commit,
+        "dirty": dirty,
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "description": scenario["description"],
+            "rps": rps,
+            "duration": duration,
+            "seed": args.seed,
+            "workers": args.workers,
+            "server": "asgi" if args.asgi else "wsgi",
+            "max_connections": args.max_connections,
+            "cpus": os.cpu_count(),
+            "python": sys.version.split()[0],
+            "mix": scenario["mix"],
+            "stubs": {platform: {**scenario.get("stub", {}), **scenario.get(platform, {})}
+                      for platform in PLATFORMS},
+            "settings": settings,
+        },
+        "results": {
+            "requests": len(planned),
+            "events": events,
+            "throughput_rps": len(planned) / elapsed,
+            "latency_ms": {
+                "p50": percentile(latencies, 0.50) * 1000,
+                "p95": percentile(latencies, 0.95) * 1000,
+                "p99": percentile(latencies, 0.99) * 1000,
+                "max": latencies[-1] * 1000,
+            },
+            "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            "delivered": {platform: stubs[platform].received - baseline[platform] for platform in PLATFORMS},
+            "accepted_events": {platform: accepted[platform] for platform in PLATFORMS},
+            "drained": drained,
+            "drain_seconds": drain,
+            "delivered_per_sec": sum(stubs[platform].received - baseline[platform]
+                                     for platform in PLATFORMS) / drain,
+            "stub_throttled": {platform: stubs[platform].throttled for platform in PLATFORMS},
+            "stub_errors": {platform: stubs[platform].errors for platform in PLATFORMS},
+            "idle_rss_mb": idle_rss / 2 ** 20,
+            "peak_rss_mb": memory.peak / 2 ** 20,
+        },
+    }
+
+
+def summarize(result):
+    config, results = result["config"], result["results"]
+    latency = results["latency_ms"]
+    lines = [
+        f"{result['scenario']} @ {result['commit']}{' (dirty)' if result['dirty'] else ''}: "
+        f"{config['rps']} req/s for {config['duration']}s, {config['server']} workers={config['workers']}",
+        f"  ingest    {results['throughput_rps']:.0f} req/s, p50={latency['p50']:.1f}ms p95={latency['p95']:.1f}ms "
+        f"p99={latency['p99']:.1f}ms max={latency['max']:.1f}ms, status {results['statuses']}",
+        f"  delivered {results['delivered']} of {results['accepted_events']} events in "
+        f"{results['drain_seconds']:.1f}s{'' if results['drained'] else ' (not drained)'}, "
+        f"stub 429s {results['stub_throttled']}, stub errors {results['stub_errors']}",
+        f"  memory    {results['idle_rss_mb']:.0f}MB idle, {results['peak_rss_mb']:.0f}MB peak",
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)}")
+    parser.add_argument("--list", action="store_true", help="describe the scenarios")
+    parser.add_argument("--rps", type=float, help="requests per second, overriding the scenario")
+    parser.add_argument("--duration", type=float, help="seconds of load, overriding the scenario")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--asgi", action="store_true", help="serve the ASGI ingest path")
+    parser.add_argument("--max-connections", type=int, default=256, help="client connections")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="seconds to wait for deliveries")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=18087)
+    parser.add_argument("--output", help="result file (one scenario) or directory, default bench/results")
+    args = parser.parse_args()
+
+    if args.list or not args.scenarios:
+        for name, scenario in SCENARIOS.items():
+            print(f"{name:10} {scenario['rps']:>4} req/s for {scenario['duration']}s: {scenario['description']}")
+        return
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario {', '.join(unknown)}")
+
+    for name in args.scenarios:
+        result = run(name, args)
+        print(summarize(result))
+        if args.output and args.output.endswith(".json") and len(args.scenarios) == 1:
+            path = args.output
+        else:
+            directory = args.output or os.path.join(BACKEND_DIR, "bench", "results")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{name}-{result['commit']}.json")
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"  saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Synthetic UltraDNS telemetry for load tests.
+
+Generates `telemetryEvents` payloads as UltraDNS posts them, in three kinds:
+
+- "test": the TEST_TELEMETRY_WEBHOOK event sent by "Test Connection";
+- "change": a single zone, record or pool change;
+- "bulk": a change whose telemetryEvent.detail.changes lists many record
+  values (e.g. a zone import), the largest messages to render.
+
+Payloads are reproducible for a given seed, except for the event ids, which
+are unique so the dedup index does not drop replays.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+
+KINDS = ("test", "change", "bulk")
+
+ACCOUNTS = ["acme-corp", "example", "ops-team", "exämple-корп"]
+USERS = ["alice@example.com", "bob@example.com", "api-user", "terraform"]
+APPLICATIONS = ["Portal", "REST API", "Bulk Import"]
+CHANGES = [
+    ("ZONE_CHANGE", "Zone", ["CREATE", "UPDATE", "DELETE"]),
+    ("RECORD_CHANGE", "Record", ["CREATE", "UPDATE", "DELETE"]),
+    ("POOL_CHANGE", "Pool", ["UPDATE"]),
+    ("PROBE_CHANGE", "Probe", ["CREATE", "DELETE"]),
+]
+RECORD_TYPES = ["A", "AAAA", "CNAME", "TXT", "MX"]
+
+
+def parse_mix(text):
+    """
+    Parse "change=0.9,bulk=0.08,test=0.02" into kind weights.
+    """
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f"Unknown payload kind {kind!r}, expected one of {', '.join(KINDS)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+class PayloadSimulator:
+    """
+    Endless source of UltraDNS payloads.
+
+    - `mix` maps payload kinds to their relative weights.
+    - `events` is the (min, max) number of events per change payload.
+    - `bulk_changes` is the (min, max) length of detail.changes of a bulk event.
+    """
+
+    def __init__(self, mix=None, events=(1, 1), bulk_changes=(10, 50), seed=1):
+        self.mix = mix or {"change": 1.0}
+        self.events = events
+        self.bulk_changes = bulk_changes
+        self.rng = random.Random(seed)
+        self.clock = datetime(2025, 1, 21, 10, 0, 0)
+
+    def _timestamp(self):
+        self.clock += timedelta(milliseconds=self.rng.randint(1, 2000))
+        return self.clock.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+    def _event(self, event_type, details):
+        timestamp = self._timestamp()
+        return {
+            "accountName": self.rng.choice(ACCOUNTS),
+            "telemetryEventId": str(uuid.uuid4()),
+            "telemetryEventType": event_type,
+            "telemetryEventTime": timestamp,
+            "telemetryEvent": {"changeTime": timestamp, **details},
+        }
+
+    def test_event(self):
+        return self._event("TEST_TELEMETRY_WEBHOOK", {})
+
+    def change_event(self):
+        event_type, object_type, change_types = self.rng.choice(CHANGES)
+        zone = f"zone{self.rng.randint(1, 500)}.example.com."
+        name = zone if object_type == "Zone" else f"host{self.rng.randint(1, 9999)}.{zone}"
+        return self._event(event_type, {
+            "objectType": object_type,
+            "changeType": self.rng.choice(change_types),
+            "object": name,
+            "user": self.rng.choice(USERS),
+            "application": self.rng.choice(APPLICATIONS),
+        })
+
+    def bulk_event(self):
+        event = self.change_event()
+        details = event["telemetryEvent"]
+        details.update(objectType="Record", changeType="UPDATE", application="Bulk Import")
+        details["detail"] = {"changes": [
+            {
+                "value": f"{self.rng.choice(RECORD_TYPES)} host{n}.{details['object']}",
+                "from": f"10.0.{n // 256}.{n % 256}",
+                "to": f"10.1.{n // 256}.{n % 256}",
+            }
+            for n in range(self.rng.randint(*self.bulk_changes))
+        ]}
+        return event
+
+    def kind(self):
+        return self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+
+    def payload(self, kind=None):
+        """
+        One payload of the given kind, or of a kind drawn from the mix.
+        Returns (kind, payload).
+        """
+        kind = kind or self.kind()
+        if kind == "test":
+            events = [self.test_event()]
+        elif kind == "bulk":
+            events = [self.bulk_event()]
+        else:
+            events = [self.change_event() for _ in range(self.rng.randint(*self.events))]
+        return kind, {"telemetryEvents": events}
@@ -0,0 +1,178 @@
+"""
+Local stand-in for the Slack/Teams incoming webhook endpoints.
+
+Accepts any POST, optionally sleeps to mimic a slow chat service (`latency`
+plus up to `jitter` seconds), throttles like Slack when given a rate limit,
+fails a random `error_rate` share of posts with a 5xx and counts the messages
+it has received.
+It can be told to fail, in-process with fail()/recover() or from another
+process by posting to /control?fail=<status or "hang">, /control?recover.
+"""
+import random
+import ssl
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 resets connections under concurrent load
+    request_queue_size = 128
+
+
+class StubReceiver:
+    """
+    Threaded HTTP server that records received webhook posts.
+    """
+
+    def __init__(self, latency=0.0, status=200, host="127.0.0.1", port=0, tls=None, rate_limit=None,
+                 jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.status = status
+        self.rate_limit = rate_limit
+        self.received = 0
+        self.throttled = 0
+        self.failed = 0
+        self.errors = 0
+        self.failing = None  # status to answer with, or "hang"
+        self.hang = 30.0
+        self.bodies = []
+        self._recent = []
+        self._lock = threading.Lock()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Buffer the response so headers and body leave in one segment
+            wbufsize = 65536
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                url = urlsplit(self.path)
+                if url.path == "/control":
+                    receiver._control(parse_qs(url.query, keep_blank_values=True))
+                    self._reply(200)
+                    return
+                if receiver.failing is not None:
+                    with receiver._lock:
+                        receiver.failed += 1
+                    if receiver.failing == "hang":
+                        # Never answer in time; the client's read timeout fires
+                        time.sleep(receiver.hang)
+                        self.close_connection = True
+                        return
+                    self._reply(receiver.failing)
+                    return
+                delay = receiver.latency + (receiver.jitter and receiver.random.uniform(0, receiver.jitter))
+                if delay:
+                    time.sleep(delay)
+                if receiver._error():
+                    self._reply(receiver.random.choice((500, 502, 503)))
+                    return
+                if receiver._throttle():
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with receiver._lock:
+                    receiver.received += 1
+                    receiver.bodies.append(body)
+                self.send_response(receiver.status)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def _reply(self, status):
+                self.send_response(status)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server((host, port), Handler)
+        scheme = "http"
+        if tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*tls)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+            scheme = "https"
+        self.url = f"{scheme}://{host}:{self.server.server_port}/webhook"
+
+    def fail(self, status=503):
+        """
+        Answer every post with `status`, or never answer with "hang".
+        """
+        self.failing = status
+
+    def recover(self):
+        self.failing = None
+
+    def _control(self, query):
+        if "recover" in query:
+            self.recover()
+        elif "fail" in query:
+            value = query["fail"][0] or "503"
+            self.fail(value if value == "hang" else int(value))
+
+    def _error(self):
+        if not self.error_rate or self.random.random() >= self.error_rate:
+            return False
+        with self._lock:
+            self.errors += 1
+        return True
+
+    def _throttle(self):
+        """
+        Sliding one-second window: reject posts beyond `rate_limit` per second.
+        """
+        if not self.rate_limit:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._recent = [t for t in self._recent if now - t < 1.0]
+            if len(self._recent) >= self.rate_limit:
+                self.throttled += 1
+                return True
+            self._recent.append(now)
+            return False
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait_for(self, count, timeout=60):
+        deadline = time.monotonic() + timeout
+        while self.received < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return self.received >= count
+
+
+def make_self_signed_cert(directory):
+    """
+    Create a throwaway certificate for 127.0.0.1 with openssl.
+    Returns (certfile, keyfile).
+    """
+    certfile = f"{directory}/stub.crt"
+    keyfile = f"{directory}/stub.key"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+         "-keyout", keyfile, "-out", certfile],
+        check=True, capture_output=True,
+    )
+    return certfile, keyfile
@@ -0,0 +1,139 @@
+"""
+Circuit breakers for outbound webhook destinations.
+
+A destination whose posts keep failing (revoked webhook URL, chat service
+down) is given up on for a while instead of tying up delivery workers. After
+`threshold` consecutive failures its circuit opens and its notifications are
+parked in the outbox for `cooldown` seconds. Then a single probe is let
+through (half-open): success closes the circuit, failure opens it again for
+twice as long, up to `max_cooldown`.
+
+Every worker process keeps its own breakers. Their state is published as
+metrics, so /api/status can show it whichever process serves it.
+"""
+import logging
+import threading
+import time
+
+from metrics import CIRCUIT_FAILURES, CIRCUIT_STATE, destination_label
+
+CLOSED = "closed"
+HALF_OPEN = "half-open"
+OPEN = "open"
+
+# Gauge values of the states; the worst state of all processes is reported
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+STATES = {value: state for state, value in STATE_VALUES.items()}
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Health of one destination. Safe to use from any thread.
+    """
+
+    def __init__(self, key, threshold=5, cooldown=30.0, max_cooldown=600.0, clock=time.monotonic):
+        self.key = key
+        self.label = destination_label(key)
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        self.state = state
+        CIRCUIT_STATE.labels(self.label).set(STATE_VALUES[state])
+        CIRCUIT_FAILURES.labels(self.label).set(self.failures)
+
+    def allow(self):
+        """
+        Whether a message may be posted now. In the half-open state only the
+        first caller gets to probe.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock() >= self.open_until:
+                self._set_state(HALF_OPEN)
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def retry_in(self):
+        """
+        Seconds until messages refused by allow() are worth trying again.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                return max(self.open_until - self.clock(), 0.0)
+            return 1.0  # half-open: the probe should have an answer by then
+
+    def success(self):
+        with self._lock:
+            if self.state == CLOSED and not self.failures:
+                return
+            if self.state != CLOSED:
+                logger.info("Circuit closed, destination recovered", extra={"token": self.key})
+            self.failures = 0
+            self.trips = 0
+            self._probing = False
+            self._set_state(CLOSED)
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            # Posts that were in flight when the circuit opened do not extend it
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.threshold):
+                seconds = min(self.cooldown * 2 ** self.trips, self.max_cooldown)
+                self.trips += 1
+                self.open_until = self.clock() + seconds
+                self._set_state(OPEN)
+                logger.warning("Circuit opened after %d consecutive failures, parking notifications for %gs",
+                               self.failures, seconds, extra={"token": self.key})
+            else:
+                CIRCUIT_FAILURES.labels(self.label).set(self.failures)
+
+    def neutral(self):
+        """
+        The attempt said nothing about the destination's health (throttled,
+        connection removed). A probe may be sent again.
+        """
+        with self._lock:
+            self._probing = False
+
+
+class Breakers:
+    """
+    Circuit breakers by destination key, created on first use. A `threshold`
+    of 0 disables them: get() returns None.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0, max_cooldown=600.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if self.threshold <= 0:
+            return None
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = self._breakers[key] = CircuitBreaker(
+                        key, self.threshold, self.cooldown, self.max_cooldown, self.clock)
+        return breaker
@@ -0,0 +1,109 @@
+"""
+Read-through cache of webhook connections keyed by token.
+
+Inbound telemetry and the delivery workers look connections up here instead of
+querying SQLite on every request. Entries expire after a TTL and the cache is
+bounded with LRU eviction; anything that changes a connection invalidates it.
+Other worker processes announce their changes through a generation (the
+status marker file), and the whole cache is dropped when it moves.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Immutable snapshot of a WebhookConnection row and its compiled RouteTable
+ConnectionInfo = namedtuple('ConnectionInfo', ['id', 'type', 'token', 'webhook_url', 'status', 'routes'],
+                            defaults=[None])
+
+# Returned by ConnectionCache.peek() when a token has to be loaded
+MISSING = object()
+
+
+class ConnectionCache:
+    """
+    LRU/TTL cache in front of `loader(token)`, which returns a ConnectionInfo
+    or None. Unknown tokens are cached as None too, so garbage tokens do not
+    reach the database repeatedly. A `ttl` of 0 disables caching.
+
+    `generation()`, if given, returns a value that changes whenever another
+    process may have changed a connection; it is checked on every lookup.
+    """
+
+    def __init__(self, loader, ttl=60.0, max_size=1024, clock=time.monotonic, generation=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.generation = generation
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """
+        Drop everything if the generation moved. Returns the current one.
+        """
+        if self.generation is None:
+            return None
+        current = self.generation()
+        if current != self._generation:
+            with self._lock:
+                self._entries.clear()
+                self._generation = current
+        return current
+
+    def get(self, token):
+        generation = self._refresh()
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = self.loader(token)
+        if self.ttl > 0:
+            with self._lock:
+                # Not if another process changed something while it was loaded
+                if generation == self._generation:
+                    self._store(token, value)
+        return value
+
+    def peek(self, token):
+        """
+        Return the cached value of a token without calling the loader, or
+        MISSING. Lets async callers move only cache misses off the event loop.
+        """
+        self._refresh()
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[1]
+        return MISSING
+
+    def put(self, token, value):
+        with self._lock:
+            self._store(token, value)
+
+    def _store(self, token, value):
+        self._entries[token] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token=None):
+        """
+        Drop one token, or everything when no token is given.
+        """
+        with self._lock:
+            if token is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(token, None)
@@ -0,0 +1,150 @@
+"""
+Deduplication of UltraDNS telemetry events by telemetryEventId.
+
+UltraDNS posts an event again when it did not get a timely 2xx, so the same
+event can arrive two or three times. Ids accepted within the last `window`
+seconds are remembered per webhook token and repeats are dropped before they
+are rendered or delivered.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, SeenEvent
+
+# SQLite limits the number of bound parameters per statement
+CHUNK = 500
+
+
+def event_key(token, event):
+    """
+    The dedup key of an event, or None if it has no telemetryEventId.
+    """
+    event_id = event.get("telemetryEventId")
+    if not isinstance(event_id, str) or not event_id:
+        return None
+    return f"{token}:{event_id}"
+
+
+class DedupIndex:
+    """
+    Recently accepted event keys.
+
+    Keys are kept in memory in the order they were accepted, so expired
+    entries are dropped from the front and the oldest are evicted beyond
+    `max_size`: memory is bounded and a lookup is a dict probe.
+
+    With `app`, keys are also inserted into the SeenEvent table, in the same
+    transaction as the outbox rows. A repeat handled by another worker
+    process or before a restart then fails that transaction on the key's
+    primary key; the caller finds the repeats with stored() and writes the
+    rest again with statements(keys, replace=True). Ingest itself never
+    reads the table.
+    """
+
+    def __init__(self, max_size=100000, window=86400, app=None, prune_interval=60.0, clock=time.time):
+        self.max_size = max_size
+        self.window = window
+        self.app = app
+        self.prune_interval = prune_interval
+        self.clock = clock
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+
+    def __len__(self):
+        return len(self._seen)
+
+    def _expire(self, now):
+        oldest = now - self.window
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if seen_at >= oldest and len(self._seen) <= self.max_size:
+                return
+            self._seen.popitem(last=False)
+
+    def stored(self, keys):
+        """
+        The keys among `keys` that are in the SeenEvent table and still
+        within the window.
+        """
+        keys = [key for key in keys if key is not None]
+        if self.app is None or not keys:
+            return set()
+        now = self.clock()
+        found = set()
+        with self.app.app_context():
+            for i in range(0, len(keys), CHUNK):
+                found.update(db.session.execute(
+                    select(SeenEvent.key)
+                    .where(SeenEvent.key.in_(keys[i:i + CHUNK]), SeenEvent.seen_at >= now - self.window)
+                ).scalars())
+        return found
+
+    def split(self, token, events):
+        """
+        Separate repeats from new events: events this process accepted within
+        the window and later copies of an event in the same list.
+        Returns (new events, their keys, number of repeats). Events without
+        a telemetryEventId are always new; their key is None.
+        """
+        if self.window <= 0:
+            return events, [None] * len(events), 0
+        now = self.clock()
+        keys = [event_key(token, event) for event in events]
+        with self._lock:
+            self._expire(now)
+            known = {key for key in keys if key is not None and key in self._seen}
+
+        fresh = []
+        fresh_keys = []
+        repeats = 0
+        for event, key in zip(events, keys):
+            if key is not None and key in known:
+                repeats += 1
+                continue
+            if key is not None:
+                known.add(key)
+            fresh.append(event)
+            fresh_keys.append(key)
+        return fresh, fresh_keys, repeats
+
+    def statements(self, keys, replace=False):
+        """
+        Statements recording keys in the SeenEvent table (and now and then
+        pruning expired rows), to execute with the outbox rows. They fail
+        with an IntegrityError if a key is stored already, unless `replace`
+        is set: after stored() has found the live ones, what conflicts is
+        expired.
+        """
+        keys = [key for key in keys if key is not None]
+        if self.app is None or not keys:
+            return []
+        now = self.clock()
+        statements = []
+        for i in range(0, len(keys), CHUNK):
+            rows = [{"key": key, "seen_at": now} for key in keys[i:i + CHUNK]]
+            if replace:
+                statements.append(sqlite_insert(SeenEvent).values(rows)
+                                  .on_conflict_do_update(index_elements=[SeenEvent.key], set_={"seen_at": now}))
+            else:
+                statements.append(insert(SeenEvent).values(rows))
+        if now >= self._next_prune:
+            self._next_prune = now + self.prune_interval
+            statements.append(delete(SeenEvent).where(SeenEvent.seen_at < now - self.window))
+        return statements
+
+    def remember(self, keys):
+        """
+        Mark keys as accepted, once their events are committed.
+        """
+        now = self.clock()
+        with self._lock:
+            for key in keys:
+                if key is not None:
+                    self._seen[key] = now
+                    self._seen.move_to_end(key)
+            self._expire(now)
@@ -0,0 +1,370 @@
+"""
+In-process delivery pipeline for outbound Slack/Teams notifications.
+
+The telemetry handlers render their messages and hand them to a DeliveryQueue,
+which is drained by a pool of worker threads. This lets the UltraDNS request be
+acknowledged without waiting on the chat service.
+
+Jobs are queued per destination (WebhookConnection token). Each destination has
+its own token bucket, and when a backlog builds up behind the limiter the
+queued events are coalesced into digest messages. A destination that keeps
+failing has its circuit opened (see breaker.py): its jobs are parked in the
+outbox instead of occupying workers, and while it is suspect it only gets one
+worker at a time.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+
+from metrics import PARKED
+from ratelimit import TokenBucket
+from transport import parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# A rendered message waiting to be posted to a webhook.
+# `id` is the outbox row, `payload` the JSON body as bytes and `event` the
+# UltraDNS event it was rendered from (used to build digests); `claim` is the
+# outbox claim the row is held under and `history_id` the event_history row
+# its outcome is counted on.
+DeliveryJob = namedtuple(
+    'DeliveryJob',
+    ['id', 'token', 'platform', 'webhook_url', 'payload', 'attempts', 'event', 'claim', 'history_id'],
+    defaults=[None, None, None],
+)
+
+
+def take_batch(jobs, coalesce, max_batch):
+    """
+    Pop the next job from a deque, plus any backlog that can be coalesced with it.
+    """
+    batch = [jobs.popleft()]
+    if coalesce is not None and batch[0].event is not None:
+        while jobs and len(batch) < max_batch and jobs[0].event is not None:
+            batch.append(jobs.popleft())
+    return batch
+
+
+def plan_batch(batch, coalesce):
+    """
+    Decide how to post a batch taken by take_batch().
+    Returns (job to send, jobs it covers, jobs that did not fit); the job to
+    send is a digest when more than one event fits in one message.
+    """
+    if len(batch) > 1:
+        body, count = coalesce(batch[0].platform, [job.event for job in batch])
+        if count > 1:
+            return batch[0]._replace(id=None, payload=body, event=None), batch[:count], batch[count:]
+    return batch[0], batch[:1], batch[1:]
+
+
+def throttle_delay(error):
+    """
+    Seconds to pause a destination after a delivery error, or None if the
+    destination did not throttle us.
+    """
+    response = getattr(error, "response", None)
+    if response is not None and response.status_code == 429:
+        return parse_retry_after(response) or 1.0
+    return None
+
+
+def is_destination_failure(error):
+    """
+    Whether a delivery error counts against the destination's circuit
+    breaker. Throttling, removed connections and messages rejected as
+    malformed say nothing about the destination's health.
+    """
+    if isinstance(error, ConnectionRemoved) or throttle_delay(error) is not None:
+        return False
+    response = getattr(error, "response", None)
+    return response is None or response.status_code not in (400, 413, 422)
+
+
+class ConnectionRemoved(Exception):
+    """
+    The webhook connection of a job no longer exists.
+    """
+
+
+class _Lane:
+    """
+    Pending jobs, rate limiter and circuit breaker of a single destination.
+
+    `scheduled` is set while the lane is ready or waiting on its limiter, and
+    `active` counts workers currently sending for it. `throttled` is set
+    when the limiter made the lane wait; the jobs queued by then are
+    coalesced into a digest. Rate-limited lanes are
+    served by one worker at a time so messages stay in order; unlimited lanes
+    may use up to `concurrency` workers while their destination is healthy.
+    """
+    __slots__ = ('jobs', 'bucket', 'breaker', 'scheduled', 'active', 'throttled', 'concurrency')
+
+    def __init__(self, bucket, concurrency, breaker=None):
+        self.jobs = deque()
+        self.bucket = bucket
+        self.breaker = breaker
+        self.scheduled = False
+        self.active = 0
+        self.throttled = False
+        self.concurrency = concurrency if bucket.rate <= 0 else 1
+
+    def limit(self):
+        """
+        Workers the lane may use now: one after a failure, so a hanging
+        destination cannot hold up the others.
+        """
+        if self.breaker is not None and self.breaker.failures:
+            return 1
+        return self.concurrency
+
+
+class DeliveryQueue:
+    """
+    Bounded queue of DeliveryJobs drained by a pool of worker threads.
+
+    - `send` delivers a single job and raises on failure.
+    - `workers` is the number of delivery threads. With 0 workers, jobs are
+      delivered inline by the submitting thread without rate limiting.
+    - `max_depth` is the maximum number of queued jobs. Submissions that would
+      exceed it are rejected so the caller can apply backpressure.
+    - `outbox`, if given, is told about every delivery outcome so failed jobs
+      are retried or dead-lettered.
+    - `resolve(token)`, if given, returns the current connection of a job so
+      its webhook_url is read at delivery time rather than when queued.
+    - `rate_limits` maps a platform to the messages per second allowed per
+      destination, with bursts of up to `burst` messages.
+    - `buckets(key, rate, burst)`, if given, creates the rate limiter of a
+      destination, e.g. a SharedTokenBucket, instead of a TokenBucket.
+    - `coalesce(platform, events)` renders a digest of the leading events and
+      returns (body, count). Up to `max_batch` queued jobs are offered to it
+      once the rate limiter has held a destination back.
+    - `breakers`, if given, is a Breakers registry; jobs for a destination
+      whose circuit is open are handed back to the outbox.
+    - `clock` is the time source of the rate limiters.
+    """
+
+    def __init__(self, send, workers=4, max_depth=1000, outbox=None, resolve=None,
+                 rate_limits=None, burst=1, buckets=None, coalesce=None, max_batch=50, breakers=None,
+                 clock=time.monotonic):
+        self._send = send
+        self.breakers = breakers
+        self.outbox = outbox
+        self.resolve = resolve
+        self.workers = workers
+        self.max_depth = max_depth
+        self.rate_limits = rate_limits or {}
+        self.burst = burst
+        self.buckets = buckets
+        self.coalesce = coalesce
+        self.max_batch = max_batch
+        self.clock = clock
+        self._lanes = {}
+        self._ready = deque()
+        self._timers = []
+        self._count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def depth(self):
+        return self._count
+
+    def has_room(self, count):
+        return self.workers <= 0 or self._count + count <= self.max_depth
+
+    def submit_many(self, jobs):
+        """
+        Queue all jobs or none of them.
+        Returns False if the queue does not have room for the whole batch, or
+        is draining.
+        """
+        jobs = list(jobs)
+        if self._closed:
+            return False
+        if self.workers <= 0:
+            for job in jobs:
+                self._deliver([job], job)
+            return True
+
+        with self._cond:
+            if self._closed or self._count + len(jobs) > self.max_depth:
+                return False
+            for job in jobs:
+                lane = self._lanes.get(job.token)
+                if lane is None:
+                    bucket = self._bucket(job)
+                    breaker = self.breakers.get(job.token) if self.breakers is not None else None
+                    lane = self._lanes[job.token] = _Lane(bucket, self.workers, breaker)
+                lane.jobs.append(job)
+                self._schedule(job.token, lane)
+            self._count += len(jobs)
+            if not self._threads:
+                self._start_workers()
+        return True
+
+    def _bucket(self, job):
+        rate = self.rate_limits.get(job.platform, 0)
+        if self.buckets is not None:
+            return self.buckets(job.token, rate, self.burst)
+        return TokenBucket(rate, self.burst, self.clock)
+
+    def drain(self, timeout):
+        """
+        Stop accepting jobs and keep delivering until the queue is empty and
+        no post is in flight, for up to `timeout` seconds. Returns the jobs
+        still queued then, removed from the queue.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._closed = True
+            while self._threads and (self._count or any(lane.active for lane in self._lanes.values())):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, 0.1))
+            left = []
+            for lane in self._lanes.values():
+                left.extend(lane.jobs)
+                lane.jobs.clear()
+                lane.scheduled = False
+            self._ready.clear()
+            self._timers.clear()
+            self._count -= len(left)
+        return left
+
+    def _start_workers(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"delivery-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _schedule(self, key, lane):
+        """
+        Mark a lane with pending jobs as ready. Called with the lock held.
+        """
+        if lane.jobs and not lane.scheduled and lane.active < lane.limit():
+            lane.scheduled = True
+            self._ready.append(key)
+            self._cond.notify()
+
+    def _next_lane(self):
+        """
+        Wait for a destination that is ready to send. Called with the lock held.
+        """
+        while True:
+            now = self.clock()
+            while self._timers and self._timers[0][0] <= now:
+                self._ready.append(heapq.heappop(self._timers)[1])
+            if self._ready:
+                return self._ready.popleft()
+            self._cond.wait(self._timers[0][0] - now if self._timers else None)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                key = self._next_lane()
+                lane = self._lanes[key]
+                wait = 0.0 if lane.bucket.shared else lane.bucket.take()
+            if lane.bucket.shared:
+                # A database write, made off the lock. The lane stays scheduled,
+                # so no other worker takes it meanwhile
+                wait = lane.bucket.take()
+            with self._cond:
+                if not lane.jobs:
+                    # Drained meanwhile
+                    lane.scheduled = False
+                    continue
+                if wait > 0:
+                    lane.throttled = True
+                    heapq.heappush(self._timers, (self.clock() + wait, key))
+                    continue
+                lane.scheduled = False
+                if lane.breaker is not None and not lane.breaker.allow():
+                    parked = list(lane.jobs)
+                    lane.jobs.clear()
+                    self._count -= len(parked)
+                else:
+                    parked = None
+                    lane.active += 1
+                    batch = self._take_batch(lane)
+                    self._schedule(key, lane)
+
+            if parked is not None:
+                self._park(lane.breaker, parked)
+                continue
+            try:
+                self._dispatch(lane, batch)
+            finally:
+                with self._cond:
+                    lane.active -= 1
+                    self._schedule(key, lane)
+
+    def _take_batch(self, lane):
+        # Messages the limiter lets through at once are posted one by one
+        batch = take_batch(lane.jobs, self.coalesce if lane.throttled else None, self.max_batch)
+        lane.throttled = False
+        self._count -= len(batch)
+        return batch
+
+    def _dispatch(self, lane, batch):
+        job, covered, rest = plan_batch(batch, self.coalesce)
+        if rest:
+            # Whatever did not fit goes back to the front of the lane
+            with self._cond:
+                lane.jobs.extendleft(reversed(rest))
+                self._count += len(rest)
+        self._deliver(covered, job, lane)
+
+    def _park(self, breaker, jobs):
+        """
+        Hand the jobs of a destination whose circuit is open back to the
+        outbox until it is worth trying again.
+        """
+        PARKED.labels(jobs[0].platform).inc(len(jobs))
+        if self.outbox is not None:
+            self.outbox.release(jobs, breaker.retry_in())
+        else:
+            logger.error("Dropping %d %s notifications, circuit is open", len(jobs), jobs[0].platform,
+                         extra={"token": breaker.key})
+
+    def _deliver(self, jobs, job, lane=None):
+        if lane is not None:
+            breaker = lane.breaker
+        else:
+            # Inline delivery has no lane to park; check the circuit here
+            breaker = self.breakers.get(job.token) if self.breakers is not None else None
+        if lane is None and breaker is not None and not breaker.allow():
+            self._park(breaker, jobs)
+            return
+        try:
+            if self.resolve is not None:
+                connection = self.resolve(job.token)
+                if connection is None:
+                    raise ConnectionRemoved("Webhook connection was removed")
+                job = job._replace(webhook_url=connection.webhook_url)
+            self._send(job)
+        except Exception as e:
+            delay = throttle_delay(e)
+            if lane is not None and delay is not None and lane.bucket.shared:
+                lane.bucket.pause(delay)
+            elif lane is not None and delay is not None:
+                with self._cond:
+                    lane.bucket.pause(delay)
+            if breaker is not None and is_destination_failure(e):
+                breaker.failure()
+            elif breaker is not None:
+                breaker.neutral()
+            for failed in jobs:
+                if self.outbox is not None:
+                    self.outbox.failed(failed, e)
+                else:
+                    logger.error("Error delivering %s notification: %s", job.platform, e)
+        else:
+            if breaker is not None:
+                breaker.success()
+            if self.outbox is not None:
+                for delivered in jobs:
+                    self.outbox.delivered(delivered)
@@ -0,0 +1,191 @@
+"""
+Digest messages that summarise a backlog of UltraDNS events in one post.
+
+When a destination is rate limited, queued events are grouped by objectType
+and changeType into a single message instead of being posted one by one.
+Each platform (see platforms.py) pairs its digest format with a check of the
+structural limits of a message; its size cap is checked by the caller.
+"""
+import json
+
+# Platform limits for a single incoming webhook message
+SLACK_MAX_BLOCKS = 50
+SLACK_MAX_SECTION_TEXT = 3000
+# Longest heading, fact title or fact value in a Teams digest, so that one
+# event with a huge object name cannot take over the card
+TEAMS_MAX_TEXT = 1000
+DISCORD_MAX_EMBEDS = 10
+DISCORD_MAX_DESCRIPTION = 4096
+DISCORD_MAX_TEXT = 6000
+
+
+def _group_events(events):
+    """
+    Group events by (objectType, changeType), keeping first-seen order.
+    """
+    groups = {}
+    for event in events:
+        telemetry_event = event.get('telemetryEvent', {})
+        key = (
+            telemetry_event.get('objectType', 'Unknown Object'),
+            telemetry_event.get('changeType', 'Unknown Change'),
+        )
+        groups.setdefault(key, []).append({
+            "time": telemetry_event.get('changeTime', event.get('telemetryEventTime', 'Unknown Time')),
+            "object": telemetry_event.get('object', 'Unknown Object'),
+            "user": telemetry_event.get('user', 'Unknown User'),
+            "application": telemetry_event.get('application', 'Unknown Application'),
+            "account": event.get('accountName', 'Unknown Account'),
+        })
+    return groups
+
+
+def _cap(text, limit):
+    """
+    `text` cut to at most `limit` characters, ending in an ellipsis if it was cut.
+    """
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def slack_digest(events):
+    blocks = [
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": f"{len(events)} UltraDNS events",
+                "emoji": True
+            }
+        }
+    ]
+
+    for (object_type, change_type), entries in _group_events(events).items():
+        text = _cap(f"*{object_type} {change_type}* ({len(entries)})", SLACK_MAX_SECTION_TEXT)
+        for entry in entries:
+            # A single line may not exceed a section either
+            line = _cap(f"• {entry['time']} *{entry['object']}* by {entry['user']} "
+                        f"via {entry['application']} ({entry['account']})", SLACK_MAX_SECTION_TEXT)
+            # Start a new section rather than exceed Slack's text limit
+            if len(text) + len(line) + 1 > SLACK_MAX_SECTION_TEXT:
+                blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": text}})
+                text = line
+            else:
+                text = f"{text}\n{line}"
+        blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": text}})
+
+    return {"blocks": blocks}
+
+
+def teams_digest(events):
+    body = [
+        {
+            "type": "TextBlock",
+            "text": f"**{len(events)} UltraDNS events**",
+            "weight": "Bolder",
+            "size": "Medium"
+        }
+    ]
+
+    for (object_type, change_type), entries in _group_events(events).items():
+        body.append({
+            "type": "TextBlock",
+            "text": _cap(f"**{object_type} {change_type}** ({len(entries)})", TEAMS_MAX_TEXT),
+            "wrap": True
+        })
+        body.append({
+            "type": "FactSet",
+            "facts": [
+                {
+                    "title": _cap(str(entry['time']), TEAMS_MAX_TEXT),
+                    "value": _cap(f"{entry['object']} by {entry['user']} via {entry['application']} "
+                                  f"({entry['account']})", TEAMS_MAX_TEXT)
+                }
+                for entry in entries
+            ]
+        })
+
+    return {
+        "summary": f"{len(events)} UltraDNS events",
+        "attachments": [
+            {
+                "contentType": "application/vnd.microsoft.card.adaptive",
+                "content": {
+                    "type": "AdaptiveCard",
+                    "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+                    "version": "1.2",
+                    "body": body
+                }
+            }
+        ]
+    }
+
+
+def discord_digest(events):
+    embeds = []
+    for (object_type, change_type), entries in _group_events(events).items():
+        embeds.append({
+            "title": f"{object_type} {change_type} ({len(entries)})",
+            "description": "\n".join(
+                f"• {entry['time']} **{entry['object']}** by {entry['user']} "
+                f"via {entry['application']} ({entry['account']})"
+                for entry in entries
+            ),
+        })
+
+    return {
+        "username": "UltraDNS",
+        "content": f"**{len(events)} UltraDNS events**",
+        "embeds": embeds
+    }
+
+
+def generic_digest(events):
+    # Plain webhooks get the events in the format UltraDNS posts them
+    return {"telemetryEvents": events}
+
+
+def slack_fits(message):
+    blocks = message["blocks"]
+    return (len(blocks) <= SLACK_MAX_BLOCKS
+            and all(len(block["text"]["text"]) <= SLACK_MAX_SECTION_TEXT for block in blocks))
+
+
+def teams_fits(message):
+    for element in message["attachments"][0]["content"]["body"]:
+        if element["type"] == "FactSet":
+            texts = [text for fact in element["facts"] for text in (fact["title"], fact["value"])]
+        else:
+            texts = [element["text"]]
+        if any(len(text) > TEAMS_MAX_TEXT for text in texts):
+            return False
+    return True
+
+
+def discord_fits(message):
+    embeds = message["embeds"]
+    return (len(embeds) <= DISCORD_MAX_EMBEDS
+            and all(len(embed["description"]) <= DISCORD_MAX_DESCRIPTION for embed in embeds)
+            and sum(len(embed["title"]) + len(embed["description"]) for embed in embeds) <= DISCORD_MAX_TEXT)
+
+
+def build_digest(render, fits, max_bytes, events):
+    """
+    Render a digest of as many leading events as fit in one message, with
+    `render(events)` and `fits(message)` of a platform.
+    Returns (body, count); count is 0 if not even one event fits.
+    """
+    if not events:
+        return None, 0
+
+    # Fitting is monotonic in the number of events, so binary search the cut-off
+    best, low, high = (None, 0), 1, len(events)
+    while low <= high:
+        count = (low + high) // 2
+        message = render(events[:count])
+        body = json.dumps(message).encode()
+        if len(body) <= max_bytes and (fits is None or fits(message)):
+            best = (body, count)
+            low = count + 1
+        else:
+            high = count - 1
+    return best
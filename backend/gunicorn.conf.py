@@ -0,0 +1,74 @@
+"""
+Production server settings: `gunicorn -c gunicorn.conf.py`
+
+Every worker process runs its own delivery queue; the outbox, settings and
+secrets live on the data volume and are shared by all of them.
+
+With ASYNC_INGEST=true the workers run the ASGI app (asgi.py) under uvicorn,
+serving the ingest endpoints on an event loop.
+"""
+import glob
+import math
+import os
+import signal
+import sys
+
+# Workers keep their metrics in files there, added up by /metrics (see metrics.py).
+# prometheus_client reads it when first imported, so it is set before the app's modules are.
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(
+    os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")), "metrics"))
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", METRICS_DIR)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from migrations import migrate_database
+from prometheus_client import multiprocess
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8087')}"
+workers = int(os.getenv("WEB_WORKERS", "2"))
+if os.getenv("ASYNC_INGEST", "false").lower() == "true":
+    wsgi_app = "asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "app:app"
+    worker_class = "gthread"
+    threads = int(os.getenv("WEB_THREADS", "8"))
+timeout = 30
+# Stopping workers deliver queued notifications for up to SHUTDOWN_TIMEOUT
+# seconds before they are killed
+graceful_timeout = math.ceil(float(os.getenv("SHUTDOWN_TIMEOUT", "20"))) + 10
+accesslog = None
+
+
+def on_starting(server):
+    # Counters start over with the server; the files of a previous run would add up
+    for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.unlink(path)
+    # Migrate the schema once, before workers race to do it
+    migrate_database()
+
+
+def post_worker_init(worker):
+    # Turn telemetry away from the moment the worker is told to stop, while it
+    # finishes its open connections (uvicorn workers do it in asgi.py)
+    backend = sys.modules.get("app")
+    if backend is None:
+        return
+    handle_exit = worker.handle_exit
+
+    def stop(signum, frame):
+        backend.shutdown.begin()
+        handle_exit(signum, frame)
+    signal.signal(signal.SIGTERM, stop)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+def child_exit(server, worker):
+    # Gauges of an exited worker (queue depth, circuits) no longer count
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    # Hand queued notifications back to the outbox before the process exits
+    backend = sys.modules.get("app")
+    if backend is not None:
+        backend.shutdown.run()
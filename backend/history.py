@@ -0,0 +1,250 @@
+"""
+Event history: every received telemetry event with the outcome of its
+notifications.
+
+The rows of a payload's events are inserted in its outbox transaction (see
+Outbox.add_batch()), and every notification keeps the id of its event's row.
+The delivery outcomes reported by the outbox are counted in memory by that id
+and written by a background thread in one transaction every `flush_interval`
+seconds. The same thread enforces retention: rows older than `retention`
+seconds and all but the newest `max_rows` are deleted in chunks.
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import bindparam, delete, select, text, update
+
+from metrics import HISTORY_DROPPED
+from models import db, EventRecord
+from outbox import dump_event
+
+# Rows deleted per transaction by compact(), so ingest never waits long on the write lock
+DELETE_CHUNK = 2000
+
+MAX_PAGE_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+_OUTCOME = (
+    update(EventRecord.__table__)
+    .where(EventRecord.id == bindparam("b_id"))
+    .values(delivered=EventRecord.delivered + bindparam("b_delivered"),
+            failed=EventRecord.failed + bindparam("b_failed"))
+)
+
+
+def _text(value, limit):
+    return value[:limit] if isinstance(value, str) else None
+
+
+def event_row(received_at, token, event, messages):
+    """
+    The event_history row of an UltraDNS event.
+    """
+    details = event.get("telemetryEvent")
+    if not isinstance(details, dict):
+        details = {}
+    return {
+        "received_at": received_at,
+        "token": token,
+        "event_id": _text(event.get("telemetryEventId"), 100),
+        "event_type": _text(event.get("telemetryEventType"), 100),
+        "account_name": _text(event.get("accountName"), 200),
+        "object_type": _text(details.get("objectType"), 100),
+        "change_type": _text(details.get("changeType"), 100),
+        "object": _text(details.get("object"), 500),
+        "event": dump_event(event),
+        "messages": messages,
+        "delivered": 0,
+        "failed": 0,
+    }
+
+
+def record_status(record):
+    """
+    "delivered" once every notification went out, "failed" if one was
+    dead-lettered, "queued" otherwise.
+    """
+    if record.delivered >= record.messages:
+        return "delivered"
+    return "failed" if record.failed else "queued"
+
+
+def serialize_record(record):
+    return {
+        "id": record.id,
+        "received_at": record.received_at,
+        "token": record.token,
+        "telemetryEventId": record.event_id,
+        "telemetryEventType": record.event_type,
+        "accountName": record.account_name,
+        "objectType": record.object_type,
+        "changeType": record.change_type,
+        "object": record.object,
+        "messages": record.messages,
+        "delivered": record.delivered,
+        "failed": record.failed,
+        "status": record_status(record),
+        "event": json.loads(record.event) if record.event else None,
+    }
+
+
+class EventHistory:
+    """
+    Buffered writer, retention job and queries of the event history.
+    Safe to use from any thread.
+    """
+
+    def __init__(self, app, flush_interval=1.0, max_buffer=100000, retention=30 * 86400,
+                 max_rows=1000000, compact_interval=300.0, clock=time.time):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.retention = retention
+        self.max_rows = max_rows
+        self.compact_interval = compact_interval
+        self.clock = clock
+        self._outcomes = {}  # history row id -> [delivered, failed]
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def rows(self, token, events):
+        """
+        The event_history rows of the accepted events of one payload, from
+        (event, number of notifications rendered for it) pairs.
+        """
+        now = self.clock()
+        return [event_row(now, token, event, messages) for event, messages in events]
+
+    def _count(self, job, column):
+        if job.history_id is None:
+            return
+        with self._lock:
+            counts = self._outcomes.get(job.history_id)
+            if counts is None:
+                counts = self._outcomes[job.history_id] = [0, 0]
+            counts[column] += 1
+
+    def delivered(self, job):
+        self._count(job, 0)
+
+    def failed(self, job):
+        """
+        Count a notification that was dead-lettered.
+        """
+        self._count(job, 1)
+
+    def _restore(self, outcomes):
+        """
+        Put back outcomes that could not be written, unless too many are
+        waiting already.
+        """
+        with self._lock:
+            if len(self._outcomes) + len(outcomes) > self.max_buffer:
+                HISTORY_DROPPED.inc(len(outcomes))
+                logger.error("Dropped the delivery outcomes of %d history events", len(outcomes))
+                return
+            for history_id, (delivered, failed) in outcomes.items():
+                counts = self._outcomes.setdefault(history_id, [0, 0])
+                counts[0] += delivered
+                counts[1] += failed
+
+    def flush(self):
+        """
+        Write the buffered outcomes in one transaction. They are kept for the
+        next flush if it fails.
+        """
+        with self._lock:
+            outcomes, self._outcomes = self._outcomes, {}
+        if not outcomes:
+            return
+        try:
+            with self.app.app_context():
+                db.session.execute(_OUTCOME, [
+                    {"b_id": history_id, "b_delivered": delivered, "b_failed": failed}
+                    for history_id, (delivered, failed) in outcomes.items()
+                ])
+                db.session.commit()
+        except Exception:
+            self._restore(outcomes)
+            raise
+
+    def _delete_through(self, condition):
+        deleted = 0
+        with self.app.app_context():
+            while True:
+                chunk = select(EventRecord.id).where(condition).order_by(EventRecord.id).limit(DELETE_CHUNK)
+                result = db.session.execute(
+                    delete(EventRecord).where(EventRecord.id.in_(chunk)).execution_options(synchronize_session=False)
+                )
+                db.session.commit()
+                deleted += result.rowcount
+                if result.rowcount < DELETE_CHUNK:
+                    return deleted
+
+    def compact(self):
+        """
+        Delete rows past the retention period and beyond max_rows, oldest
+        first. Returns the number of rows deleted.
+        """
+        deleted = self._delete_through(EventRecord.received_at < self.clock() - self.retention)
+        with self.app.app_context():
+            boundary = db.session.execute(
+                select(EventRecord.id).order_by(EventRecord.id.desc()).offset(self.max_rows).limit(1)
+            ).scalar()
+        if boundary is not None:
+            deleted += self._delete_through(EventRecord.id <= boundary)
+        with self.app.app_context():
+            # Refresh the planner statistics so combined filters pick the most selective index
+            db.session.execute(text("PRAGMA optimize"))
+            db.session.commit()
+        return deleted
+
+    def query(self, token=None, account=None, object_type=None, event_type=None,
+              since=None, until=None, cursor=None, limit=50):
+        """
+        One page of events, newest first, matching all given filters.
+        `cursor` is the next_cursor of the previous page.
+        Returns (events, next_cursor); next_cursor is None on the last page.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        statement = select(EventRecord).order_by(EventRecord.id.desc()).limit(limit + 1)
+        for column, value in ((EventRecord.token, token), (EventRecord.account_name, account),
+                              (EventRecord.object_type, object_type), (EventRecord.event_type, event_type)):
+            if value is not None:
+                statement = statement.where(column == value)
+        if since is not None:
+            statement = statement.where(EventRecord.received_at >= since)
+        if until is not None:
+            statement = statement.where(EventRecord.received_at < until)
+        if cursor is not None:
+            statement = statement.where(EventRecord.id < cursor)
+
+        with self.app.app_context():
+            records = db.session.execute(statement).scalars().all()
+            page = [serialize_record(record) for record in records[:limit]]
+        next_cursor = page[-1]["id"] if len(records) > limit else None
+        return page, next_cursor
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="event-history", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        next_compact = self.clock() + self.compact_interval
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if self.clock() >= next_compact:
+                    next_compact = self.clock() + self.compact_interval
+                    deleted = self.compact()
+                    if deleted:
+                        logger.info("Removed %d events from the history", deleted)
+            except Exception as e:
+                logger.exception("Error writing event history: %s", e)
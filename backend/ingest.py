@@ -0,0 +1,300 @@
+"""
+Parsing and validation of UltraDNS telemetry payloads.
+
+Large request bodies are parsed incrementally with ijson, when installed:
+events are built one at a time as the body is read, and only the first
+`max_changes` entries of an event's telemetryEvent.detail.changes are kept
+(the others are counted under detail.omittedChanges). The memory a request
+takes is then bounded by the events' own fields rather than by the size of
+the bulk changes they carry.
+
+ijson fails on some numbers json.loads accepts (integers outside 64 bits
+with the C backend, floats that overflow). So a streamed body is also
+spooled, to disk beyond SPOOL_BYTES, and parsed with json.loads if ijson
+fails: small and large payloads are then accepted alike.
+
+A payload's telemetryEvents array is checked in one pass before anything is
+written, so a malformed event is reported on its own instead of failing the
+whole request halfway through.
+"""
+import json
+import tempfile
+from collections import namedtuple
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Entries of detail.changes dropped while parsing, counted in the detail
+OMITTED_KEY = "omittedChanges"
+
+EVENT_PREFIX = "telemetryEvents.item"
+CHANGE_PREFIX = "telemetryEvents.item.telemetryEvent.detail.changes.item"
+_VALUE_STARTS = frozenset(("start_map", "start_array", "null", "boolean", "integer", "double", "number", "string"))
+
+# Bodies are read from the stream in chunks of this size
+READ_SIZE = 65536
+
+# Streamed bodies are kept in memory up to this size to be parsed again, beyond it on disk
+SPOOL_BYTES = 1048576
+
+# The outcome of preparing one payload, before anything is written:
+# the connection (marked verified by test telemetry), the outbox entries,
+# statements to commit with them, the new events as rendered and their dedup
+# keys, (rendered event, event_history row) pairs and the response summary.
+Batch = namedtuple('Batch', ['connection', 'entries', 'statements', 'events', 'keys', 'history', 'summary'])
+
+
+class InvalidPayload(Exception):
+    """
+    A request body that cannot be ingested; `status` is the HTTP status to
+    answer with.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def too_large(max_bytes):
+    return InvalidPayload(f"Payload larger than {max_bytes} bytes", 413)
+
+
+def truncate_changes(event, max_changes):
+    """
+    Keep the first `max_changes` entries of an event's detail.changes.
+    """
+    details = event.get("telemetryEvent") if isinstance(event, dict) else None
+    detail = details.get("detail") if isinstance(details, dict) else None
+    changes = detail.get("changes") if isinstance(detail, dict) else None
+    if isinstance(changes, list) and len(changes) > max_changes:
+        detail["changes"] = changes[:max_changes]
+        detail[OMITTED_KEY] = detail.get(OMITTED_KEY, 0) + len(changes) - max_changes
+
+
+def _mark_omitted(event, omitted):
+    details = event.get("telemetryEvent") if isinstance(event, dict) else None
+    detail = details.get("detail") if isinstance(details, dict) else None
+    if isinstance(detail, dict):
+        detail[OMITTED_KEY] = omitted
+
+
+def parse_payload(body, max_changes):
+    """
+    Parse a request body held in memory.
+    Returns the telemetryEvents list; raises InvalidPayload.
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+    if not payload or not isinstance(payload, dict):
+        raise InvalidPayload("Invalid request format")
+    events = payload.get("telemetryEvents")
+    if not events or not isinstance(events, list):
+        raise InvalidPayload("Invalid telemetryEvents format")
+    for event in events:
+        truncate_changes(event, max_changes)
+    return events
+
+
+class StreamParser:
+    """
+    Incremental parser of a payload fed in chunks. ijson builds the
+    telemetryEvents one at a time, and entries of detail.changes beyond
+    `max_changes` per event are dropped before they are built.
+    """
+
+    def __init__(self, max_changes):
+        self.max_changes = max_changes
+        backend = ijson.get_backend(ijson.backend)
+        self.events = ijson.sendable_list()
+        self.omitted = {}  # event index -> changes dropped
+        self.is_object = None
+        self.has_keys = False
+        self.listed = None
+        collect = self._collect(backend.items_basecoro(self.events, EVENT_PREFIX), max_changes)
+        next(collect)
+        self._parser = backend.basic_parse_basecoro(backend.parse_basecoro(collect), use_float=True)
+        # A copy of the body to parse with json.loads if ijson fails
+        self._spool = tempfile.SpooledTemporaryFile(SPOOL_BYTES)
+        self._failed = False
+
+    def _collect(self, target, max_changes):
+        # Runs once per parse event, so the common cases are tested first
+        send = target.send
+        index = -1
+        count = 0
+        while True:
+            item = yield
+            prefix = item[0]
+            if prefix.startswith(CHANGE_PREFIX):
+                if prefix == CHANGE_PREFIX and item[1] in _VALUE_STARTS:
+                    count += 1
+                    if count > max_changes:
+                        self.omitted[index] = count - max_changes
+                if count > max_changes and (len(prefix) == len(CHANGE_PREFIX) or prefix[len(CHANGE_PREFIX)] == "."):
+                    continue
+            elif prefix == EVENT_PREFIX:
+                if item[1] in _VALUE_STARTS:
+                    index += 1
+                    count = 0
+            elif prefix == "":
+                if self.is_object is None:
+                    self.is_object = item[1] == "start_map"
+                self.has_keys = self.has_keys or item[1] == "map_key"
+            elif prefix == "telemetryEvents" and item[1] in _VALUE_STARTS:
+                self.listed = item[1] == "start_array"
+            send(item)
+
+    def feed(self, chunk):
+        self._spool.write(chunk)
+        if self._failed:
+            return
+        try:
+            self._parser.send(chunk)
+        except ijson.JSONError:
+            # Possibly a number ijson cannot hold; the rest is only spooled
+            self._failed = True
+
+    def result(self):
+        """
+        Returns the telemetryEvents list; raises InvalidPayload.
+        """
+        try:
+            if not self._failed:
+                try:
+                    self._parser.close()
+                except ijson.JSONError:
+                    self._failed = True
+            if self._failed:
+                self._spool.seek(0)
+                return parse_payload(self._spool.read(), self.max_changes)
+        finally:
+            self._spool.close()
+        if not self.is_object or not self.has_keys:
+            raise InvalidPayload("Invalid request format")
+        if not self.listed or not self.events:
+            raise InvalidPayload("Invalid telemetryEvents format")
+        for index, omitted in self.omitted.items():
+            _mark_omitted(self.events[index], omitted)
+        return list(self.events)
+
+
+class LimitedReader:
+    """
+    File-like view of a request body stream that refuses to read more than
+    `max_bytes`.
+    """
+
+    def __init__(self, stream, max_bytes):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.read_bytes = 0
+
+    def read(self, size=READ_SIZE):
+        data = self.stream.read(size)
+        self.read_bytes += len(data)
+        if self.read_bytes > self.max_bytes:
+            raise too_large(self.max_bytes)
+        return data
+
+
+def read_payload(stream, length, max_bytes, max_changes, stream_above=1048576):
+    """
+    Read and parse the body of an ingest request from `stream`. Bodies of
+    unknown `length` or larger than `stream_above` bytes are parsed
+    incrementally.
+    Returns the telemetryEvents list; raises InvalidPayload.
+    """
+    if length is not None and length > max_bytes:
+        raise too_large(max_bytes)
+    reader = LimitedReader(stream, max_bytes)
+    chunks = iter(reader.read, b"")
+    if ijson is None or (length is not None and length <= stream_above):
+        return parse_payload(b"".join(chunks), max_changes)
+
+    parser = StreamParser(max_changes)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.result()
+
+
+async def read_payload_async(receive_chunk, length, max_bytes, max_changes, stream_above=1048576):
+    """
+    read_payload() for asyncio servers, reading the body with
+    `await receive_chunk()`, which returns b"" at the end.
+    """
+    if length is not None and length > max_bytes:
+        raise too_large(max_bytes)
+    parser = None
+    if ijson is not None and (length is None or length > stream_above):
+        parser = StreamParser(max_changes)
+    chunks = []
+    read_bytes = 0
+    while True:
+        chunk = await receive_chunk()
+        if not chunk:
+            break
+        read_bytes += len(chunk)
+        if read_bytes > max_bytes:
+            raise too_large(max_bytes)
+        if parser is not None:
+            parser.feed(chunk)
+        else:
+            chunks.append(chunk)
+    if parser is None:
+        return parse_payload(b"".join(chunks), max_changes)
+    return parser.result()
+
+
+def validate_events(events):
+    """
+    Split events into the valid ones and an error per invalid one.
+    An event must be an object with a string telemetryEventType; its
+    telemetryEvent, when present, must be an object.
+    Returns (valid events, [{"index": i, "error": reason}, ...]).
+    """
+    valid = []
+    errors = []
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            errors.append({"index": index, "error": "Event is not an object"})
+        elif not isinstance(event.get("telemetryEventType"), str):
+            errors.append({"index": index, "error": "Missing telemetryEventType"})
+        elif not isinstance(event.get("telemetryEvent", {}), dict):
+            errors.append({"index": index, "error": "telemetryEvent is not an object"})
+        else:
+            valid.append(event)
+    return valid, errors
+
+
+def summarize(accepted, errors, messages, duplicates=0):
+    """
+    The response body of an ingest request: how many events were accepted
+    and queued as how many messages, how many were dropped as repeats and
+    why the others were rejected. Events not listed in `errors` were
+    accepted or repeats.
+    """
+    return {"accepted": accepted, "rejected": len(errors), "duplicates": duplicates,
+            "messages": messages, "errors": errors}
+
+
+def without_repeats(batch, repeated):
+    """
+    The batch without the events whose dedup keys are in `repeated`, which
+    turned out to be accepted already, and their messages.
+    """
+    dropped = {id(event) for event, key in zip(batch.events, batch.keys) if key in repeated}
+    kept = [(event, key) for event, key in zip(batch.events, batch.keys) if id(event) not in dropped]
+    entries = [entry for entry in batch.entries if id(entry[3]) not in dropped]
+    summary = dict(batch.summary, accepted=len(kept), messages=len(entries),
+                   duplicates=batch.summary["duplicates"] + len(dropped))
+    return batch._replace(
+        entries=entries,
+        events=[event for event, _ in kept],
+        keys=[key for _, key in kept],
+        history=[pair for pair in batch.history if id(pair[0]) not in dropped],
+        summary=summary,
+    )
@@ -0,0 +1,35 @@
+"""
+Secrets shared by every backend process.
+
+The session key and the frontend API token used to be generated per process,
+so two workers would disagree on both. They are now generated once and kept in
+a key file on the data volume.
+"""
+import json
+import os
+
+
+def load_or_create_secrets(path):
+    """
+    Return the secrets stored at `path`, creating the file on first use.
+    Creation is atomic, so concurrent workers all end up with the same values.
+    """
+    if not os.path.exists(path):
+        secrets = {
+            "secret_key": os.urandom(32).hex(),
+            "api_token": os.urandom(32).hex(),
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(secrets, f)
+        try:
+            # link() fails if another worker created the file first
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,188 @@
+"""
+Structured logging for the notifier.
+
+Records are written as one JSON object per line by a background thread: the
+logging call only puts the record on a bounded queue, so request threads never
+wait on stdout. When the queue is full, records are dropped and counted rather
+than blocking.
+
+Webhook URLs and connection tokens are redacted from every line, DEBUG records can be
+sampled, and levels can be set per module (LOG_LEVELS="delivery=DEBUG,...").
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import time
+
+from metrics import LOG_RECORDS_DROPPED
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Keep scheme and host of URLs, drop the path that carries the webhook secret
+URL_PATTERN = re.compile(r"(https?://[^/\s\"']+)/[^\s\"']*")
+# Connection tokens (UUIDs) in API paths keep a short prefix, whatever the platform
+API_PATH_PATTERN = re.compile(
+    r"(/api/[\w-]+/[0-9a-fA-F]{8})-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+# `extra` fields holding secrets
+SECRET_FIELDS = frozenset({"token", "webhook_url", "api_token"})
+
+# LogRecord attributes that are not `extra` fields
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def redact(text):
+    """
+    Mask webhook URL paths and tokens in API paths in `text`. The substring
+    checks skip the regexes for the common line without any.
+    """
+    if "://" in text:
+        text = URL_PATTERN.sub(r"\1/…", text)
+    if "/api/" in text:
+        text = API_PATH_PATTERN.sub(r"\1…", text)
+    return text
+
+
+def parse_levels(text):
+    """
+    Parse "module=LEVEL,other=LEVEL" into a dict of logger names to levels.
+    """
+    levels = {}
+    for item in (text or "").split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, message, any `extra`
+    fields and the formatted exception.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key in SECRET_FIELDS:
+                entry[key] = f"{str(value)[:8]}…"
+            elif key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if orjson is not None:
+            return orjson.dumps(entry, default=str).decode()
+        return json.dumps(entry, default=str)
+
+
+class RedactingFormatter(logging.Formatter):
+    """
+    Wraps another formatter and redacts its output.
+    """
+
+    def __init__(self, formatter):
+        super().__init__()
+        self.formatter = formatter
+
+    def format(self, record):
+        return redact(self.formatter.format(record))
+
+
+class DebugSampler(logging.Filter):
+    """
+    Passes every record above DEBUG and a `rate` fraction of DEBUG records.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that drops (and counts) records when the queue is full.
+    """
+
+    def prepare(self, record):
+        # Only resolve the message here, the listener thread does the formatting
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+_listener = None
+
+
+def configure(level="INFO", levels=None, debug_sample=1.0, fmt="json", queue_size=10000, stream=None):
+    """
+    Route all logging through a queue to a writer thread.
+
+    - `levels` maps logger names to levels, overriding `level`.
+    - `debug_sample` is the fraction of DEBUG records kept.
+    - `fmt` is "json" or "text".
+    Calling it again replaces the previous configuration.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if fmt == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    output.setFormatter(RedactingFormatter(formatter))
+
+    handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    handler.addFilter(DebugSampler(debug_sample))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, NonBlockingQueueHandler):
+            root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    for name, module_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return handler
+
+
+@atexit.register
+def flush():
+    """
+    Write out queued records and stop the writer thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,148 @@
+"""
+Prometheus metrics for the notifier, kept with prometheus_client.
+
+Under gunicorn every worker process updates its own metrics. gunicorn.conf.py
+sets PROMETHEUS_MULTIPROC_DIR before anything imports prometheus_client, so
+the values are kept in memory-mapped files there, and /metrics (or the
+dashboard's stats) adds up the files of all processes when it is read. The
+directory is emptied when the server starts. A standalone app keeps them in
+process.
+
+Webhook tokens authorize ingest, so metrics are labelled with token_label()
+of a token rather than the token itself.
+"""
+import functools
+import hashlib
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client import generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# Latency buckets in seconds, from 100us to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+
+@functools.lru_cache(maxsize=4096)
+def token_label(token):
+    """
+    The label value standing for a webhook token: the start of its SHA-256.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()[:12]
+
+
+def destination_label(key):
+    """
+    The label value of a destination key, "<token>" or "<token>/<route id>".
+    """
+    token, slash, route = key.partition("/")
+    return token_label(token) + slash + route
+
+
+def _registry():
+    """
+    The metrics of all processes: read from the shared files in
+    multiprocess mode, from memory otherwise.
+    """
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def merged(*metrics):
+    """
+    The samples of each counter or gauge over all processes, as lists of
+    (labels dict, value). The shared files are read once for all of them.
+    """
+    names = []
+    for metric in metrics:
+        family = metric.describe()[0]
+        names.append(family.name + "_total" if family.type == "counter" else family.name)
+    samples = {name: [] for name in names}
+    for family in _registry().collect():
+        for sample in family.samples:
+            if sample.name in samples:
+                samples[sample.name].append((sample.labels, sample.value))
+    return [samples[name] for name in names]
+
+
+def expose(*collectors):
+    """
+    Render the metrics of all processes in the Prometheus text format,
+    followed by those of `collectors`, which are only read now.
+    """
+    extra = CollectorRegistry(auto_describe=False)
+    for collector in collectors:
+        extra.register(collector)
+    return generate_latest(_registry()) + generate_latest(extra)
+
+
+class ScrapedGauge:
+    """
+    A gauge read from `read()`, {label values: value}, only when /metrics is
+    scraped, by the process serving it. Pass it to expose().
+    """
+
+    def __init__(self, name, documentation, labelnames, read):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.read = read
+
+    def collect(self):
+        gauge = GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        for values, value in self.read().items():
+            gauge.add_metric(values, value)
+        yield gauge
+
+
+EVENTS_RECEIVED = Counter(
+    "notifier_events_received_total", "UltraDNS telemetry events received.", ["webhook", "event_type"])
+DELIVERED = Counter(
+    "notifier_deliveries_total", "Notifications accepted by the destination webhook.", ["platform"])
+DELIVERY_FAILURES = Counter(
+    "notifier_delivery_failures_total", "Failed delivery attempts.", ["platform"])
+RETRIES = Counter(
+    "notifier_delivery_retries_total", "Failed deliveries scheduled for another attempt.", ["platform"])
+DUPLICATES = Counter(
+    "notifier_duplicate_events_total", "Repeated telemetry events dropped by telemetryEventId.", ["webhook"])
+DEAD_LETTERS = Counter(
+    "notifier_dead_letters_total", "Notifications moved to the dead-letter table.", ["platform"])
+PARKED = Counter(
+    "notifier_parked_notifications_total", "Notifications handed back to the outbox while their circuit was open.",
+    ["platform"])
+NOTIFICATIONS = Counter(
+    "notifier_webhook_notifications_total", "Notifications delivered or dead-lettered, by webhook.",
+    ["webhook", "outcome"])
+
+INGEST_SECONDS = Histogram(
+    "notifier_ingest_seconds", "Time to handle an UltraDNS telemetry request.", ["platform"],
+    buckets=DEFAULT_BUCKETS)
+RENDER_SECONDS = Histogram(
+    "notifier_render_seconds", "Time to render the messages of one request for a platform.", ["platform"],
+    buckets=DEFAULT_BUCKETS)
+HTTP_SECONDS = Histogram(
+    "notifier_http_request_seconds", "Latency of outbound webhook posts.", ["host"], buckets=DEFAULT_BUCKETS)
+DB_QUERY_SECONDS = Histogram(
+    "notifier_db_query_seconds", "SQLite statement execution time.", ["operation"], buckets=DEFAULT_BUCKETS)
+
+# Gauges of live processes only: summed for the queue, the worst for circuits
+QUEUE_DEPTH = Gauge(
+    "notifier_delivery_queue_depth", "Notifications queued in memory for delivery.",
+    multiprocess_mode="livesum")
+CIRCUIT_STATE = Gauge(
+    "notifier_circuit_state", "Circuit breaker of a destination: 0 closed, 1 half-open, 2 open.",
+    ["destination"], multiprocess_mode="livemax")
+CIRCUIT_FAILURES = Gauge(
+    "notifier_circuit_consecutive_failures", "Consecutive failed deliveries to a destination.",
+    ["destination"], multiprocess_mode="livemax")
+HISTORY_DROPPED = Counter(
+    "notifier_history_events_dropped_total",
+    "History events whose delivery outcomes were dropped because they could not be written.")
+LOG_RECORDS_DROPPED = Counter(
+    "notifier_log_records_dropped_total", "Log records dropped because the log queue was full.")
@@ -0,0 +1,123 @@
+"""
+Versioned schema migrations.
+
+The database records the number of the last migration applied to it in the
+setting table (key `schema_version`). Pending migrations run in order, and
+the version is recorded after each one succeeds:
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --check    # exit 1 if any are pending
+
+The gunicorn master applies them before the workers start (see
+gunicorn.conf.py), so importing the app normally only reads the version. Migration 1
+creates the tables of the current models, which makes a new database fully
+current; later migrations bring databases created by older releases up to
+date and must therefore skip what already exists. That also makes a
+migration safe to run again if it was interrupted.
+"""
+import argparse
+import logging
+import os
+import sys
+
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from models import DATA_DIR, Setting, configure_sqlite, database_uri, db
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "schema_version"
+
+
+def create_tables(connection):
+    db.metadata.create_all(connection)
+
+
+# (version, description, step(connection)), in order
+MIGRATIONS = [
+    (1, "create tables", create_tables),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+def schema_version(connection):
+    """
+    The last migration applied to a database, 0 for a new one.
+    """
+    try:
+        value = connection.execute(select(Setting.value).where(Setting.key == VERSION_KEY)).scalar()
+    except (OperationalError, ProgrammingError):
+        # No setting table yet
+        connection.rollback()
+        return 0
+    return int(value) if value else 0
+
+
+def _set_version(connection, version):
+    connection.execute(delete(Setting.__table__).where(Setting.key == VERSION_KEY))
+    connection.execute(insert(Setting.__table__).values(key=VERSION_KEY, value=str(version)))
+
+
+def pending(engine):
+    """
+    The migrations not yet applied, as (version, description) pairs.
+    """
+    with engine.connect() as connection:
+        version = schema_version(connection)
+    return [(number, description) for number, description, _ in MIGRATIONS if number > version]
+
+
+def migrate(engine):
+    """
+    Apply the pending migrations. Returns the versions applied; costs one
+    query when the database is current.
+    """
+    applied = []
+    with engine.connect() as connection:
+        version = schema_version(connection)
+        connection.rollback()
+        for number, description, step in MIGRATIONS:
+            if number <= version:
+                continue
+            with connection.begin():
+                step(connection)
+                _set_version(connection, number)
+            logger.info("Migrated the database to version %d: %s", number, description)
+            applied.append(number)
+    return applied
+
+
+def migrate_database(uri=None):
+    """
+    Migrate a database outside the Flask app, e.g. once in the gunicorn
+    master before workers start.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    engine = create_engine(uri or database_uri())
+    configure_sqlite(engine)
+    try:
+        return migrate(engine)
+    finally:
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--check", action="store_true", help="only report pending migrations")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.check:
+        engine = create_engine(database_uri())
+        waiting = pending(engine)
+        engine.dispose()
+        for number, description in waiting:
+            print(f"pending: {number} {description}")
+        sys.exit(1 if waiting else 0)
+    applied = migrate_database()
+    print(f"database at version {LATEST}" + (f", applied {applied}" if applied else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import os
+import sqlite3
+import time
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+
+from metrics import DB_QUERY_SECONDS
+
+db = SQLAlchemy()
+
+# Default location of the database and key file
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.abspath(os.path.dirname(__file__)), "data"))
+
+# Seconds a connection waits for another process's write lock
+SQLITE_BUSY_TIMEOUT = 15
+
+
+def database_uri():
+    return os.getenv("DATABASE_URI", f"sqlite:///{DATA_DIR}/data.db")
+
+
+def configure_sqlite(engine):
+    """
+    Open SQLite in WAL mode so readers never block the writer and several
+    worker processes can share the database.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000}")
+        cursor.close()
+
+
+def _verb(sql):
+    verb = _verbs.get(sql)
+    if verb is None:
+        if len(_verbs) > 1000:
+            _verbs.clear()
+        verb = _verbs[sql] = sql.split(None, 1)[0].upper() if sql.strip() else "?"
+    return verb
+
+_verbs = {}
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    sqlite3 cursor that records statement execution times in DB_QUERY_SECONDS,
+    labelled by verb (SELECT, INSERT, ...). Cheaper than SQLAlchemy's cursor
+    execute events, which roughly double the cost of a small query.
+    """
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            DB_QUERY_SECONDS.labels(_verb(sql)).observe(time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            DB_QUERY_SECONDS.labels(_verb(sql)).observe(time.perf_counter() - start)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+
+def sqlite_connect_args():
+    """
+    connect_args for the app's engine: wait on locked databases and time queries.
+    """
+    return {"timeout": SQLITE_BUSY_TIMEOUT, "factory": TimedConnection}
+
+
+# Define models
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(50), unique=True, nullable=False)
+    password = db.Column(db.String(255), nullable=False)
+
+class Setting(db.Model):
+    """
+    Small key/value store for state shared between worker processes.
+    """
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(500), nullable=False)
+
+class WebhookConnection(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(20), nullable=False)  # any platform of platforms.names()
+    token = db.Column(db.String(100), unique=True, nullable=False)
+    webhook_url = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # e.g., 'pending', 'verified'
+
+class Route(db.Model):
+    """
+    An extra destination for the telemetry of a WebhookConnection, optionally
+    limited to events matching its filters (see routing.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    connection_id = db.Column(db.Integer, db.ForeignKey('webhook_connection.id'), nullable=False, index=True)
+    type = db.Column(db.String(20), nullable=False)  # any platform of platforms.names()
+    webhook_url = db.Column(db.String(500), nullable=False)
+    filters = db.Column(db.JSON, nullable=False, default=dict)  # {field: [values]}
+
+class OutboxEvent(db.Model):
+    """
+    A rendered notification waiting to be delivered (or retried).
+    Rows are deleted once the webhook accepts them.
+    """
+    __table_args__ = (db.Index('ix_outbox_event_due', 'state', 'next_attempt_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(100), nullable=False)  # destination key, see routing.py
+    platform = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)  # JSON body to post
+    event = db.Column(db.LargeBinary)  # UltraDNS event JSON, used for digests
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    state = db.Column(db.String(20), nullable=False)  # 'inflight' or 'pending'
+    next_attempt_at = db.Column(db.Float, nullable=False)
+    lease_until = db.Column(db.Float)  # inflight rows are reclaimed after this
+    owner = db.Column(db.String(40))
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.Float, nullable=False)
+    history_id = db.Column(db.Integer)  # event_history row of the event, if kept
+
+class SeenEvent(db.Model):
+    """
+    A telemetry event accepted recently, used to drop repeats (see dedup.py).
+    """
+    key = db.Column(db.String(200), primary_key=True)  # "<token>:<telemetryEventId>"
+    seen_at = db.Column(db.Float, nullable=False, index=True)
+
+class EventRecord(db.Model):
+    """
+    A received telemetry event and the outcome of its notifications, kept for
+    the event history (see history.py). Pages are read newest first by id.
+    """
+    __tablename__ = 'event_history'
+    __table_args__ = (
+        db.Index('ix_event_history_token', 'token', 'id'),
+        db.Index('ix_event_history_account', 'account_name', 'id'),
+        db.Index('ix_event_history_object_type', 'object_type', 'id'),
+        db.Index('ix_event_history_event_id', 'token', 'event_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    received_at = db.Column(db.Float, nullable=False, index=True)
+    token = db.Column(db.String(100), nullable=False)  # WebhookConnection token
+    event_id = db.Column(db.String(100))  # telemetryEventId
+    event_type = db.Column(db.String(100))
+    account_name = db.Column(db.String(200))
+    object_type = db.Column(db.String(100))
+    change_type = db.Column(db.String(100))
+    object = db.Column(db.String(500))
+    event = db.Column(db.LargeBinary)  # UltraDNS event JSON
+    messages = db.Column(db.Integer, nullable=False)  # notifications rendered for it
+    delivered = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)  # dead-lettered
+
+class DeadLetter(db.Model):
+    """
+    A notification that failed permanently or ran out of retries.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(100), nullable=False)
+    platform = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    event = db.Column(db.LargeBinary)
+    attempts = db.Column(db.Integer, nullable=False)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.Float, nullable=False)
+    failed_at = db.Column(db.Float, nullable=False)
+    history_id = db.Column(db.Integer)
+
+class RateBucket(db.Model):
+    """
+    The token bucket of a rate-limited destination, shared by all worker
+    processes (see ratelimit.py).
+    """
+    key = db.Column(db.String(100), primary_key=True)  # destination key, see routing.py
+    tokens = db.Column(db.Float, nullable=False)
+    updated = db.Column(db.Float, nullable=False)
+    paused_until = db.Column(db.Float, nullable=False, default=0.0)
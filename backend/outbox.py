@@ -0,0 +1,399 @@
+"""
+Durable SQLite outbox for outbound notifications.
+
+Every rendered message is written to the outbox table before it is queued for
+delivery, in one transaction per incoming payload. Delivered rows are deleted;
+failed rows are rescheduled with jittered exponential backoff (or the webhook's
+Retry-After) and moved to the dead-letter table once they fail permanently.
+
+Queued rows are held under a claim, with a lease. A process renews the
+leases of all the rows it holds while it runs, however long they wait behind
+a rate limit, so another worker only reclaims them once it is gone. A stale
+holder's outcome for a row claimed again elsewhere is ignored.
+"""
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from delivery import DeliveryJob
+from metrics import DEAD_LETTERS, DELIVERED, DELIVERY_FAILURES, NOTIFICATIONS, QUEUE_DEPTH, RETRIES, token_label
+from models import db, DeadLetter, EventRecord, OutboxEvent
+from routing import connection_token
+from transport import parse_retry_after
+
+# Inflight rows whose lease has expired (e.g. after a crash) are claimed again
+LEASE_SECONDS = 300
+
+# A running process extends the leases of the rows it holds this often
+RENEW_SECONDS = LEASE_SECONDS / 3
+
+logger = logging.getLogger(__name__)
+
+
+def dump_event(event):
+    """
+    Serialize an event for storage. Uses orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(event)
+    return json.dumps(event).encode()
+
+
+def is_retryable(error):
+    """
+    Throttling, server errors and network failures are worth retrying.
+    Any other HTTP error (bad URL, revoked webhook, ...) is permanent.
+    """
+    import requests
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status in (408, 429) or status >= 500
+    return isinstance(error, requests.RequestException)
+
+
+def retry_delay(attempts, base, cap):
+    """
+    Exponential backoff with equal jitter: half the window is fixed, half random.
+    """
+    window = min(cap, base * 2 ** attempts)
+    return window / 2 + random.uniform(0, window / 2)
+
+
+class Outbox:
+    """
+    Persistence layer for pending deliveries. Safe to use from any thread.
+    """
+
+    def __init__(self, app, max_attempts=8, backoff_base=2.0, backoff_max=600.0, history=None):
+        self.app = app
+        self.history = history
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._acked = []
+        self._lock = threading.Lock()
+        # Prefix of this process's claims, to renew their leases in one statement
+        self._owner = uuid.uuid4().hex[:15]
+        self._renewed = time.monotonic()
+
+    def _claim(self):
+        return f"{self._owner}.{uuid.uuid4().hex[:24]}"
+
+    def add_batch(self, entries, statements=(), history=()):
+        """
+        Persist the messages of one request in a single transaction. `entries`
+        are (destination key, platform, payload bytes, event) tuples; see
+        RouteTable.fan_out(). `statements` are executed in the same
+        transaction. `history` are (event, event_history row) pairs: the rows
+        are inserted too, and each message keeps the id of its event's row.
+        Returns the DeliveryJobs to queue, in message order. Their webhook_url
+        is resolved by the delivery queue.
+        """
+        if not entries and not statements and not history:
+            return []
+        now = time.time()
+        claim = self._claim()
+        # An event going to several destinations is only serialized once
+        dumped = {}
+        rows = []
+        for token, platform, payload, event in entries:
+            if id(event) not in dumped:
+                dumped[id(event)] = dump_event(event)
+            rows.append({
+                "token": token,
+                "platform": platform,
+                "payload": payload,
+                "event": dumped[id(event)],
+                "attempts": 0,
+                "state": "inflight",
+                "next_attempt_at": now,
+                "lease_until": now + LEASE_SECONDS,
+                "owner": claim,
+                "created_at": now,
+            })
+
+        with self.app.app_context():
+            for statement in statements:
+                db.session.execute(statement)
+            history_ids = {}
+            if history:
+                inserted = db.session.execute(
+                    insert(EventRecord.__table__).returning(EventRecord.id, sort_by_parameter_order=True),
+                    [row for _, row in history],
+                ).scalars().all()
+                history_ids = {id(event): row_id for (event, _), row_id in zip(history, inserted)}
+                for row, (_, _, _, event) in zip(rows, entries):
+                    row["history_id"] = history_ids.get(id(event))
+            ids = []
+            if rows:
+                db.session.execute(insert(OutboxEvent), rows)
+                ids = db.session.execute(
+                    select(OutboxEvent.id).where(OutboxEvent.owner == claim).order_by(OutboxEvent.id)
+                ).scalars().all()
+            db.session.commit()
+
+        return [
+            DeliveryJob(row_id, token, platform, None, payload, 0, event, claim, history_ids.get(id(event)))
+            for row_id, (token, platform, payload, event) in zip(ids, entries)
+        ]
+
+    def release(self, jobs, delay=0.0):
+        """
+        Hand jobs that could not be queued, or were parked by an open
+        circuit, back to the retry scheduler, due in `delay` seconds. No
+        attempt is counted.
+        """
+        due = time.time() + delay
+        with self.app.app_context():
+            for claim, ids in _by_claim(jobs).items():
+                db.session.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_(ids), OutboxEvent.owner == claim)
+                    .values(state="pending", owner=None, lease_until=None, next_attempt_at=due)
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+
+    def renew_leases(self, force=False):
+        """
+        Extend the leases of the rows this process holds, queued or being
+        posted, every RENEW_SECONDS (or now with `force`).
+        """
+        if not force and time.monotonic() - self._renewed < RENEW_SECONDS:
+            return
+        self._renewed = time.monotonic()
+        with self.app.app_context():
+            db.session.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.state == "inflight", OutboxEvent.owner.startswith(f"{self._owner}."))
+                .values(lease_until=time.time() + LEASE_SECONDS)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+
+    def claim_due(self, limit):
+        """
+        Claim up to `limit` rows that are due for (re)delivery.
+        """
+        now = time.time()
+        claim = self._claim()
+        due = (
+            select(OutboxEvent.id)
+            .where(or_(
+                and_(OutboxEvent.state == "pending", OutboxEvent.next_attempt_at <= now),
+                and_(OutboxEvent.state == "inflight", OutboxEvent.lease_until < now),
+            ))
+            .order_by(OutboxEvent.next_attempt_at)
+            .limit(limit)
+        )
+
+        with self.app.app_context():
+            db.session.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(due))
+                .values(state="inflight", owner=claim, lease_until=now + LEASE_SECONDS)
+                .execution_options(synchronize_session=False)
+            )
+            rows = db.session.execute(
+                select(OutboxEvent).where(OutboxEvent.owner == claim).order_by(OutboxEvent.id)
+            ).scalars().all()
+            db.session.commit()
+
+            return [
+                DeliveryJob(row.id, row.token, row.platform, None, row.payload, row.attempts,
+                            json.loads(row.event) if row.event else None, claim, row.history_id)
+                for row in rows
+            ]
+
+    def delivered(self, job):
+        """
+        Record a successful delivery. Rows are removed in bulk by flush_acks().
+        """
+        DELIVERED.labels(job.platform).inc()
+        NOTIFICATIONS.labels(token_label(connection_token(job.token)), "delivered").inc()
+        if self.history is not None:
+            self.history.delivered(job)
+        with self._lock:
+            self._acked.append(job)
+
+    def flush_acks(self):
+        """
+        Delete the delivered rows still held under the claim they were posted
+        with.
+        """
+        with self._lock:
+            acked, self._acked = self._acked, []
+        if not acked:
+            return
+        with self.app.app_context():
+            for claim, ids in _by_claim(acked).items():
+                db.session.execute(
+                    delete(OutboxEvent)
+                    .where(OutboxEvent.id.in_(ids), OutboxEvent.owner == claim)
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+
+    def failed(self, job, error):
+        """
+        Reschedule a failed delivery, or dead-letter it if it cannot succeed.
+        """
+        attempts = job.attempts + 1
+        message = str(error)[:500]
+        DELIVERY_FAILURES.labels(job.platform).inc()
+
+        with self.app.app_context():
+            row = db.session.get(OutboxEvent, job.id)
+            if row is None or row.owner != job.claim:
+                # Delivered, or claimed again by another worker since
+                return
+
+            if is_retryable(error) and attempts < self.max_attempts:
+                delay = parse_retry_after(getattr(error, "response", None))
+                if delay is None:
+                    delay = retry_delay(job.attempts, self.backoff_base, self.backoff_max)
+                row.attempts = attempts
+                row.state = "pending"
+                row.owner = None
+                row.lease_until = None
+                row.next_attempt_at = time.time() + delay
+                row.last_error = message
+                RETRIES.labels(job.platform).inc()
+                logger.warning("Retrying %s delivery %s in %.1fs: %s", job.platform, job.id, delay, message,
+                               extra={"platform": job.platform, "delivery_id": job.id, "attempt": attempts})
+            else:
+                row.attempts = attempts
+                row.last_error = message
+                self._bury(row, message)
+                DEAD_LETTERS.labels(job.platform).inc()
+                NOTIFICATIONS.labels(token_label(connection_token(job.token)), "failed").inc()
+                if self.history is not None:
+                    self.history.failed(job)
+                logger.error("Dead-lettered %s delivery %s: %s", job.platform, job.id, message,
+                             extra={"platform": job.platform, "delivery_id": job.id, "attempt": attempts})
+            db.session.commit()
+
+    def _bury(self, row, reason):
+        db.session.add(DeadLetter(
+            token=row.token,
+            platform=row.platform,
+            payload=row.payload,
+            event=row.event,
+            attempts=row.attempts,
+            last_error=reason,
+            created_at=row.created_at,
+            failed_at=time.time(),
+            history_id=row.history_id,
+        ))
+        db.session.delete(row)
+
+    def dead_letters(self, limit=100):
+        with self.app.app_context():
+            rows = db.session.execute(
+                select(DeadLetter).order_by(DeadLetter.id.desc()).limit(limit)
+            ).scalars().all()
+            return [
+                {
+                    "id": row.id,
+                    "token": row.token,
+                    "platform": row.platform,
+                    "attempts": row.attempts,
+                    "last_error": row.last_error,
+                    "created_at": row.created_at,
+                    "failed_at": row.failed_at,
+                    "payload": row.payload.decode(),
+                }
+                for row in rows
+            ]
+
+    def replay(self, dead_letter_id):
+        """
+        Move a dead letter back into the outbox. Returns False if it does not exist.
+        """
+        with self.app.app_context():
+            row = db.session.get(DeadLetter, dead_letter_id)
+            if row is None:
+                return False
+            db.session.add(OutboxEvent(
+                token=row.token,
+                platform=row.platform,
+                payload=row.payload,
+                event=row.event,
+                attempts=0,
+                state="pending",
+                next_attempt_at=time.time(),
+                created_at=row.created_at,
+                history_id=row.history_id,
+            ))
+            db.session.delete(row)
+            db.session.commit()
+        return True
+
+
+def _by_claim(jobs):
+    """
+    {claim: [row id, ...]} of jobs.
+    """
+    claims = {}
+    for job in jobs:
+        claims.setdefault(job.claim, []).append(job.id)
+    return claims
+
+
+class RetryScheduler:
+    """
+    Background thread that flushes delivery acks, renews the leases of queued
+    rows, re-queues due outbox rows and updates the queue depth metric.
+
+    Retries only fill up to `share` of the delivery queue so a retry storm
+    never causes fresh telemetry to be rejected.
+    """
+
+    def __init__(self, outbox, queue, interval=1.0, share=0.5):
+        self.outbox = outbox
+        self.queue = queue
+        self.interval = interval
+        self.share = share
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-retry", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop re-queueing rows, after the pass in progress if any.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_once(self):
+        self.outbox.flush_acks()
+        self.outbox.renew_leases()
+        depth = self.queue.depth()
+        QUEUE_DEPTH.set(depth)
+        room = int(self.queue.max_depth * self.share) - depth
+        if room > 0:
+            jobs = self.outbox.claim_due(room)
+            if jobs and not self.queue.submit_many(jobs):
+                self.outbox.release(jobs)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception("Error in outbox retry scheduler: %s", e)
@@ -0,0 +1,165 @@
+"""
+Notification platforms: the services a webhook can post notifications to.
+
+A Platform bundles everything the notifier needs to know about a service: how
+to render an event (a message template, or a function), the digest format for
+a backlog, the headers to post with and its limits. The ingest endpoint
+/api/<name>/<token>, the setup API, the delivery rate limits and digests are
+all driven by the Platforms registry, so adding a service means registering a
+Platform (and a message template, if it renders from one).
+
+The registry resolves each platform's renderer once, so rendering through it
+costs one dict lookup per payload and a size check per event, about the same
+as calling the Renderer directly. Events whose message exceeds the platform's
+limits are split (see splitter.py).
+"""
+import json
+
+from digest import (build_digest, discord_digest, discord_fits, generic_digest, slack_digest, slack_fits,
+                    teams_digest, teams_fits)
+from splitter import Parts, count_changes, split_event
+from transport import JSON_HEADERS
+
+
+class Platform:
+    """
+    A service notifications can be posted to.
+
+    - `name` is used in URLs (/api/<name>/<token>) and stored with webhooks.
+    - `label` is the human-readable name.
+    - `render(events)` returns the JSON bodies (bytes) of events; without it
+      they are rendered with the message template named `name`.
+    - `digest(events)` renders one message summarising several events, and
+      `fits(message)` checks it against the service's structural limits.
+      Without a digest, queued events are posted one by one.
+    - `rate_limit` is the default messages per second per destination, 0 for
+      unlimited.
+    - `max_batch` is the most events summarised in one digest.
+    - `max_bytes` is the largest message body the service accepts.
+    - `max_changes` is the most detail.changes entries one message can list
+      (its blocks, fields, ... are limited), 0 for no limit.
+    - `headers` are sent with every post.
+    """
+
+    def __init__(self, name, label, render=None, digest=None, fits=None, rate_limit=1.0,
+                 max_batch=50, max_bytes=40000, max_changes=0, headers=JSON_HEADERS):
+        self.name = name
+        self.label = label
+        self.render = render
+        self.digest = digest
+        self.fits = fits
+        self.rate_limit = rate_limit
+        self.max_batch = max_batch
+        self.max_bytes = max_bytes
+        self.max_changes = max_changes
+        self.headers = headers
+
+
+def render_generic(events):
+    # Plain webhooks get each event in the format UltraDNS posts them
+    return [json.dumps({"telemetryEvents": [event]}).encode() for event in events]
+
+
+BUILTIN_PLATFORMS = [
+    # At most 50 blocks: header, two sections, the part note and a section per change
+    Platform("slack", "Slack", digest=slack_digest, fits=slack_fits, rate_limit=1.0, max_bytes=40000,
+             max_changes=45),
+    Platform("teams", "Teams", digest=teams_digest, fits=teams_fits, rate_limit=4.0, max_bytes=28000),
+    # Discord allows 5 webhook posts per 2 seconds, and 30 a minute per channel. An
+    # embed holds 25 fields (seven event fields, the part note and one per change)
+    # and 6000 characters.
+    Platform("discord", "Discord", digest=discord_digest, fits=discord_fits, rate_limit=0.5, max_bytes=6000,
+             max_changes=17),
+    Platform("generic", "Generic webhook", render=render_generic, digest=generic_digest, rate_limit=10.0,
+             max_batch=100, max_bytes=1000000,
+             headers={**JSON_HEADERS, "User-Agent": "udns-push-notifier"}),
+]
+
+
+def _too_large(platform, event, body):
+    """
+    Whether an event's message exceeds the platform's limits.
+    """
+    return len(body) > platform.max_bytes or 0 < platform.max_changes < count_changes(event)
+
+
+class Platforms:
+    """
+    Registry of the platforms in use, with their renderers resolved against
+    `renderer`. A message template for a platform takes precedence over its
+    render function, so MESSAGE_TEMPLATES can restyle any of them. An event
+    is split into at most `max_parts` messages.
+    """
+
+    def __init__(self, renderer, platforms=BUILTIN_PLATFORMS, max_parts=10):
+        self.renderer = renderer
+        self.max_parts = max_parts
+        self._platforms = {}
+        self._render = {}
+        for platform in platforms:
+            self.register(platform)
+
+    def register(self, platform):
+        if platform.name in self.renderer.platforms():
+            render = self.renderer.many(platform.name)
+        elif platform.render is not None:
+            render = platform.render
+        else:
+            raise ValueError(f"No message template for platform {platform.name!r}")
+        self._platforms[platform.name] = platform
+        self._render[platform.name] = render
+
+    def __contains__(self, name):
+        return name in self._platforms
+
+    def get(self, name):
+        return self._platforms[name]
+
+    def names(self):
+        return list(self._platforms)
+
+    def render_many(self, name, events):
+        """
+        Render events for a platform: one body (bytes) per event, or Parts
+        for an event whose message was too large.
+        """
+        render = self._render[name]
+        bodies = render(events)
+        platform = self._platforms[name]
+        for i, body in enumerate(bodies):
+            if _too_large(platform, events[i], body):
+                bodies[i] = split_event(events[i], render, platform.max_bytes, platform.max_changes,
+                                        self.max_parts) or body
+        return bodies
+
+    def render(self, name, event):
+        body = self.render_many(name, [event])[0]
+        return body[0] if isinstance(body, Parts) else body
+
+    def coalesce(self, name, events):
+        """
+        Render a digest of as many leading events as the platform allows in
+        one message. The digest stops short of an event that is split into
+        several messages, so that its changes are still posted in full.
+        Returns (body, count); count is 0 if the platform has no digest format.
+        """
+        platform = self._platforms.get(name)
+        if platform is None or platform.digest is None:
+            return None, 0
+        events = events[:platform.max_batch]
+        render = self._render[name]
+        for i, event in enumerate(events):
+            # Only events listing changes can be split
+            if count_changes(event) and _too_large(platform, event, render([event])[0]):
+                events = events[:i]
+                break
+        return build_digest(platform.digest, platform.fits, platform.max_bytes, events)
+
+    def rate_limits(self):
+        """
+        Default messages per second per destination, by platform.
+        """
+        return {name: platform.rate_limit for name, platform in self._platforms.items()}
+
+    def headers(self):
+        return {name: platform.headers for name, platform in self._platforms.items()}
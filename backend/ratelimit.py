@@ -0,0 +1,149 @@
+"""
+Token-bucket rate limiting for outbound webhook destinations.
+
+The rate limits hold per destination for the whole service. Under gunicorn
+every worker process delivers on its own, so the app gives its queues
+SharedTokenBucket: the tokens of a destination are kept in SQLite and drawn
+by whichever process holds its backlog, at the full rate.
+"""
+import logging
+import time
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import RateBucket
+
+# A limiter that cannot read its bucket holds the destination back this long
+RETRY_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Allows `rate` sends per second with bursts of up to `burst` sends.
+
+    `clock` returns the current time in seconds and can be replaced with a
+    fake clock in tests.
+    """
+    shared = False
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self):
+        """
+        Consume a token if one is available.
+        Returns 0 on success, otherwise the number of seconds until one is.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        """
+        Stop handing out tokens for `seconds`, e.g. after a 429 with Retry-After.
+        """
+        now = self.clock()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = max(self.updated, self.paused_until)
+
+
+class SharedTokenBucket:
+    """
+    A TokenBucket of the destination `key` kept in the rate_bucket table, so
+    all worker processes draw from the same tokens.
+
+    take() is one short write transaction, two when no token is left;
+    pause() is one. A destination without a limit never touches the
+    database. `shared` tells the delivery queues to call them off their lock
+    (or event loop). Database errors are logged: take() then waits
+    RETRY_SECONDS, and a failed pause() is left out.
+    """
+    shared = True
+
+    def __init__(self, engine, key, rate, burst=1, clock=time.time):
+        self.engine = engine
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+
+    def take(self):
+        """
+        Consume a token if one is available.
+        Returns 0 on success, otherwise the number of seconds until one is.
+        """
+        if self.rate <= 0:
+            return 0.0
+        try:
+            return self._take(self.clock())
+        except SQLAlchemyError as e:
+            logger.warning("Could not take a rate limit token: %s", e, extra={"token": self.key})
+            return RETRY_SECONDS
+
+    def _take(self, now):
+        refilled = func.min(self.burst, RateBucket.tokens + func.max(0.0, now - RateBucket.updated) * self.rate)
+        with self.engine.begin() as connection:
+            taken = connection.execute(
+                update(RateBucket)
+                .where(RateBucket.key == self.key, RateBucket.paused_until <= now, refilled >= 1)
+                .values(tokens=refilled - 1, updated=func.max(RateBucket.updated, now))
+            ).rowcount
+            if taken:
+                return 0.0
+            row = connection.execute(
+                select(RateBucket.tokens, RateBucket.updated, RateBucket.paused_until)
+                .where(RateBucket.key == self.key)
+            ).first()
+            if row is None:
+                # The first send to the destination; the update holds the write lock
+                connection.execute(insert(RateBucket).values(
+                    key=self.key, tokens=self.burst - 1, updated=now, paused_until=0.0))
+                return 0.0
+        tokens, updated, paused_until = row
+        if now < paused_until:
+            return paused_until - now
+        tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+        return (1 - tokens) / self.rate
+
+    def pause(self, seconds):
+        """
+        Stop handing out tokens for `seconds`, in every process.
+        """
+        if self.rate <= 0:
+            return
+        until = self.clock() + seconds
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(
+                    sqlite_insert(RateBucket)
+                    .values(key=self.key, tokens=0.0, updated=until, paused_until=until)
+                    .on_conflict_do_update(index_elements=[RateBucket.key], set_={
+                        "tokens": 0.0,
+                        "paused_until": func.max(RateBucket.paused_until, until),
+                        "updated": func.max(RateBucket.updated, RateBucket.paused_until, until),
+                    })
+                )
+        except SQLAlchemyError as e:
+            logger.warning("Could not pause the rate limit: %s", e, extra={"token": self.key})
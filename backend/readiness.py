@@ -0,0 +1,89 @@
+"""
+Readiness of a worker process for traffic.
+
+A freshly started worker answers requests at once, but its first requests
+would pay for loading the status snapshot and the webhook connections and for
+importing the HTTP client. Readiness runs such warm-up steps in a background
+thread, and the readiness endpoint answers 503 until all of them succeeded,
+so a load balancer or orchestrator only sends telemetry to warm workers and
+keeps the old container serving during a deploy.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Named warm-up steps, run in the order they were added. A step that
+    raises is retried every `retry_interval` seconds. Steps can be added
+    after start().
+    """
+
+    def __init__(self, retry_interval=1.0, clock=time.monotonic):
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.started_at = clock()
+        self.ready_at = None
+        self._steps = []
+        self._state = {}  # name -> "pending", "ok" or the last error
+        self._lock = threading.Lock()
+        self._started = False
+        self._thread = None
+
+    def add(self, name, step):
+        with self._lock:
+            self._steps.append((name, step))
+            self._state[name] = "pending"
+            self.ready_at = None
+        if self._started:
+            self._wake()
+
+    def start(self):
+        self._started = True
+        self._wake()
+
+    def _wake(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+            self._thread.start()
+
+    def _next(self):
+        with self._lock:
+            for name, step in self._steps:
+                if self._state[name] != "ok":
+                    return name, step
+            if self.ready_at is None:
+                self.ready_at = self.clock()
+                logger.info("Ready after %.2fs", self.ready_at - self.started_at)
+            # Cleared under the lock, so add() starts a new thread for later steps
+            self._thread = None
+            return None, None
+
+    def _run(self):
+        while True:
+            name, step = self._next()
+            if step is None:
+                return
+            try:
+                step()
+            except Exception as e:
+                logger.warning("Warm-up step %s failed: %s", name, e)
+                with self._lock:
+                    self._state[name] = str(e) or type(e).__name__
+                time.sleep(self.retry_interval)
+                continue
+            with self._lock:
+                self._state[name] = "ok"
+
+    def status(self):
+        """
+        (ready, {step: state}).
+        """
+        with self._lock:
+            state = dict(self._state)
+        return all(value == "ok" for value in state.values()), state
@@ -0,0 +1,278 @@
+"""
+Template-driven rendering of UltraDNS events into chat messages.
+
+Templates are JSON documents describing the message. String values may contain
+`{placeholders}` that pull fields out of the event:
+
+    "{telemetryEvent.changeTime|telemetryEventTime|'Unknown Time'}"
+
+A placeholder is a `|`-separated list of dotted paths tried in order, ending in
+an optional quoted default. A list element of the form
+
+    {"$each": "telemetryEvent.detail.changes", "$items": [...]}
+
+repeats `$items` for every entry of the list at that path, with placeholders
+resolved against the entry.
+
+Each template is compiled once into a sequence of pre-encoded JSON fragments and
+field getters, so rendering an event is a single join with no intermediate dict.
+The output is byte-for-byte what json.dumps() produces for the equivalent dict.
+"""
+import json
+import os
+import re
+from json.encoder import encode_basestring_ascii
+
+PLACEHOLDER = re.compile(r"\{([^{}]+)\}")
+_MISSING = object()
+
+DEFAULT_TEMPLATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'message_templates.json')
+
+
+def _compile_path(path):
+    """
+    Compile a dotted path into a lookup returning _MISSING when absent.
+    The common one- and two-level paths get dedicated closures.
+    """
+    if len(path) == 1:
+        key = path[0]
+        return lambda source: source.get(key, _MISSING) if isinstance(source, dict) else _MISSING
+
+    if len(path) == 2:
+        outer, key = path
+
+        def lookup(source):
+            inner = source.get(outer, _MISSING) if isinstance(source, dict) else _MISSING
+            return inner.get(key, _MISSING) if isinstance(inner, dict) else _MISSING
+        return lookup
+
+    def lookup(source):
+        value = source
+        for key in path:
+            if not isinstance(value, dict):
+                return _MISSING
+            value = value.get(key, _MISSING)
+            if value is _MISSING:
+                return _MISSING
+        return value
+    return lookup
+
+
+def _compile_getter(expression):
+    """
+    Compile "a.b|c|'default'" into a function of the event.
+    Without a default, a missing field renders as an empty string.
+    """
+    default = ""
+    lookups = []
+    for option in expression.split("|"):
+        option = option.strip()
+        if len(option) >= 2 and option[0] == option[-1] and option[0] in "'\"":
+            default = option[1:-1]
+            break
+        lookups.append(_compile_path(option.split(".")))
+
+    if len(lookups) == 1:
+        lookup = lookups[0]
+
+        def getter(source):
+            value = lookup(source)
+            return default if value is _MISSING else value
+        return getter
+
+    def getter(source):
+        for lookup in lookups:
+            value = lookup(source)
+            if value is not _MISSING:
+                return value
+        return default
+    return getter
+
+
+def _json_field(getter):
+    def render(event):
+        value = getter(event)
+        return encode_basestring_ascii(value) if value.__class__ is str else json.dumps(value)
+    return render
+
+
+def _text_field(getter):
+    def render(event):
+        value = getter(event)
+        return encode_basestring_ascii(value if value.__class__ is str else str(value))[1:-1]
+    return render
+
+
+class _Compiler:
+    """
+    Flattens a template into a list of literal strings and callables.
+    Adjacent literals are merged so rendering touches as few parts as possible.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def literal(self, text):
+        if self.parts and isinstance(self.parts[-1], str):
+            self.parts[-1] += text
+        else:
+            self.parts.append(text)
+
+    def dynamic(self, func):
+        self.parts.append(func)
+
+    def node(self, value):
+        if isinstance(value, dict):
+            self.literal("{")
+            for i, (key, item) in enumerate(value.items()):
+                if i:
+                    self.literal(", ")
+                self.literal(encode_basestring_ascii(key) + ": ")
+                self.node(item)
+            self.literal("}")
+        elif isinstance(value, list):
+            if any(_is_each(item) for item in value):
+                self.dynamic(_compile_list(value))
+                return
+            self.literal("[")
+            for i, item in enumerate(value):
+                if i:
+                    self.literal(", ")
+                self.node(item)
+            self.literal("]")
+        elif isinstance(value, str):
+            self.string(value)
+        else:
+            self.literal(json.dumps(value))
+
+    def string(self, text):
+        matches = list(PLACEHOLDER.finditer(text))
+        if not matches:
+            self.literal(encode_basestring_ascii(text))
+            return
+
+        # A string that is a single placeholder keeps the field's JSON type
+        if len(matches) == 1 and matches[0].span() == (0, len(text)):
+            self.dynamic(_json_field(_compile_getter(matches[0].group(1))))
+            return
+
+        self.literal('"')
+        position = 0
+        for match in matches:
+            if match.start() > position:
+                self.literal(encode_basestring_ascii(text[position:match.start()])[1:-1])
+            self.dynamic(_text_field(_compile_getter(match.group(1))))
+            position = match.end()
+        if position < len(text):
+            self.literal(encode_basestring_ascii(text[position:])[1:-1])
+        self.literal('"')
+
+
+def _is_each(item):
+    return isinstance(item, dict) and "$each" in item
+
+
+def _compile_list(template):
+    """
+    Compile a list containing `$each` elements, whose length depends on the event.
+    """
+    elements = []
+    static = []
+    for item in template + [None]:
+        if item is not None and not _is_each(item):
+            static.append(item)
+            continue
+        if static:
+            # Consecutive fixed elements are compiled together, without brackets
+            compiler = _Compiler()
+            compiler.node(static)
+            compiler.parts[0] = compiler.parts[0][1:]
+            compiler.parts[-1] = compiler.parts[-1][:-1]
+            elements.append((None, _join_parts(compiler.parts)))
+            static = []
+        if item is not None:
+            getter = _compile_getter(item["$each"])
+            items = [compile_template(entry) for entry in item["$items"]]
+            elements.append((getter, items))
+
+    def render(event):
+        rendered = []
+        for getter, items in elements:
+            if getter is None:
+                rendered.append(items(event))
+                continue
+            entries = getter(event)
+            if entries:
+                rendered.extend(item(entry) for entry in entries for item in items)
+        return "[" + ", ".join(rendered) + "]"
+
+    return render
+
+
+def compile_template(template):
+    """
+    Compile a template into a function returning the JSON text for an event.
+    """
+    compiler = _Compiler()
+    compiler.node(template)
+    return _join_parts(compiler.parts)
+
+
+def _join_parts(parts):
+    if len(parts) == 1 and isinstance(parts[0], str):
+        text = parts[0]
+        return lambda event: text
+
+    # Render into a copy of the literal parts, filling in the dynamic slots
+    template = [part if isinstance(part, str) else "" for part in parts]
+    slots = [(i, part) for i, part in enumerate(parts) if not isinstance(part, str)]
+
+    def render(event):
+        out = template[:]
+        for i, part in slots:
+            out[i] = part(event)
+        return "".join(out)
+
+    return render
+
+
+class Renderer:
+    """
+    Compiled per-platform message templates.
+    """
+
+    def __init__(self, templates):
+        self._compiled = {platform: compile_template(template) for platform, template in templates.items()}
+
+    @classmethod
+    def from_files(cls, *paths):
+        """
+        Load templates from JSON files mapping platform to template.
+        Later files override individual platforms of earlier ones.
+        """
+        templates = {}
+        for path in paths:
+            if path:
+                with open(path) as f:
+                    templates.update(json.load(f))
+        return cls(templates)
+
+    def platforms(self):
+        return list(self._compiled)
+
+    def render(self, platform, event):
+        """
+        Render one event to the JSON body (bytes) to post.
+        """
+        return self._compiled[platform](event).encode()
+
+    def render_many(self, platform, events):
+        render = self._compiled[platform]
+        return [render(event).encode() for event in events]
+
+    def many(self, platform):
+        """
+        render_many() bound to the template of one platform.
+        """
+        render = self._compiled[platform]
+        return lambda events: [render(event).encode() for event in events]
@@ -0,0 +1,158 @@
+"""
+Fan-out of inbound telemetry to the destinations of a webhook connection.
+
+Every connection delivers to its own webhook_url and to any number of extra
+Routes, each with its own platform, URL and optional filters on the event
+type, object type, change type or account name. The routes of a connection are
+compiled into a RouteTable once and cached with the connection.
+"""
+from collections import namedtuple
+
+# Event fields a route can filter on
+FILTER_FIELDS = ('telemetryEventType', 'objectType', 'changeType', 'accountName')
+
+# Where a message is posted. `key` identifies the destination in the outbox
+# and the delivery queue: the connection token itself, or "<token>/<route id>".
+Destination = namedtuple('Destination', ['key', 'type', 'webhook_url'])
+
+
+def route_key(token, route_id):
+    return f"{token}/{route_id}"
+
+
+def connection_token(key):
+    """
+    The inbound token a destination key belongs to.
+    """
+    return key.partition("/")[0]
+
+
+def event_fields(event):
+    """
+    The values of FILTER_FIELDS in an UltraDNS event. Anything but a string
+    is treated as missing.
+    """
+    details = event.get("telemetryEvent")
+    if not isinstance(details, dict):
+        details = {}
+    values = (
+        event.get("telemetryEventType"),
+        details.get("objectType"),
+        details.get("changeType"),
+        event.get("accountName"),
+    )
+    return [value if isinstance(value, str) else None for value in values]
+
+
+def validate_filters(filters):
+    """
+    Normalize route filters to {field: [values]}.
+    Raises ValueError for unknown fields or values that are not strings.
+    """
+    if not filters:
+        return {}
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    normalized = {}
+    for field, values in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter on {field}; use one of {', '.join(FILTER_FIELDS)}")
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list) or not values or not all(isinstance(v, str) for v in values):
+            raise ValueError(f"Filter {field} must be a string or a list of strings")
+        normalized[field] = values
+    return normalized
+
+
+class RouteTable:
+    """
+    The destinations of one inbound token with their filters compiled into
+    per-field indexes.
+
+    Each destination is a bit. For every filter field, `_index[field][value]`
+    holds the bits of the destinations accepting that value and `_any[field]`
+    the bits of those not filtering on the field, so matching an event is one
+    dict lookup and AND per field however many routes there are.
+    """
+
+    def __init__(self, routes):
+        """
+        `routes` is a list of (Destination, filters) pairs; see validate_filters().
+        """
+        self.destinations = [destination for destination, _ in routes]
+        self._by_key = {destination.key: destination for destination in self.destinations}
+        self._index = [{} for _ in FILTER_FIELDS]
+        self._any = [0] * len(FILTER_FIELDS)
+        self._platforms = {}
+        self._selections = {}
+
+        for bit, (destination, filters) in enumerate(routes):
+            flag = 1 << bit
+            self._platforms[destination.type] = self._platforms.get(destination.type, 0) | flag
+            for position, field in enumerate(FILTER_FIELDS):
+                values = filters.get(field)
+                if not values:
+                    self._any[position] |= flag
+                    continue
+                index = self._index[position]
+                for value in values:
+                    index[value] = index.get(value, 0) | flag
+
+    def get(self, key):
+        return self._by_key.get(key)
+
+    def match(self, event):
+        """
+        Return the bit mask of the destinations whose filters accept the event.
+        """
+        mask = -1
+        for index, any_value, value in zip(self._index, self._any, event_fields(event)):
+            mask &= index.get(value, 0) | any_value if index else any_value
+            if not mask:
+                break
+        return mask
+
+    def select(self, mask):
+        """
+        The destinations in a mask, in route order.
+        """
+        selection = self._selections.get(mask)
+        if selection is None:
+            selection = []
+            rest = mask
+            while rest:
+                lowest = rest & -rest
+                selection.append(self.destinations[lowest.bit_length() - 1])
+                rest ^= lowest
+            self._selections[mask] = selection
+        return selection
+
+    def fan_out(self, events, render_many):
+        """
+        Match events against the routes and render each event once per
+        platform it goes to with `render_many(platform, events)`.
+        Returns (destination key, platform, payload, event) entries in event
+        order, one per matching destination, or one per part if the event was
+        split into several messages (see splitter.py).
+        """
+        masks = [self.match(event) for event in events]
+
+        payloads = {}
+        for platform, platform_mask in self._platforms.items():
+            positions = [i for i, mask in enumerate(masks) if mask & platform_mask]
+            if positions:
+                rendered = render_many(platform, [events[i] for i in positions])
+                payloads[platform] = dict(zip(positions, rendered))
+
+        return [
+            (destination.key, destination.type, payload, event)
+            for i, (event, mask) in enumerate(zip(events, masks))
+            for destination in self.select(mask)
+            for payload in _messages(payloads[destination.type][i])
+        ]
+
+
+def _messages(payload):
+    # A split event renders to a tuple of messages, any other to one body
+    return (payload,) if type(payload) is bytes else payload
@@ -0,0 +1,83 @@
+"""
+Graceful shutdown of a worker process.
+
+A redeploy (`docker compose up -d`) stops the running container with SIGTERM.
+Every queued notification is already in the outbox, but one whose worker dies
+stays claimed until its lease runs out (outbox.LEASE_SECONDS), and delivered
+notifications whose acks were not flushed yet would be posted again. So from
+SIGTERM on a worker:
+
+1. answers telemetry with 503 and Retry-After, so UltraDNS sends it again to
+   the next process, and reports itself not ready;
+2. keeps posting what its delivery queue holds, until SHUTDOWN_TIMEOUT
+   seconds after the signal;
+3. hands the notifications still queued back to the outbox, due at once, and
+   writes the buffered acks and event history to the data volume.
+
+The next worker to start queues the handed-back notifications before it
+serves requests (see app.py).
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Shutdown:
+    """
+    Named shutdown steps, run in the order they were added. Each step is
+    called with the seconds left until the deadline, `timeout` seconds after
+    begin(), and should not take longer; one that raises is logged and
+    skipped.
+    """
+
+    def __init__(self, timeout=20.0, clock=time.monotonic):
+        self.timeout = timeout
+        self.clock = clock
+        self.deadline = None
+        self._steps = []
+        self._draining = threading.Event()
+        self._lock = threading.Lock()
+        self._done = False
+
+    @property
+    def draining(self):
+        return self._draining.is_set()
+
+    def remaining(self):
+        """
+        Seconds left until the deadline; the full timeout before begin().
+        """
+        if self.deadline is None:
+            return self.timeout
+        return max(0.0, self.deadline - self.clock())
+
+    def add(self, name, step):
+        self._steps.append((name, step))
+
+    def begin(self):
+        """
+        Stop taking new work. Safe to call from a signal handler.
+        """
+        if not self._draining.is_set():
+            self.deadline = self.clock() + self.timeout
+            self._draining.set()
+
+    def run(self):
+        """
+        Begin, if not done yet, and run the steps. Only the first call does
+        anything.
+        """
+        self.begin()
+        with self._lock:
+            if self._done:
+                return
+            self._done = True
+            started = self.clock()
+            for name, step in self._steps:
+                try:
+                    step(self.remaining())
+                except Exception as e:
+                    logger.exception("Shutdown step %s failed: %s", name, e)
+            logger.info("Shut down in %.2fs", self.clock() - started)
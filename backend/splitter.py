@@ -0,0 +1,83 @@
+"""
+Splitting of messages that are too large for their platform.
+
+A bulk change (a zone import, a large RRset or pool update) lists every
+changed value in telemetryEvent.detail.changes, and its message can exceed
+what the chat service accepts, in bytes or in blocks, fields or facts. Such an
+event is posted as several messages, each with a slice of the changes and a
+note such as "2 of 5, changes 46-90 of 212". At most `max_parts` messages are
+sent per event; the last one says how many changes were left out.
+"""
+from ingest import OMITTED_KEY
+
+# Event key holding the part note, rendered by the message templates
+PART_KEY = "_part"
+
+
+class Parts(tuple):
+    """
+    The messages (bytes) of an event that was split.
+    """
+
+
+def get_changes(event):
+    """
+    The detail.changes list of an event, or None.
+    """
+    details = event.get("telemetryEvent")
+    detail = details.get("detail") if isinstance(details, dict) else None
+    changes = detail.get("changes") if isinstance(detail, dict) else None
+    return changes if isinstance(changes, list) else None
+
+
+def count_changes(event):
+    changes = get_changes(event)
+    return len(changes) if changes is not None else 0
+
+
+def _part_event(event, changes, note):
+    details = event["telemetryEvent"]
+    return {
+        **event,
+        "telemetryEvent": {**details, "detail": {**details["detail"], "changes": changes}},
+        PART_KEY: [{"note": note}],
+    }
+
+
+def _note(index, count, first, last, total, omitted):
+    note = f"changes {first}-{last} of {total}"
+    if count > 1:
+        note = f"{index} of {count}, {note}"
+    if omitted:
+        note = f"{note}; {omitted} more not shown"
+    return note
+
+
+def split_event(event, render_many, max_bytes, max_changes=0, max_parts=10):
+    """
+    Render an event whose message is too large as several messages of at
+    most `max_changes` changes (0 for no limit) and `max_bytes` each, with
+    `render_many(events)` of the platform. If not even a single change fits,
+    a summary without them is rendered instead.
+    Returns Parts, or None if the event has no changes to split.
+    """
+    changes = get_changes(event)
+    if not changes:
+        return None
+    omitted = event["telemetryEvent"]["detail"].get(OMITTED_KEY)
+    total = len(changes) + (omitted if isinstance(omitted, int) else 0)
+    size = min(max_changes, len(changes)) if max_changes > 0 else len(changes)
+    while size >= 1:
+        chunks = [changes[start:start + size] for start in range(0, min(len(changes), size * max_parts), size)]
+        omitted = total - sum(len(chunk) for chunk in chunks)
+        parts = []
+        for index, chunk in enumerate(chunks):
+            first = index * size + 1
+            last_omitted = omitted if index == len(chunks) - 1 else 0
+            parts.append(_part_event(event, chunk, _note(index + 1, len(chunks), first, first + len(chunk) - 1,
+                                                          total, last_omitted)))
+        bodies = render_many(parts)
+        if all(len(body) <= max_bytes for body in bodies):
+            return Parts(bodies)
+        size //= 2
+    return Parts(render_many([_part_event(event, [], f"{total} changes not shown, too large for one message")]))
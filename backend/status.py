@@ -0,0 +1,178 @@
+"""
+In-memory snapshot of the setup and webhook state behind /api/status and the
+dashboard's status stream.
+
+The snapshot is loaded from SQLite once and then updated in place by the
+handlers that change it (login, setup, verification, deletion), so status
+requests and idle dashboards do not query the database. Changes made by other
+worker processes are announced through a marker file on the data volume: every
+change rewrites it, and a process reloads its snapshot when the file is no
+longer the one it last saw. Route changes rewrite it too, so that the other
+processes also drop their cached webhook connections (see cache.py).
+"""
+import logging
+import os
+import threading
+import uuid
+
+from sqlalchemy import select
+
+from models import db, Setting, User, WebhookConnection
+
+logger = logging.getLogger(__name__)
+
+
+def _file_id(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class StatusBoard:
+    """
+    The admin, setup and webhook state, plus a version that changes with it.
+    Safe to use from any thread. Without a `path`, changes are only seen by
+    this process.
+    """
+
+    def __init__(self, app, path=None):
+        self.app = app
+        self.path = path
+        self.version = 0
+        self._state = None
+        self._seen = None  # _file_id() of the marker the snapshot reflects
+        self._changed = threading.Condition()
+        self._reload_lock = threading.Lock()
+
+    def _load(self):
+        with self.app.app_context():
+            admin = db.session.execute(select(User.id).filter_by(username='admin').limit(1)).first()
+            setting = db.session.get(Setting, 'setup_complete')
+            connections = db.session.execute(select(WebhookConnection).order_by(WebhookConnection.id)).scalars()
+            return {
+                "has_admin_password": admin is not None,
+                "setup_complete": setting is not None and setting.value == 'true',
+                "webhooks": {
+                    connection.token: {
+                        "type": connection.type,
+                        "status": connection.status,
+                        "webhook_url": connection.webhook_url,
+                        "token": connection.token,
+                    }
+                    for connection in connections
+                },
+            }
+
+    def _sync(self):
+        """
+        Load the snapshot on first use, and again after another process
+        changed the marker file. Costs one stat() otherwise.
+        """
+        marker = _file_id(self.path) if self.path else None
+        if self._state is not None and marker == self._seen:
+            return
+        with self._reload_lock:
+            marker = _file_id(self.path) if self.path else None
+            if self._state is not None and marker == self._seen:
+                return
+            state = self._load()
+            with self._changed:
+                self._seen = marker
+                if state != self._state:
+                    self._state = state
+                    self.version += 1
+                    self._changed.notify_all()
+
+    def _publish(self):
+        """
+        Announce a change to the other processes. This process reloads once
+        too, which also picks up changes it raced with.
+        """
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(uuid.uuid4().hex)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error("Error writing status marker: %s", e)
+
+    def marker(self):
+        """
+        Identity of the marker file, which changes with every change made by
+        any process. None without a `path`.
+        """
+        return _file_id(self.path) if self.path else None
+
+    def touch(self):
+        """
+        Announce a change outside the snapshot, such as a webhook's routes.
+        """
+        self._publish()
+
+    def _change(self, apply):
+        self._sync()
+        with self._changed:
+            apply(self._state)
+            self.version += 1
+            self._changed.notify_all()
+        self._publish()
+
+    def snapshot(self):
+        """
+        (version, state) with the webhooks as a list in creation order.
+        """
+        self._sync()
+        with self._changed:
+            state = dict(self._state, webhooks=[dict(webhook) for webhook in self._state["webhooks"].values()])
+            return self.version, state
+
+    def get(self, field):
+        self._sync()
+        return self._state[field]
+
+    def wait(self, version, timeout):
+        """
+        Block until the version differs from `version` or `timeout` seconds
+        pass, watching for changes of other processes meanwhile. Returns the
+        current version.
+        """
+        remaining = timeout
+        while True:
+            self._sync()
+            with self._changed:
+                if self.version != version or remaining <= 0:
+                    return self.version
+                step = min(remaining, 0.5)
+                self._changed.wait(step)
+                remaining -= step
+
+    def update(self, **fields):
+        """
+        Set has_admin_password and/or setup_complete after committing them.
+        """
+        self._change(lambda state: state.update(fields))
+
+    def put_webhook(self, token, **fields):
+        """
+        Add a committed webhook connection, or update some of its fields.
+        """
+        def apply(state):
+            state["webhooks"].setdefault(token, {}).update(fields, token=token)
+        self._change(apply)
+
+    def verified(self, token):
+        """
+        Test telemetry verified a connection and completed the setup.
+        """
+        def apply(state):
+            state["setup_complete"] = True
+            if token in state["webhooks"]:
+                state["webhooks"][token]["status"] = "verified"
+        self._change(apply)
+
+    def remove_webhook(self, token):
+        self._change(lambda state: state["webhooks"].pop(token, None))
@@ -0,0 +1,72 @@
+"""
+Shared fixtures. The app reads its settings from the environment when it is
+first imported, so the environment is set up here, for a temporary data
+directory, before any test imports it.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.update(
+    DATA_DIR=tempfile.mkdtemp(prefix="notifier-tests-"),
+    LOG_LEVEL="WARNING",
+    DELIVERY_QUEUE_SIZE="100000",
+    STATUS_STREAM_INTERVAL="0.1",
+)
+
+from helpers import StubReceiver
+
+
+@pytest.fixture(scope="session")
+def backend():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    A bare Flask app on a new database, for the outbox or history on their own.
+    """
+    from flask import Flask
+    from models import db
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'notifier.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture(scope="session")
+def stub():
+    receiver = StubReceiver().start()
+    yield receiver
+    receiver.stop()
+
+
+@pytest.fixture
+def connection(backend, stub):
+    """
+    connection(platform) adds a verified webhook posting to the stub, or to
+    `webhook_url`, and returns its token.
+    """
+    def add(platform, webhook_url=None):
+        token = str(uuid.uuid4())
+        with backend.app.app_context():
+            backend.db.session.add(backend.WebhookConnection(
+                type=platform, token=token, webhook_url=webhook_url or stub.url, status="verified"))
+            backend.db.session.commit()
+        return token
+    return add
@@ -0,0 +1,93 @@
+"""
+Payloads and a local webhook receiver shared by the tests.
+"""
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_payload(events):
+    """
+    A telemetryEvents payload of `events` zone changes, each with a new id.
+    """
+    return {
+        "telemetryEvents": [
+            {
+                "accountName": "tests",
+                "telemetryEventId": str(uuid.uuid4()),
+                "telemetryEventType": "ZONE_CHANGE",
+                "telemetryEventTime": "2025-01-21 10:00:00.000",
+                "telemetryEvent": {
+                    "objectType": "Zone",
+                    "changeType": "UPDATE",
+                    "changeTime": "2025-01-21 10:00:00.000",
+                    "object": f"example{i}.com.",
+                    "user": "tests",
+                    "application": "Portal",
+                },
+            }
+            for i in range(events)
+        ]
+    }
+
+
+class StubReceiver:
+    """
+    Webhook endpoint on a local port that records the bodies posted to it.
+    After fail() it answers every post with the given status, without
+    recording it, until recover().
+    """
+
+    def __init__(self):
+        self.bodies = []
+        self.failing = None
+        self.failed = 0
+        self._lock = threading.Lock()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status = receiver.failing
+                with receiver._lock:
+                    if status is None:
+                        receiver.bodies.append(body)
+                    else:
+                        receiver.failed += 1
+                self.send_response(status or 200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/webhook"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fail(self, status=503):
+        self.failing = status
+
+    def recover(self):
+        self.failing = None
+
+    def wait_for(self, count, timeout=5):
+        """
+        Wait until `count` bodies were received; returns whether they were.
+        """
+        deadline = time.monotonic() + timeout
+        while len(self.bodies) < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return len(self.bodies) >= count
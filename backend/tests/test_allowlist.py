@@ -0,0 +1,89 @@
+"""
+IP allowlist: CIDR ranges match up to their edges for IPv4 and IPv6, and
+X-Forwarded-For only counts for hops added by trusted proxies.
+"""
+import os
+
+import pytest
+
+from allowlist import IpFilter, NetworkSet, parse_address, parse_entries
+
+UPSTREAM = "10.0.0.5"  # the reverse proxy, trusted by default
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize("address, allowed", [
+    ("192.0.2.0", True), ("192.0.2.255", True), ("192.0.1.255", False), ("192.0.3.0", False),
+    ("198.51.100.7", True), ("198.51.100.8", False),
+    ("2001:db8::", True), ("2001:db8:0:ffff:ffff:ffff:ffff:ffff", True), ("2001:db8:1::", False),
+    ("::ffff:192.0.2.10", True),  # IPv4-mapped
+    ("not an address", False), ("", False),
+])
+def test_cidr_edges(address, allowed):
+    ip_filter = IpFilter(["192.0.2.0/24", "198.51.100.7", "2001:db8::/48"])
+    assert ip_filter.allows(address) is allowed
+
+
+def test_overlapping_and_adjacent_ranges_are_merged():
+    networks = NetworkSet(parse_entries(["10.0.0.0/25", "10.0.0.128/25", "10.0.0.64/26", "10.1.0.0/16"]))
+    assert len(networks) == 2
+    assert parse_address("10.0.0.200") in networks
+    assert parse_address("10.0.1.0") not in networks
+
+
+def test_entries_skip_comments_and_reject_garbage():
+    assert [str(n) for n in parse_entries(["# UltraDNS", "", "192.0.2.1  # probe", "::ffff:192.0.2.0/120"])] == [
+        "192.0.2.1/32", "192.0.2.0/24"]
+    with pytest.raises(ValueError):
+        parse_entries(["192.0.2.300"])
+
+
+def test_forwarded_for_from_an_untrusted_peer_is_ignored():
+    ip_filter = IpFilter(["192.0.2.1"])
+    # A client cannot claim an allowed address
+    assert not ip_filter.allows("203.0.113.9", "192.0.2.1")
+    assert ip_filter.client_ip("203.0.113.9", "192.0.2.1") == "203.0.113.9"
+
+
+def test_forwarded_for_through_trusted_proxies():
+    ip_filter = IpFilter(["192.0.2.1"])
+    assert ip_filter.allows(UPSTREAM, "192.0.2.1")
+    # The rightmost hop not added by a trusted proxy is the client
+    assert ip_filter.client_ip(UPSTREAM, "192.0.2.1, 172.16.0.2, 10.0.0.9") == "192.0.2.1"
+    # What the client put in front of it is not believed
+    assert not ip_filter.allows(UPSTREAM, "192.0.2.1, 203.0.113.9")
+    assert ip_filter.client_ip(UPSTREAM, "192.0.2.1, 203.0.113.9, 10.0.0.9") == "203.0.113.9"
+
+
+def test_ipv6_proxies_and_clients():
+    ip_filter = IpFilter(["2001:db8::/32"], trusted_proxies=["fd00::/8"])
+    assert ip_filter.allows("fd00::1", "2001:db8::7, fd00::2")
+    assert not ip_filter.allows("fd00::1", "2001:db9::7")
+    assert not ip_filter.allows("2001:db9::1", "2001:db8::7")  # not a trusted proxy
+
+
+def test_allowlist_file_is_reloaded_when_it_changes(tmp_path):
+    path = tmp_path / "allowed_ips"
+    path.write_text("192.0.2.1\n")
+    clock = Clock()
+    ip_filter = IpFilter(path=str(path), reload_interval=5, clock=clock)
+    assert ip_filter.allows("192.0.2.1")
+
+    path.write_text("192.0.2.2\n")
+    os.utime(path, ns=(0, 10 ** 18))
+    assert ip_filter.allows("192.0.2.1")  # not checked again yet
+    clock.now = 5
+    assert ip_filter.allows("192.0.2.2") and not ip_filter.allows("192.0.2.1")
+
+    # A broken file keeps the previous list
+    path.write_text("not an address\n")
+    os.utime(path, ns=(0, 2 * 10 ** 18))
+    clock.now = 10
+    assert ip_filter.allows("192.0.2.2")
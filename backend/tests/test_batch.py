@@ -0,0 +1,80 @@
+"""
+Batch ingest: every event of a telemetryEvents array is validated, written
+in one transaction and summarized per event.
+"""
+import time
+
+import pytest
+
+from helpers import StubReceiver, make_payload
+
+
+@pytest.mark.parametrize("size", [1, 100, 10000])
+def test_payload_sizes(client, connection, size):
+    token = connection("slack")
+    response = client.post(f"/api/slack/{token}", json=make_payload(size))
+    assert response.status_code == 202
+    assert response.json == {"accepted": size, "rejected": 0, "duplicates": 0, "messages": size, "errors": []}
+
+
+def test_teams_notifies_every_event(client, connection):
+    # Teams used to return after the first regular event of a payload
+    receiver = StubReceiver().start()
+    try:
+        token = connection("teams", receiver.url)
+        response = client.post(f"/api/teams/{token}", json=make_payload(3))
+        assert response.status_code == 202
+        assert response.json["accepted"] == 3
+        assert response.json["messages"] == 3
+
+        # Posted one by one or, behind the rate limit, in a digest
+        deadline = time.monotonic() + 5
+        posted = ""
+        while time.monotonic() < deadline and not all(f"example{i}.com." in posted for i in range(3)):
+            time.sleep(0.01)
+            posted = b"".join(receiver.bodies).decode()
+        assert all(f"example{i}.com." in posted for i in range(3))
+    finally:
+        receiver.stop()
+
+
+def test_summary_reports_each_event(client, connection):
+    token = connection("slack")
+    payload = make_payload(3)
+    events = payload["telemetryEvents"]
+    events.insert(1, "not an event")
+    events.append({"telemetryEvent": {}})
+
+    response = client.post(f"/api/slack/{token}", json=payload)
+    assert response.status_code == 202
+    assert response.json == {
+        "accepted": 3,
+        "rejected": 2,
+        "duplicates": 0,
+        "messages": 3,
+        "errors": [{"index": 1, "error": "Event is not an object"},
+                   {"index": 4, "error": "Missing telemetryEventType"}],
+    }
+
+    # UltraDNS posting the payload again
+    response = client.post(f"/api/slack/{token}", json=payload)
+    assert response.status_code == 202
+    assert response.json["accepted"] == 0
+    assert response.json["duplicates"] == 3
+    assert response.json["rejected"] == 2
+
+
+def test_only_invalid_events(client, connection):
+    token = connection("teams")
+    response = client.post(f"/api/teams/{token}", json={"telemetryEvents": [{"telemetryEventType": 1}, []]})
+    assert response.status_code == 400
+    assert response.json["error"] == "No supported telemetry events found"
+    assert response.json["accepted"] == 0
+    assert [error["index"] for error in response.json["errors"]] == [0, 1]
+
+
+@pytest.mark.parametrize("body", [b"{}", b"[]", b"not json", b'{"telemetryEvents": {}}'])
+def test_malformed_payload(client, connection, body):
+    token = connection("slack")
+    response = client.post(f"/api/slack/{token}", data=body, content_type="application/json")
+    assert response.status_code == 400
@@ -0,0 +1,214 @@
+"""
+Circuit breakers: a destination that keeps failing is parked in the outbox
+instead of tying up delivery workers, probed after a cooldown and resumed
+once a probe succeeds.
+"""
+import time
+
+import pytest
+import requests
+
+from breaker import CLOSED, HALF_OPEN, OPEN, Breakers, CircuitBreaker
+from delivery import ConnectionRemoved, DeliveryJob, DeliveryQueue, is_destination_failure
+from helpers import StubReceiver
+from transport import HttpTransport
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def test_opens_after_threshold_failures():
+    breaker = CircuitBreaker("token", threshold=3, clock=Clock())
+    for _ in range(2):
+        breaker.failure()
+        assert breaker.state == CLOSED and breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() == 30.0
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("token", threshold=3, clock=Clock())
+    breaker.failure()
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_closes_on_success():
+    clock = Clock()
+    breaker = CircuitBreaker("token", threshold=1, cooldown=10, clock=clock)
+    breaker.failure()
+    clock.now = 9.9
+    assert not breaker.allow()
+    clock.now = 10
+    assert breaker.allow()  # the probe
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # only one at a time
+    breaker.success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_doubles_the_cooldown_up_to_the_maximum():
+    clock = Clock()
+    breaker = CircuitBreaker("token", threshold=1, cooldown=10, max_cooldown=25, clock=clock)
+    breaker.failure()
+    for cooldown in (20, 25, 25):
+        clock.now = breaker.open_until
+        assert breaker.allow()
+        breaker.failure()
+        assert breaker.state == OPEN
+        assert breaker.open_until == clock.now + cooldown
+
+
+def test_failures_in_flight_do_not_extend_an_open_circuit():
+    clock = Clock()
+    breaker = CircuitBreaker("token", threshold=2, cooldown=10, clock=clock)
+    breaker.failure()
+    breaker.failure()
+    clock.now = 5
+    breaker.failure()
+    assert breaker.open_until == 10
+
+
+def test_neutral_outcome_lets_another_probe_through():
+    clock = Clock()
+    breaker = CircuitBreaker("token", threshold=1, cooldown=10, clock=clock)
+    breaker.failure()
+    clock.now = 10
+    assert breaker.allow()
+    breaker.neutral()  # e.g. throttled: says nothing about the destination
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_registry_creates_one_breaker_per_destination():
+    breakers = Breakers(threshold=2)
+    assert breakers.get("token") is breakers.get("token")
+    assert breakers.get("token") is not breakers.get("token/1")
+    assert Breakers(threshold=0).get("token") is None
+
+
+@pytest.mark.parametrize("error", [
+    http_error(429), http_error(429, {"Retry-After": "5"}),
+    http_error(400), http_error(413), http_error(422),
+    ConnectionRemoved("Webhook connection was removed"),
+])
+def test_ignored_errors(error):
+    assert not is_destination_failure(error)
+
+
+@pytest.mark.parametrize("error", [
+    http_error(404), http_error(410), http_error(500), http_error(503),
+    requests.ConnectionError("refused"), requests.Timeout("read timeout"),
+])
+def test_destination_failures(error):
+    assert is_destination_failure(error)
+
+
+class Destination:
+    def __init__(self, webhook_url):
+        self.webhook_url = webhook_url
+
+
+class Outbox:
+    """
+    Records what the delivery queue reports instead of storing it.
+    """
+
+    def __init__(self):
+        self.delivered_ids = []
+        self.failed_ids = []
+        self.parked = []
+
+    def delivered(self, job):
+        self.delivered_ids.append(job.id)
+
+    def failed(self, job, error):
+        self.failed_ids.append(job.id)
+
+    def release(self, jobs, delay=0.0):
+        self.parked.append(([job.id for job in jobs], delay))
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def job(n):
+    return DeliveryJob(n, "token", "generic", None, b"{}", 0, None)
+
+
+@pytest.fixture
+def receiver():
+    receiver = StubReceiver().start()
+    yield receiver
+    receiver.stop()
+
+
+def test_queue_parks_a_failing_destination_until_a_probe_succeeds(receiver):
+    outbox = Outbox()
+    breakers = Breakers(threshold=3, cooldown=0.3)
+    transport = HttpTransport()
+    queue = DeliveryQueue(transport.send, workers=2, outbox=outbox, resolve=lambda key: Destination(receiver.url),
+                          breakers=breakers)
+    breaker = breakers.get("token")
+    try:
+        receiver.fail(503)
+        assert queue.submit_many([job(n) for n in range(3)])
+        assert wait_until(lambda: len(outbox.failed_ids) == 3)
+        assert breaker.state == OPEN
+
+        # Held back without a post or a failed attempt, due when the probe is
+        assert queue.submit_many([job(n) for n in range(3, 6)])
+        assert wait_until(lambda: sum(len(ids) for ids, _ in outbox.parked) == 3)
+        assert receiver.failed == 3
+        assert sorted(outbox.failed_ids) == [0, 1, 2]
+        assert all(0 < delay <= 0.3 for _, delay in outbox.parked)
+
+        receiver.recover()
+        time.sleep(0.3)
+        assert queue.submit_many([job(6)])
+        assert wait_until(lambda: outbox.delivered_ids == [6])
+        assert breaker.state == CLOSED
+
+        assert queue.submit_many([job(n) for n in range(7, 10)])
+        assert wait_until(lambda: len(outbox.delivered_ids) == 4)
+        assert len(receiver.bodies) == 4
+    finally:
+        transport.close()
+
+
+def test_throttling_does_not_open_the_circuit(receiver):
+    outbox = Outbox()
+    breakers = Breakers(threshold=2)
+    transport = HttpTransport()
+    queue = DeliveryQueue(transport.send, workers=1, outbox=outbox, resolve=lambda key: Destination(receiver.url),
+                          breakers=breakers)
+    try:
+        receiver.fail(429)
+        assert queue.submit_many([job(n) for n in range(3)])
+        assert wait_until(lambda: len(outbox.failed_ids) == 3)
+        assert breakers.get("token").state == CLOSED
+        assert outbox.parked == []
+    finally:
+        transport.close()
@@ -0,0 +1,83 @@
+"""
+Webhook connections are cached per process; a change made through the API in
+one worker process must be seen by the others at once, not after the TTL.
+"""
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from cache import MISSING, ConnectionCache
+from conftest import BACKEND_DIR
+
+# Another worker process: imports the app and answers lookups on stdin
+WORKER = textwrap.dedent(f"""
+    import sys
+    sys.path.insert(0, {BACKEND_DIR!r})
+    import app
+    for line in sys.stdin:
+        connection = app.connection_cache.get(line.strip())
+        print("lookup", "missing" if connection is None else len(connection.routes.destinations), flush=True)
+""")
+
+
+@pytest.fixture
+def worker(backend):
+    process = subprocess.Popen([sys.executable, "-c", WORKER], cwd=BACKEND_DIR, text=True,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def lookup(token):
+        process.stdin.write(token + "\n")
+        process.stdin.flush()
+        for line in process.stdout:
+            if line.startswith("lookup "):
+                return line.split()[1]
+        raise AssertionError("worker process exited")
+    yield lookup
+    process.stdin.close()
+    process.kill()
+    process.wait()
+
+
+def test_generation_change_drops_the_cache():
+    loads = []
+    generation = [1]
+    cache = ConnectionCache(lambda token: loads.append(token) or token, generation=lambda: generation[0])
+    cache.get("a")
+    cache.get("a")
+    assert loads == ["a"]
+    generation[0] = 2
+    cache.get("a")
+    assert loads == ["a", "a"]
+
+
+def test_no_store_when_generation_moves_during_load():
+    generation = [1]
+
+    def load(token):
+        generation[0] += 1  # another process changed a connection meanwhile
+        return token
+    cache = ConnectionCache(load, generation=lambda: generation[0])
+    cache.get("a")
+    assert cache.peek("a") is MISSING
+
+
+def test_deleted_webhook_is_dropped_by_other_processes(backend, client, connection, worker):
+    token = connection("slack")
+    assert worker(token) == "1"  # now cached by the other process
+
+    headers = {"X-Api-Token": backend.INTERNAL_API_TOKEN}
+    assert client.delete(f"/api/webhooks/{token}", headers=headers).status_code == 200
+    assert worker(token) == "missing"
+
+
+def test_new_route_is_seen_by_other_processes(backend, client, connection, stub, worker):
+    token = connection("slack")
+    assert worker(token) == "1"
+
+    headers = {"X-Api-Token": backend.INTERNAL_API_TOKEN}
+    response = client.post(f"/api/webhooks/{token}/routes", headers=headers,
+                           json={"platform": "teams", "webhook_url": stub.url})
+    assert response.status_code == 201
+    assert worker(token) == "2"
@@ -0,0 +1,117 @@
+"""
+Deduplication by telemetryEventId: repeats are dropped whether they come in
+the same payload, a later one, or after the process that accepted them was
+restarted (or from another worker process).
+"""
+import time
+
+import pytest
+
+from dedup import DedupIndex, event_key
+from helpers import make_payload
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def events(*ids):
+    return [{"telemetryEventId": event_id} for event_id in ids]
+
+
+def test_repeats_in_the_same_list():
+    fresh, keys, repeats = DedupIndex().split("token", events("a", "b", "a"))
+    assert fresh == events("a", "b")
+    assert keys == ["token:a", "token:b"]
+    assert repeats == 1
+
+
+def test_events_without_an_id_are_always_new():
+    index = DedupIndex()
+    fresh, keys, _ = index.split("token", [{}, {"telemetryEventId": ""}, {}])
+    assert len(fresh) == 3 and keys == [None, None, None]
+    index.remember(keys)
+    assert index.split("token", [{}])[2] == 0
+
+
+def test_remembered_keys_expire_and_are_capped():
+    clock = Clock()
+    index = DedupIndex(max_size=2, window=60, clock=clock)
+    index.remember([event_key("token", event) for event in events("a", "b")])
+    assert index.split("token", events("a", "b"))[2] == 2
+    assert index.split("other", events("a"))[2] == 0  # per webhook
+
+    index.remember(["token:c"])  # evicts the oldest
+    assert index.split("token", events("a", "b", "c"))[2] == 2
+    clock.now += 61
+    assert index.split("token", events("b", "c"))[2] == 0
+
+
+@pytest.fixture
+def restart(backend, monkeypatch):
+    """
+    restart(clock=time.time) gives the app a new dedup index, which only has
+    the SeenEvent table to go by, as after a restart or in another worker.
+    """
+    def new_index(clock=time.time):
+        monkeypatch.setattr(backend, "dedup", DedupIndex(app=backend.app, clock=clock))
+    return new_index
+
+
+def accepted_ids(backend, token):
+    page, _ = backend.history.query(token=token)
+    return sorted(record["telemetryEventId"] for record in page)
+
+
+def test_repeat_inside_a_payload(client, connection):
+    token = connection("slack")
+    payload = make_payload(2)
+    payload["telemetryEvents"].append(payload["telemetryEvents"][0])
+    response = client.post(f"/api/slack/{token}", json=payload)
+    assert response.status_code == 202
+    assert response.json["accepted"] == 2
+    assert response.json["duplicates"] == 1
+    assert response.json["messages"] == 2
+
+
+def test_repeat_across_payloads(client, connection):
+    token = connection("slack")
+    payload = make_payload(2)
+    assert client.post(f"/api/slack/{token}", json=payload).json["accepted"] == 2
+    response = client.post(f"/api/slack/{token}", json=payload)
+    assert response.status_code == 202
+    assert response.json == {"accepted": 0, "rejected": 0, "duplicates": 2, "messages": 0, "errors": []}
+
+
+def test_repeat_after_a_restart(backend, client, connection, restart):
+    token = connection("slack")
+    first = make_payload(2)
+    assert client.post(f"/api/slack/{token}", json=first).json["accepted"] == 2
+
+    restart()
+    # One repeat and one new event: only the new one is written
+    payload = make_payload(1)
+    payload["telemetryEvents"].append(first["telemetryEvents"][1])
+    response = client.post(f"/api/slack/{token}", json=payload)
+    assert response.status_code == 202
+    assert response.json == {"accepted": 1, "rejected": 0, "duplicates": 1, "messages": 1, "errors": []}
+    ids = [event["telemetryEventId"] for event in first["telemetryEvents"] + payload["telemetryEvents"][:1]]
+    assert accepted_ids(backend, token) == sorted(ids)
+
+    # Now remembered in memory again
+    assert client.post(f"/api/slack/{token}", json=payload).json["duplicates"] == 2
+
+
+def test_expired_key_is_accepted_again(backend, client, connection, restart):
+    token = connection("slack")
+    payload = make_payload(1)
+    assert client.post(f"/api/slack/{token}", json=payload).json["accepted"] == 1
+
+    restart(clock=lambda: time.time() + backend.dedup.window + 1)
+    response = client.post(f"/api/slack/{token}", json=payload)
+    assert response.json["accepted"] == 1
+    assert response.json["duplicates"] == 0
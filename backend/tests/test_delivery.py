@@ -0,0 +1,82 @@
+"""
+Delivery queue: messages go out one by one while the rate limiter lets
+them through, and are coalesced into digests once it holds them back.
+"""
+import asyncio
+import threading
+
+import pytest
+
+from async_delivery import AsyncDispatcher
+from delivery import DeliveryJob, DeliveryQueue
+
+
+def jobs(count, token="token"):
+    return [DeliveryJob(n, token, "slack", None, f"event {n}".encode(), 0, {"n": n}) for n in range(count)]
+
+
+def coalesce(platform, events):
+    return ",".join(str(event["n"]) for event in events).encode(), len(events)
+
+
+class Recorder:
+    def __init__(self, expected):
+        self.bodies = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def send(self, job):
+        self.bodies.append(job.payload)
+        if sum(len(body.split(b",")) for body in self.bodies) >= self.expected:
+            self.done.set()
+
+    async def send_async(self, job):
+        self.send(job)
+
+
+def deliver(count, rate, burst):
+    recorder = Recorder(count)
+    queue = DeliveryQueue(recorder.send, workers=2, rate_limits={"slack": rate}, burst=burst, coalesce=coalesce)
+    assert queue.submit_many(jobs(count))
+    assert recorder.done.wait(5)
+    return recorder.bodies
+
+
+def deliver_async(count, rate, burst):
+    recorder = Recorder(count)
+
+    async def run():
+        dispatcher = AsyncDispatcher(recorder.send_async, rate_limits={"slack": rate}, burst=burst,
+                                     coalesce=coalesce).bind()
+        assert dispatcher.submit_many(jobs(count))
+        while not recorder.done.is_set():
+            await asyncio.sleep(0.01)
+    asyncio.run(asyncio.wait_for(run(), 5))
+    return recorder.bodies
+
+
+@pytest.mark.parametrize("deliver", [deliver, deliver_async])
+def test_unlimited_destination_is_not_digested(deliver):
+    assert sorted(deliver(3, rate=0, burst=1)) == [b"event 0", b"event 1", b"event 2"]
+
+
+@pytest.mark.parametrize("deliver", [deliver, deliver_async])
+def test_burst_is_posted_one_by_one(deliver):
+    assert sorted(deliver(3, rate=1, burst=3)) == [b"event 0", b"event 1", b"event 2"]
+
+
+@pytest.mark.parametrize("deliver", [deliver, deliver_async])
+def test_backlog_behind_the_limiter_is_digested(deliver):
+    # One token at once: the first event goes out alone, the rest wait and are combined
+    assert deliver(4, rate=20, burst=1) == [b"event 0", b"1,2,3"]
+
+
+def test_drain_returns_queued_jobs():
+    recorder = Recorder(1)
+    queue = DeliveryQueue(recorder.send, workers=1, rate_limits={"slack": 0.001}, coalesce=coalesce)
+    assert queue.submit_many(jobs(3))
+    assert recorder.done.wait(5)
+    left = queue.drain(0.1)
+    assert [job.id for job in left] == [1, 2]
+    assert queue.depth() == 0
+    assert not queue.submit_many(jobs(1))
@@ -0,0 +1,134 @@
+"""
+Event history: outcomes are counted on the row of the event they belong to,
+pages are read newest first by keyset and old rows are compacted away.
+"""
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.exc import OperationalError
+
+from delivery import DeliveryJob
+from history import EventHistory
+from models import db, EventRecord
+from outbox import Outbox
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def event(event_id=None, account="tests", object_type="Zone"):
+    event = {"accountName": account, "telemetryEventType": "ZONE_CHANGE",
+             "telemetryEvent": {"objectType": object_type, "changeType": "UPDATE", "object": "example.com."}}
+    if event_id is not None:
+        event["telemetryEventId"] = event_id
+    return event
+
+
+def store(app, history, token, events):
+    with app.app_context():
+        db.session.execute(insert(EventRecord), history.rows(token, [(event, 1) for event in events]))
+        db.session.commit()
+
+
+def add(outbox, history, events):
+    """
+    Ingest one payload of `events`, each rendered once.
+    """
+    rows = history.rows("token", [(sent, 1) for sent in events])
+    return outbox.add_batch([("token", "generic", b"{}", sent) for sent in events], history=list(zip(events, rows)))
+
+
+def statuses(history, **filters):
+    page, _ = history.query(**filters)
+    return [record["status"] for record in reversed(page)]
+
+
+def test_outcomes_are_counted_on_their_own_row(app):
+    history = EventHistory(app)
+    outbox = Outbox(app, history=history)
+    # A re-sent id and an event without one; each has its own row
+    events = [event("repeated"), event("repeated"), event()]
+    jobs = add(outbox, history, events)
+    outbox.delivered(jobs[0])
+    history.flush()
+    assert statuses(history) == ["delivered", "queued", "queued"]
+
+    outbox.delivered(jobs[2])
+    history.flush()
+    assert statuses(history) == ["delivered", "queued", "delivered"]
+
+
+def test_dead_letter_marks_the_event_failed(app):
+    history = EventHistory(app)
+    outbox = Outbox(app, history=history)
+    job, = add(outbox, history, [event("dead")])
+    outbox.failed(job, ValueError("rejected"))
+    history.flush()
+    assert statuses(history) == ["failed"]
+
+
+def test_failed_flush_keeps_the_outcomes(app):
+    history = EventHistory(app)
+    store(app, history, "token", [event("a")])
+    record_id = history.query()[0][0]["id"]
+    history.delivered(DeliveryJob(1, "token", "generic", None, b"{}", 0, None, history_id=record_id))
+
+    with app.app_context():
+        db.session.execute(text("ALTER TABLE event_history RENAME TO moved"))
+        db.session.commit()
+    with pytest.raises(OperationalError):
+        history.flush()
+    with app.app_context():
+        db.session.execute(text("ALTER TABLE moved RENAME TO event_history"))
+        db.session.commit()
+
+    history.flush()
+    assert statuses(history) == ["delivered"]
+
+
+def test_keyset_pages(app):
+    history = EventHistory(app)
+    store(app, history, "token", [event(str(n), account=f"account{n % 2}") for n in range(7)])
+
+    ids, cursor = [], None
+    while True:
+        page, cursor = history.query(limit=3, cursor=cursor)
+        ids.append([record["telemetryEventId"] for record in page])
+        if cursor is None:
+            break
+    assert ids == [["6", "5", "4"], ["3", "2", "1"], ["0"]]
+
+    page, cursor = history.query(account="account1", limit=2)
+    assert [record["telemetryEventId"] for record in page] == ["5", "3"]
+    page, cursor = history.query(account="account1", limit=2, cursor=cursor)
+    assert [record["telemetryEventId"] for record in page] == ["1"]
+    assert cursor is None
+
+
+def test_time_window_and_filters(app):
+    clock = Clock()
+    history = EventHistory(app, clock=clock)
+    store(app, history, "token", [event("old")])
+    clock.now += 60
+    store(app, history, "other", [event("new", object_type="Record")])
+
+    assert [r["telemetryEventId"] for r in history.query(since=clock.now)[0]] == ["new"]
+    assert [r["telemetryEventId"] for r in history.query(until=clock.now)[0]] == ["old"]
+    assert [r["telemetryEventId"] for r in history.query(token="token")[0]] == ["old"]
+    assert [r["telemetryEventId"] for r in history.query(object_type="Record")[0]] == ["new"]
+
+
+def test_compaction_applies_retention_and_the_row_cap(app):
+    clock = Clock()
+    history = EventHistory(app, retention=100, max_rows=3, clock=clock)
+    store(app, history, "token", [event("expired")])
+    clock.now += 101
+    store(app, history, "token", [event(str(n)) for n in range(5)])
+
+    assert history.compact() == 3
+    assert [r["telemetryEventId"] for r in history.query()[0]] == ["4", "3", "2"]
+    assert history.compact() == 0
@@ -0,0 +1,66 @@
+"""
+Payload parsing: a body is accepted or rejected alike whether it is parsed
+in memory or streamed.
+"""
+import asyncio
+import io
+import json
+
+import pytest
+
+from ingest import OMITTED_KEY, InvalidPayload, read_payload, read_payload_async
+
+IN_MEMORY = 10 ** 9
+STREAMED = 0
+
+
+def parse(body, stream_above, max_changes=1000):
+    return read_payload(io.BytesIO(body), len(body), len(body), max_changes, stream_above)
+
+
+def parse_async(body, stream_above, max_changes=1000):
+    chunks = iter([body[i:i + 7] for i in range(0, len(body), 7)] + [b""])
+
+    async def receive_chunk():
+        return next(chunks)
+    return asyncio.run(read_payload_async(receive_chunk, None, len(body), max_changes, stream_above))
+
+
+@pytest.mark.parametrize("stream_above", [IN_MEMORY, STREAMED])
+@pytest.mark.parametrize("number", ["12345678901234567890", "-99999999999999999999999", "1.5e400"])
+def test_numbers_beyond_64_bits(stream_above, number):
+    body = f'{{"telemetryEvents": [{{"telemetryEventType": "ZONE_CHANGE", "n": {number}}}]}}'.encode()
+    assert parse(body, stream_above) == json.loads(body)["telemetryEvents"]
+
+
+def test_numbers_beyond_64_bits_async():
+    body = b'{"telemetryEvents": [{"n": 12345678901234567890}]}'
+    assert parse_async(body, STREAMED) == [{"n": 12345678901234567890}]
+
+
+@pytest.mark.parametrize("stream_above", [IN_MEMORY, STREAMED])
+@pytest.mark.parametrize("body, error", [
+    (b"{not json", "Invalid request format"),
+    (b"[]", "Invalid request format"),
+    (b'{"telemetryEvents": {}}', "Invalid telemetryEvents format"),
+    (b'{"telemetryEvents": []}', "Invalid telemetryEvents format"),
+])
+def test_invalid_bodies(stream_above, body, error):
+    with pytest.raises(InvalidPayload, match=error):
+        parse(body, stream_above)
+
+
+@pytest.mark.parametrize("stream_above", [IN_MEMORY, STREAMED])
+def test_changes_are_truncated(stream_above):
+    changes = [{"value": f"host{n}", "to": n} for n in range(10)]
+    body = json.dumps({"telemetryEvents": [{"telemetryEvent": {"detail": {"changes": changes}}}]}).encode()
+    detail = parse(body, stream_above, max_changes=4)[0]["telemetryEvent"]["detail"]
+    assert detail["changes"] == changes[:4]
+    assert detail[OMITTED_KEY] == 6
+
+
+def test_too_large():
+    body = b'{"telemetryEvents": [{}]}'
+    with pytest.raises(InvalidPayload) as error:
+        read_payload(io.BytesIO(body), None, len(body) - 1, 1000, STREAMED)
+    assert error.value.status == 413
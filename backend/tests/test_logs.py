@@ -0,0 +1,21 @@
+"""
+Log redaction: webhook URL paths and connection tokens never reach the log.
+"""
+import pytest
+
+from logs import redact
+
+TOKEN = "0b6f4a8e-0d4c-4a54-9a5e-6a3c1f8e2b11"
+
+
+@pytest.mark.parametrize("line, redacted", [
+    (f"POST /api/slack/{TOKEN} 202", "POST /api/slack/0b6f4a8e… 202"),
+    (f"POST /api/any-platform/{TOKEN}?x=1", "POST /api/any-platform/0b6f4a8e…?x=1"),
+    (f"DELETE /api/webhooks/{TOKEN.upper()}/routes/3", "DELETE /api/webhooks/0B6F4A8E…/routes/3"),
+    ("POST /api/webhooks/dead-letters/4/replay", "POST /api/webhooks/dead-letters/4/replay"),
+    ("posting to https://hooks.slack.com/services/T0/B0/secret failed",
+     "posting to https://hooks.slack.com/… failed"),
+    ("nothing to hide", "nothing to hide"),
+])
+def test_redact(line, redacted):
+    assert redact(line) == redacted
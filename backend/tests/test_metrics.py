@@ -0,0 +1,71 @@
+"""
+/metrics is public unless METRICS_PUBLIC is false, then it needs
+METRICS_TOKEN, and never reveals the webhook tokens that authorize ingest.
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+from conftest import BACKEND_DIR
+from helpers import make_payload
+from metrics import token_label
+
+# One gunicorn worker: counts an event, sets a gauge and prints what all workers add up to
+WORKER = textwrap.dedent(f"""
+    import sys
+    sys.path.insert(0, {BACKEND_DIR!r})
+    from metrics import CIRCUIT_STATE, EVENTS_RECEIVED, merged
+    EVENTS_RECEIVED.labels("abc", "ZONE_CHANGE").inc()
+    CIRCUIT_STATE.labels("abc").set(int(sys.argv[1]))
+    received, states = merged(EVENTS_RECEIVED, CIRCUIT_STATE)
+    print(int(received[0][1]), int(states[0][1]))
+""")
+
+
+def test_metrics_are_public_by_default(client):
+    assert client.get("/metrics").status_code == 200
+
+
+def test_metrics_token_when_not_public(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, "METRICS_PUBLIC", False)
+    monkeypatch.setattr(backend, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    # The frontend's API token, served by /api/init, is not enough
+    assert client.get("/metrics", headers={"X-Api-Token": backend.INTERNAL_API_TOKEN}).status_code == 403
+    response = client.get("/metrics", headers={"Authorization": f"Bearer {backend.INTERNAL_API_TOKEN}"})
+    assert response.status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+
+def test_metrics_closed_without_a_token(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, "METRICS_PUBLIC", False)
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 403
+
+
+def test_metrics_label_webhooks_by_hash(backend, client, connection):
+    token = connection("slack")
+    assert client.post(f"/api/slack/{token}", json=make_payload(1)).status_code == 202
+    response = client.get("/metrics")
+    assert token not in response.text
+    assert f'webhook="{token_label(token)}"' in response.text
+    assert backend.webhook_stats()[token_label(token)]["received"] == 1
+
+
+def test_outbox_rows_counted_on_scrape(client):
+    response = client.get("/metrics")
+    assert 'notifier_outbox_rows{state="pending"}' in response.text
+    assert 'notifier_outbox_rows{state="inflight"}' in response.text
+
+
+def test_workers_metrics_add_up(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+
+    def worker(state):
+        output = subprocess.run([sys.executable, "-c", WORKER, str(state)], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        return output.split()
+    assert worker(2) == ["1", "2"]
+    # Counters add up, circuit gauges report the worst process
+    assert worker(0) == ["2", "2"]
@@ -0,0 +1,21 @@
+"""
+Schema migrations: a new database is created current in one step, and a
+current one is left alone.
+"""
+from sqlalchemy import create_engine, inspect
+
+from migrations import LATEST, migrate, pending, schema_version
+from models import db
+
+
+def test_new_database_is_created_current(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'data.db'}")
+    assert pending(engine) == [(1, "create tables")]
+    assert migrate(engine) == [1]
+    assert set(inspect(engine).get_table_names()) == set(db.metadata.tables)
+    with engine.connect() as connection:
+        assert schema_version(connection) == LATEST == 1
+
+    assert migrate(engine) == []
+    assert pending(engine) == []
+    engine.dispose()
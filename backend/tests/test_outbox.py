@@ -0,0 +1,53 @@
+"""
+Outbox leases: rows a process holds stay its own while it runs, and a
+worker whose rows were claimed again elsewhere cannot ack or reschedule them.
+"""
+import time
+
+import requests
+from sqlalchemy import select, update
+
+from models import db, OutboxEvent
+from outbox import Outbox
+
+
+def add(outbox, count=2):
+    return outbox.add_batch([("token", "generic", b"{}", {"n": n}) for n in range(count)])
+
+
+def expire(app):
+    with app.app_context():
+        db.session.execute(update(OutboxEvent).values(lease_until=time.time() - 1))
+        db.session.commit()
+
+
+def rows(app):
+    with app.app_context():
+        return db.session.execute(select(OutboxEvent.id, OutboxEvent.owner)).all()
+
+
+def test_renewed_leases_are_not_reclaimed(app):
+    holder, other = Outbox(app), Outbox(app)
+    add(holder)
+    expire(app)
+    holder.renew_leases(force=True)
+    assert other.claim_due(10) == []
+
+
+def test_stale_holder_cannot_ack_or_reschedule(app):
+    holder, other = Outbox(app), Outbox(app)
+    stale = add(holder)
+    expire(app)
+    claimed = other.claim_due(10)
+    assert [job.id for job in claimed] == [job.id for job in stale]
+
+    holder.failed(stale[0], requests.ConnectionError("timeout"))
+    holder.delivered(stale[1])
+    holder.flush_acks()
+    holder.release(stale)
+    assert rows(app) == [(job.id, job.claim) for job in claimed]
+
+    for job in claimed:
+        other.delivered(job)
+    other.flush_acks()
+    assert rows(app) == []
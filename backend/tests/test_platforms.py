@@ -0,0 +1,131 @@
+"""
+Platforms: every built-in platform renders within its size limits, splitting
+a large event into parts that each fit.
+"""
+import json
+
+import pytest
+
+from digest import SLACK_MAX_SECTION_TEXT, TEAMS_MAX_TEXT, slack_digest, slack_fits, teams_digest, teams_fits
+from platforms import BUILTIN_PLATFORMS, Platform, Platforms
+from renderer import DEFAULT_TEMPLATES, Renderer
+from splitter import Parts
+
+# Discord: at most 25 fields and 6000 characters per embed
+DISCORD_MAX_FIELDS = 25
+
+
+@pytest.fixture(scope="module")
+def platforms():
+    return Platforms(Renderer.from_files(DEFAULT_TEMPLATES))
+
+
+def event(changes=0, value_size=20, n=0):
+    event = {
+        "accountName": "acme",
+        "telemetryEventId": f"id-{n}",
+        "telemetryEventType": "ZONE_CHANGE",
+        "telemetryEventTime": "2025-01-21 10:00:00.000",
+        "telemetryEvent": {"objectType": "Zone", "changeType": "IMPORT", "object": f"example{n}.com."},
+    }
+    if changes:
+        event["telemetryEvent"]["detail"] = {"changes": [
+            {"value": f"host{i}.example.com.", "from": "-", "to": "x" * value_size} for i in range(changes)]}
+    return event
+
+
+def discord_embed(body):
+    embed, = json.loads(body)["embeds"]
+    return embed
+
+
+def test_small_events_render_to_one_body(platforms):
+    for name in platforms.names():
+        bodies = platforms.render_many(name, [event(n=1), event(changes=3, n=2)])
+        assert all(type(body) is bytes for body in bodies)
+        assert len(bodies) == 2
+
+
+def test_discord_split_respects_fields_and_bytes(platforms):
+    limit = platforms.get("discord").max_bytes
+    body, = platforms.render_many("discord", [event(changes=60)])
+    assert isinstance(body, Parts) and len(body) == 4
+    for part in body:
+        embed = discord_embed(part)
+        assert len(part) <= limit
+        assert len(embed["fields"]) <= DISCORD_MAX_FIELDS
+    assert discord_embed(body[0])["fields"][7] == {"name": "Part", "value": "1 of 4, changes 1-17 of 60",
+                                                  "inline": False}
+
+
+def test_discord_split_by_size(platforms):
+    limit = platforms.get("discord").max_bytes
+    body, = platforms.render_many("discord", [event(changes=10, value_size=900)])
+    assert isinstance(body, Parts) and len(body) > 1
+    assert all(len(part) <= limit for part in body)
+    changes = sum(len(discord_embed(part)["fields"]) - 8 for part in body)
+    assert changes == 10
+
+
+def test_generic_split_keeps_the_ultradns_format(platforms):
+    limit = platforms.get("generic").max_bytes
+    body, = platforms.render_many("generic", [event(changes=30, value_size=60000)])
+    assert isinstance(body, Parts) and len(body) > 1
+    listed = []
+    for part in body:
+        assert len(part) <= limit
+        sent, = json.loads(part)["telemetryEvents"]
+        assert sent["telemetryEventId"] == "id-0"
+        listed.extend(change["value"] for change in sent["telemetryEvent"]["detail"]["changes"])
+    assert listed == [f"host{i}.example.com." for i in range(30)]
+
+
+def test_render_many_keeps_event_order(platforms):
+    events = [event(n=0), event(changes=60, n=1), event(n=2)]
+    bodies = platforms.render_many("discord", events)
+    assert [type(body) for body in bodies] == [bytes, Parts, bytes]
+    assert "example2.com." in bodies[2].decode()
+
+
+def test_parts_are_capped(platforms):
+    capped = Platforms(Renderer.from_files(DEFAULT_TEMPLATES), max_parts=2)
+    body, = capped.render_many("discord", [event(changes=60)])
+    assert len(body) == 2
+    assert discord_embed(body[-1])["fields"][7]["value"] == "2 of 2, changes 18-34 of 60; 26 more not shown"
+
+
+def test_oversized_event_without_changes_is_left_whole(platforms):
+    large = event()
+    large["telemetryEvent"]["object"] = "x" * 7000
+    body, = platforms.render_many("discord", [large])
+    assert type(body) is bytes
+
+
+def test_platform_needs_a_renderer():
+    with pytest.raises(ValueError, match="No message template"):
+        Platforms(Renderer.from_files(DEFAULT_TEMPLATES), platforms=[Platform("pager", "Pager")])
+    assert {platform.name for platform in BUILTIN_PLATFORMS} == {"slack", "teams", "discord", "generic"}
+
+
+def test_digest_caps_a_huge_object_name(platforms):
+    large = event()
+    large["telemetryEvent"]["object"] = "x" * 5000
+    slack = slack_digest([event(n=1), large])
+    assert all(len(block["text"]["text"]) <= SLACK_MAX_SECTION_TEXT for block in slack["blocks"])
+    assert slack_fits(slack)
+
+    teams = teams_digest([event(n=1), large])
+    fact = teams["attachments"][0]["content"]["body"][2]["facts"][1]
+    assert len(fact["value"]) == TEAMS_MAX_TEXT and fact["value"].endswith("…")
+    assert teams_fits(teams)
+
+    for name in ("slack", "teams"):
+        body, count = platforms.coalesce(name, [event(n=1), large])
+        assert count == 2
+
+
+def test_teams_fits_checks_the_length_of_texts():
+    teams = teams_digest([event()])
+    assert teams_fits(teams)
+    teams["attachments"][0]["content"]["body"][2]["facts"][0]["value"] = "x" * (TEAMS_MAX_TEXT + 1)
+    assert not teams_fits(teams)
@@ -0,0 +1,111 @@
+"""
+Rate limits: worker processes share one token bucket per destination in the
+database, so a destination gets its full rate whichever process holds its
+backlog, and never more in total.
+"""
+import functools
+import threading
+import time
+
+import pytest
+
+from delivery import DeliveryJob, DeliveryQueue
+from models import db
+from ratelimit import SharedTokenBucket, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def engine(app):
+    with app.app_context():
+        return db.engine
+
+
+def test_buckets_of_two_processes_draw_from_the_same_tokens(engine):
+    clock = Clock()
+    first, second = (SharedTokenBucket(engine, "token", rate=2, clock=clock) for _ in range(2))
+    assert first.take() == 0
+    assert second.take() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert second.take() == 0
+    assert first.take() == pytest.approx(0.5)
+
+
+def test_burst(engine):
+    clock = Clock()
+    bucket = SharedTokenBucket(engine, "token", rate=1, burst=3, clock=clock)
+    assert [bucket.take() for _ in range(4)] == [0, 0, 0, pytest.approx(1)]
+    clock.now += 100  # refills up to the burst only
+    assert [bucket.take() for _ in range(4)] == [0, 0, 0, pytest.approx(1)]
+
+
+def test_pause_holds_back_every_process(engine):
+    clock = Clock()
+    first, second = (SharedTokenBucket(engine, "token", rate=10, clock=clock) for _ in range(2))
+    first.pause(5)
+    assert second.take() == pytest.approx(5)
+    clock.now += 5
+    assert second.take() == pytest.approx(0.1)  # empty after the pause
+    clock.now += 0.1
+    assert second.take() == 0
+
+
+def test_destinations_are_limited_separately(engine):
+    clock = Clock()
+    assert SharedTokenBucket(engine, "token", rate=1, clock=clock).take() == 0
+    assert SharedTokenBucket(engine, "token/1", rate=1, clock=clock).take() == 0
+
+
+def test_unlimited_destination_skips_the_database():
+    bucket = SharedTokenBucket(None, "token", rate=0)
+    assert bucket.take() == 0
+    bucket.pause(5)
+    assert bucket.take() == 0
+
+
+def test_matches_the_in_process_bucket(engine):
+    clock = Clock()
+    shared = SharedTokenBucket(engine, "token", rate=4, burst=2, clock=clock)
+    local = TokenBucket(rate=4, burst=2, clock=clock)
+    for step in (0, 0, 0, 0.1, 0.3, 0, 1.0, 0, 0, 0):
+        clock.now += step
+        assert shared.take() == pytest.approx(local.take())
+
+
+def post_all(engine, processes, count):
+    """
+    Seconds for `processes` delivery queues, each with its share of `count`
+    messages to one destination at 20/s, to post them all.
+    """
+    posted = []
+    done = threading.Event()
+
+    def send(job):
+        posted.append(job.id)
+        if len(posted) == count:
+            done.set()
+    queues = [DeliveryQueue(send, workers=2, rate_limits={"generic": 20},
+                            buckets=functools.partial(SharedTokenBucket, engine)) for _ in range(processes)]
+    share = count // processes
+    start = time.monotonic()
+    for i, queue in enumerate(queues):
+        assert queue.submit_many([DeliveryJob(i * share + n, "token", "generic", None, b"{}", 0, None)
+                                  for n in range(share)])
+    assert done.wait(10)
+    return time.monotonic() - start
+
+
+def test_one_process_with_the_whole_backlog_gets_the_full_rate(engine):
+    # The first goes at once, the other 19 within a second
+    assert post_all(engine, 1, 20) < 1.5
+
+
+def test_processes_together_stay_within_the_rate(engine):
+    assert post_all(engine, 2, 20) >= 0.9
@@ -0,0 +1,99 @@
+"""
+Routes: filters are validated up front, and an event fans out to exactly the
+destinations whose filters accept it, rendered once per platform.
+"""
+import pytest
+
+from routing import Destination, RouteTable, connection_token, route_key, validate_filters
+from splitter import Parts
+
+
+def zone_event(event_type="ZONE_CHANGE", object_type="Zone", change_type="UPDATE", account="acme"):
+    return {"telemetryEventType": event_type, "accountName": account,
+            "telemetryEvent": {"objectType": object_type, "changeType": change_type}}
+
+
+def destination(name, platform="slack"):
+    return Destination(route_key("token", name), platform, f"https://hooks.example/{name}")
+
+
+@pytest.mark.parametrize("filters, normalized", [
+    (None, {}),
+    ({}, {}),
+    ({"objectType": "Zone"}, {"objectType": ["Zone"]}),
+    ({"accountName": ["a", "b"], "changeType": "CREATE"}, {"accountName": ["a", "b"], "changeType": ["CREATE"]}),
+])
+def test_valid_filters(filters, normalized):
+    assert validate_filters(filters) == normalized
+
+
+@pytest.mark.parametrize("filters, error", [
+    (["objectType"], "must be an object"),
+    ({"user": "me"}, "Cannot filter on user"),
+    ({"objectType": []}, "must be a string or a list of strings"),
+    ({"objectType": ["Zone", 1]}, "must be a string or a list of strings"),
+    ({"objectType": {"in": "Zone"}}, "must be a string or a list of strings"),
+])
+def test_invalid_filters(filters, error):
+    with pytest.raises(ValueError, match=error):
+        validate_filters(filters)
+
+
+def test_destination_keys():
+    assert connection_token("token") == "token"
+    assert connection_token(route_key("token", 7)) == "token"
+
+
+@pytest.fixture
+def table():
+    return RouteTable([
+        (destination("all"), {}),
+        (destination("zones"), {"telemetryEventType": ["ZONE_CHANGE"]}),
+        (destination("acme-records", "teams"), {"objectType": ["Record"], "accountName": ["acme"]}),
+        (destination("creates", "teams"), {"changeType": ["CREATE", "DELETE"]}),
+    ])
+
+
+@pytest.mark.parametrize("event, names", [
+    (zone_event(), ["all", "zones"]),
+    (zone_event(object_type="Record"), ["all", "zones", "acme-records"]),
+    (zone_event(object_type="Record", account="other"), ["all", "zones"]),
+    (zone_event("USER_CHANGE", change_type="DELETE"), ["all", "creates"]),
+    ({"telemetryEventType": 5, "telemetryEvent": "broken"}, ["all"]),  # non-strings match no filter
+])
+def test_match(table, event, names):
+    assert [d.key.partition("/")[2] for d in table.select(table.match(event))] == names
+
+
+def test_fan_out_renders_once_per_platform(table):
+    calls = []
+
+    def render_many(platform, events):
+        calls.append((platform, len(events)))
+        return [f"{platform}:{event['telemetryEvent']['objectType']}".encode() for event in events]
+
+    events = [zone_event(), zone_event(object_type="Record", change_type="CREATE"), zone_event("USER_CHANGE")]
+    entries = table.fan_out(events, render_many)
+    assert sorted(calls) == [("slack", 3), ("teams", 1)]
+    assert [(key.partition("/")[2], payload) for key, _, payload, _ in entries] == [
+        ("all", b"slack:Zone"), ("zones", b"slack:Zone"),
+        ("all", b"slack:Record"), ("zones", b"slack:Record"),
+        ("acme-records", b"teams:Record"), ("creates", b"teams:Record"),
+        ("all", b"slack:Zone"),
+    ]
+    assert entries[2][3] is events[1]
+
+
+def test_fan_out_posts_every_part_of_a_split_event():
+    table = RouteTable([(destination("all"), {})])
+    entries = table.fan_out([zone_event()], lambda platform, events: [Parts((b"1", b"2", b"3"))])
+    assert [payload for _, _, payload, _ in entries] == [b"1", b"2", b"3"]
+
+
+def test_more_routes_than_bits_in_a_word():
+    routes = [(destination(str(n)), {"accountName": [f"account{n}"]}) for n in range(100)]
+    routes.append((destination("catch-all"), {}))
+    table = RouteTable(routes)
+    matched = table.select(table.match(zone_event(account="account77")))
+    assert [d.key for d in matched] == [route_key("token", 77), route_key("token", "catch-all")]
+    assert table.select(table.match(zone_event(account="nobody"))) == [table.get(route_key("token", "catch-all"))]
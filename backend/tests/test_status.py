@@ -0,0 +1,104 @@
+"""
+The dashboard's status endpoints are served from the in-memory status board:
+an idle dashboard, polling or streaming, causes no database queries.
+"""
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from shutdown import Shutdown
+
+
+@pytest.fixture
+def statements(backend):
+    """
+    Every statement the test client's requests executed while the test runs.
+    They are served on the test's thread; the outbox, history and delivery
+    threads keep their own schedule, and deliveries of other tests may still
+    be running.
+    """
+    executed = []
+    thread = threading.get_ident()
+
+    def record(connection, cursor, statement, *args):
+        if threading.get_ident() == thread:
+            executed.append(statement)
+    with backend.app.app_context():
+        engine = backend.db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def dashboard(backend, client, stub):
+    """
+    A logged-in frontend client with a webhook set up.
+    """
+    client.environ_base["HTTP_X_API_TOKEN"] = backend.INTERNAL_API_TOKEN
+    assert client.post("/api/login", json={"password": "test"}).status_code == 200
+    response = client.post("/api/setup", json={"webhook_url": stub.url, "platform": "teams"})
+    assert response.status_code == 200
+    return client
+
+
+def read_events(stream, count):
+    """
+    The next `count` messages of a server-sent event stream, comments included.
+    """
+    messages = []
+    buffer = ""
+    chunks = iter(stream.response)
+    while len(messages) < count:
+        chunk = next(chunks)
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        *complete, buffer = buffer.split("\n\n")
+        messages.extend(complete)
+    return messages
+
+
+def test_polling_runs_no_queries(dashboard, statements):
+    # The first reads may load the snapshot after the setup changed
+    for _ in range(2):
+        assert dashboard.get("/api/status").status_code == 200
+        assert dashboard.get("/api/setup").status_code == 200
+    statements.clear()
+
+    for _ in range(20):
+        assert dashboard.get("/api/status").status_code == 200
+        assert dashboard.get("/api/setup").status_code == 200
+    assert statements == []
+
+
+def test_idle_stream_runs_no_queries(dashboard, statements):
+    dashboard.get("/api/status")
+    stream = dashboard.get("/api/status/stream", buffered=False)
+    try:
+        assert stream.status_code == 200
+        assert stream.mimetype == "text/event-stream"
+        first = read_events(stream, 2)
+        assert first[0].startswith("retry:")
+        assert "event: status" in first[1]
+        statements.clear()
+
+        # A second of checks at STATUS_STREAM_INTERVAL=0.1; stats moved by
+        # deliveries of other tests are pushed without querying either
+        read_events(stream, 10)
+        assert statements == []
+    finally:
+        stream.close()
+
+
+def test_stream_ends_when_draining(backend, dashboard, monkeypatch):
+    monkeypatch.setattr(backend, "shutdown", Shutdown())
+    stream = dashboard.get("/api/status/stream", buffered=False)
+    try:
+        read_events(stream, 2)
+        backend.shutdown.begin()
+        # Runs out within STATUS_STREAM_INTERVAL instead of blocking forever
+        for _ in stream.response:
+            pass
+    finally:
+        stream.close()
+    assert dashboard.get("/api/status/stream").status_code == 503
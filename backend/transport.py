@@ -0,0 +1,221 @@
+"""
+Shared HTTP connection pools for outbound webhook posts.
+
+Each destination host (hooks.slack.com, discord.com, ...) gets its own
+pooled client, so consecutive notifications reuse an open TCP+TLS connection
+instead of paying a new handshake every time.
+
+The HTTP client libraries are imported on first use rather than with the
+app, which then starts faster; warm() loads them ahead of the first post.
+"""
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from metrics import HTTP_SECONDS
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def parse_retry_after(response):
+    """
+    Return the Retry-After header of a response in seconds, or None.
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _requests_error(error):
+    """
+    Translate an httpx transport error to the matching `requests` exception.
+    """
+    import httpx
+    import requests
+    if isinstance(error, httpx.TimeoutException):
+        return requests.Timeout(str(error))
+    return requests.ConnectionError(str(error))
+
+
+def _check_status(response, url):
+    if response.status_code >= 400:
+        import requests
+        raise requests.HTTPError(f"{response.status_code} Error for url: {url}", response=response)
+    return response
+
+
+class HttpTransport:
+    """
+    Per-host pool of keep-alive HTTP clients.
+
+    - `pool_size` is the maximum number of open connections per host.
+    - `connect_timeout`/`read_timeout` bound every request, in seconds.
+    - `keepalive=False` closes the connection after each request.
+    - `http2=True` uses httpx with HTTP/2 multiplexing instead of requests.
+    - `headers` maps a platform to the headers its jobs are posted with.
+
+    Errors are always raised as `requests` exceptions so callers can classify
+    them the same way regardless of the client in use.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=5.0, read_timeout=10.0,
+                 keepalive=True, http2=False, verify=True, headers=None):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.keepalive = keepalive
+        self.http2 = http2
+        self.verify = verify
+        self.headers = headers or {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _client_for(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._new_client()
+                    self._clients[key] = client
+        return client
+
+    def _httpx_options(self):
+        import httpx
+        return {
+            "http2": self.http2,
+            "verify": self.verify,
+            "timeout": httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+            "limits": httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size if self.keepalive else 0,
+            ),
+        }
+
+    def _new_client(self):
+        if self.http2:
+            import httpx
+            return httpx.Client(**self._httpx_options())
+
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=False)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keepalive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def post(self, url, body, headers=JSON_HEADERS):
+        """
+        POST a JSON body (bytes) and raise for HTTP errors.
+        """
+        start = time.perf_counter()
+        try:
+            return self._post(url, body, headers)
+        finally:
+            HTTP_SECONDS.labels(urlsplit(url).netloc).observe(time.perf_counter() - start)
+
+    def _post(self, url, body, headers):
+        client = self._client_for(url)
+        if not self.http2:
+            response = client.post(url, data=body, headers=headers,
+                                   timeout=self.timeout, verify=self.verify)
+            response.raise_for_status()
+            return response
+
+        import httpx
+        try:
+            response = client.post(url, content=body, headers=headers)
+        except httpx.TransportError as e:
+            raise _requests_error(e) from e
+        return _check_status(response, url)
+
+    def send(self, job):
+        """
+        Deliver a DeliveryJob.
+        """
+        return self.post(job.webhook_url, job.payload, self.headers.get(job.platform, JSON_HEADERS))
+
+    def warm(self, urls=()):
+        """
+        Import the HTTP client and create the pooled clients of the hosts of
+        `urls`, so the first posts to them do not pay for it.
+        """
+        # Errors are raised as requests exceptions whichever client posts
+        import requests  # noqa: F401
+        for url in urls:
+            self._client_for(url)
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+
+class AsyncHttpTransport(HttpTransport):
+    """
+    HttpTransport for asyncio code, backed by one httpx.AsyncClient per host.
+    Takes the same options and raises the same exceptions; it must only be
+    used from a single event loop.
+
+    Posts beyond `pool_size` per host wait on a semaphore rather than in the
+    httpx pool, whose wait queue gets slow with many waiters.
+    """
+
+    def _new_client(self):
+        import httpx
+        return httpx.AsyncClient(**self._httpx_options()), asyncio.Semaphore(self.pool_size)
+
+    async def post(self, url, body, headers=JSON_HEADERS):
+        """
+        POST a JSON body (bytes) and raise for HTTP errors.
+        """
+        start = time.perf_counter()
+        try:
+            return await self._post(url, body, headers)
+        finally:
+            HTTP_SECONDS.labels(urlsplit(url).netloc).observe(time.perf_counter() - start)
+
+    async def _post(self, url, body, headers):
+        import httpx
+        client, slots = self._client_for(url)
+        try:
+            async with slots:
+                response = await client.post(url, content=body, headers=headers)
+        except httpx.TransportError as e:
+            raise _requests_error(e) from e
+        return _check_status(response, url)
+
+    async def send(self, job):
+        """
+        Deliver a DeliveryJob.
+        """
+        return await self.post(job.webhook_url, job.payload, self.headers.get(job.platform, JSON_HEADERS))
+
+    def warm(self, urls=()):
+        """
+        Import the HTTP client libraries. The clients themselves belong to
+        the event loop and are created on first use.
+        """
+        import httpx  # noqa: F401
+        import requests  # noqa: F401
+
+    async def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client, _ in clients.values():
+            await client.aclose()
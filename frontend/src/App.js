@@ -7,6 +7,7 @@ import DeleteIcon from '@mui/icons-material/Delete';
 import WebhookSetup from './WebhookSetup';
 import Authentication from './Authentication';
 import TopBar from './TopBar';
+import { subscribeStatus } from './statusStream';
 import theme from './theme';
 
 function App() {
@@ -42,6 +43,16 @@ function App() {
     }
   }, [isGuiDisabled]);
 
+  // Follow status changes pushed by the backend while logged in
+  useEffect(() => {
+    if (loggedIn) {
+      return subscribeStatus((data) => {
+        setStatus(data);
+        setLoggedIn(data.logged_in);
+      });
+    }
+  }, [loggedIn]);
+
   // Function to fetch the API token
   const fetchApiToken = async () => {
     try {
@@ -162,7 +173,7 @@ function App() {
           {!loggedIn || (status && !status.has_admin_password) ? (
             <Authentication status={status} onLoginSuccess={fetchStatus} />
           ) : showSetup ? (
-            <WebhookSetup onComplete={handleSetupComplete} />
+            <WebhookSetup webhooks={status.webhooks} onComplete={handleSetupComplete} />
           ) : (
             <>
               <Typography
@@ -204,6 +215,10 @@ function App() {
                         <Typography variant="body1">
                           <strong>Status:</strong> {webhook.status}
                         </Typography>
+                        <Typography variant="body1">
+                          <strong>Events:</strong> {webhook.received} received, {webhook.duplicates} duplicates,{' '}
+                          {webhook.delivered} delivered, {webhook.failed} failed
+                        </Typography>
                         <Typography variant="body1">
                           <strong>Token:</strong>{' '}
                           <Box
@@ -12,36 +12,34 @@ import {
   AccordionDetails,
 } from '@mui/material';
 import ExpandMoreIcon from '@mui/icons-material/ExpandMore';
+import WebhookIcon from '@mui/icons-material/Webhook';
 import axios from 'axios';
 
-function WebhookSetup({ onComplete }) {
+const PLATFORM_LABELS = {
+  teams: 'Teams',
+  slack: 'Slack',
+  discord: 'Discord',
+  generic: 'Generic',
+};
+
+function WebhookSetup({ webhooks, onComplete }) {
   const [platformSelected, setPlatformSelected] = useState(null);
   const [setupStep, setSetupStep] = useState(0);
   const [webhookUrl, setWebhookUrl] = useState('');
   const [endpoint, setEndpoint] = useState('');
+  const [token, setToken] = useState(null);
   const [waitingForTest, setWaitingForTest] = useState(false);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [expanded, setExpanded] = useState(false); // State to track accordion expansion
 
-  // Poll for telemetry test completion
+  // The status stream reports when test telemetry has verified the new webhook
   useEffect(() => {
-    if (waitingForTest) {
-      const interval = setInterval(async () => {
-        try {
-          const { data } = await axios.get('/api/status');
-          if (data.setup_complete) {
-            setWaitingForTest(false);
-            onComplete(); // Notify parent of setup completion
-          }
-        } catch (err) {
-          console.error(err);
-        }
-      }, 3000);
-
-      return () => clearInterval(interval);
+    if (waitingForTest && (webhooks || []).some((webhook) => webhook.token === token && webhook.status === 'verified')) {
+      setWaitingForTest(false);
+      onComplete(); // Notify parent of setup completion
     }
-  }, [waitingForTest, onComplete]);
+  }, [waitingForTest, webhooks, token, onComplete]);
 
   const submitWebhookUrl = async () => {
     setLoading(true);
@@ -58,11 +56,12 @@ function WebhookSetup({ onComplete }) {
       const { token, waiting_for_test } = response.data;
 
       setEndpoint(`${baseUrl}/api/${platformSelected}/${token}`);
+      setToken(token);
       setWaitingForTest(waiting_for_test);
       setSetupStep(2); // Move to telemetry verification
       setError(null);
     } catch (err) {
-      setError(`Failed to configure ${platformSelected} webhook`);
+      setError(`Failed to configure ${PLATFORM_LABELS[platformSelected]} webhook`);
     } finally {
       setLoading(false);
     }
@@ -170,19 +169,27 @@ function WebhookSetup({ onComplete }) {
               Slack
             </Button>
             <Button
-              variant="outlined"
-              disabled
+              variant="contained"
+              color="primary"
+              onClick={() => {
+                setPlatformSelected('discord');
+                setSetupStep(1);
+              }}
               sx={{
                 display: 'flex',
                 flexDirection: 'column',
                 alignItems: 'center',
                 width: '240px',
                 height: '120px',
-                color: 'text.disabled',
-                borderColor: 'text.disabled',
+                backgroundColor: '#e8eaf6',
+                color: '#3949ab',
                 borderRadius: '12px',
                 fontWeight: 'bold',
-                backgroundColor: '#f9f9f9',
+                '&:hover': {
+                  backgroundColor: '#c5cae9',
+                },
+                boxShadow: '0 4px 8px rgba(0, 0, 0, 0.1)',
+                transition: 'all 0.3s ease-in-out',
               }}
             >
               <img
@@ -194,7 +201,34 @@ function WebhookSetup({ onComplete }) {
                   marginBottom: '10px',
                 }}
               />
-              Discord (Coming Soon)
+              Discord
+            </Button>
+            <Button
+              variant="contained"
+              color="primary"
+              onClick={() => {
+                setPlatformSelected('generic');
+                setSetupStep(1);
+              }}
+              sx={{
+                display: 'flex',
+                flexDirection: 'column',
+                alignItems: 'center',
+                width: '240px',
+                height: '120px',
+                backgroundColor: '#f5f5f5',
+                color: '#424242',
+                borderRadius: '12px',
+                fontWeight: 'bold',
+                '&:hover': {
+                  backgroundColor: '#e0e0e0',
+                },
+                boxShadow: '0 4px 8px rgba(0, 0, 0, 0.1)',
+                transition: 'all 0.3s ease-in-out',
+              }}
+            >
+              <WebhookIcon sx={{ fontSize: '48px', marginBottom: '10px' }} />
+              Generic Webhook
             </Button>
           </Box>
         </Box>
@@ -216,13 +250,13 @@ function WebhookSetup({ onComplete }) {
               marginBottom: '16px',
             }}
           >
-            Setup {platformSelected === 'teams' ? 'Teams' : 'Slack'} Webhook
+            Setup {PLATFORM_LABELS[platformSelected]} Webhook
           </Typography>
 
           {/* Webhook URL Input */}
           <TextField
             type="text"
-            label={`${platformSelected === 'teams' ? 'Teams' : 'Slack'} Webhook URL`}
+            label={`${PLATFORM_LABELS[platformSelected]} Webhook URL`}
             value={webhookUrl}
             onChange={(e) => setWebhookUrl(e.target.value)}
             fullWidth
@@ -485,6 +519,120 @@ function WebhookSetup({ onComplete }) {
             </Accordion>
           )}
 
+          {platformSelected === 'discord' && (
+            <Accordion
+              expanded={expanded}
+              onChange={() => setExpanded(!expanded)}
+              sx={{
+                mt: 3,
+                backgroundColor: '#f8f9fa',
+                borderRadius: '8px',
+                border: '1px solid #e0e0e0',
+                boxShadow: '0px 4px 6px rgba(0, 0, 0, 0.1)',
+              }}
+            >
+              <AccordionSummary
+                expandIcon={<ExpandMoreIcon />}
+                sx={{
+                  backgroundColor: '#e8eaf6',
+                  borderBottom: '1px solid #e0e0e0',
+                  padding: '10px 16px',
+                }}
+              >
+                <Typography
+                  variant="body1"
+                  sx={{
+                    fontWeight: 'bold',
+                    color: '#3949ab',
+                  }}
+                >
+                  Instructions
+                </Typography>
+              </AccordionSummary>
+              <AccordionDetails
+                sx={{
+                  backgroundColor: '#ffffff',
+                  padding: '16px',
+                  borderRadius: '0 0 8px 8px',
+                  boxShadow: 'inset 0px 1px 2px rgba(0, 0, 0, 0.1)',
+                }}
+              >
+                <Typography
+                  variant="body2"
+                  sx={{
+                    textAlign: 'left',
+                    color: '#333',
+                    lineHeight: 1.6,
+                  }}
+                >
+                  1. Open the settings of your Discord channel ("Edit Channel")
+                  <br />
+                  2. Go to "Integrations" and click on "Webhooks"
+                  <br />
+                  3. Click on "New Webhook" and give it a name
+                  <br />
+                  4. Click on "Copy Webhook URL" and paste it above.
+                </Typography>
+              </AccordionDetails>
+            </Accordion>
+          )}
+
+          {platformSelected === 'generic' && (
+            <Accordion
+              expanded={expanded}
+              onChange={() => setExpanded(!expanded)}
+              sx={{
+                mt: 3,
+                backgroundColor: '#f8f9fa',
+                borderRadius: '8px',
+                border: '1px solid #e0e0e0',
+                boxShadow: '0px 4px 6px rgba(0, 0, 0, 0.1)',
+              }}
+            >
+              <AccordionSummary
+                expandIcon={<ExpandMoreIcon />}
+                sx={{
+                  backgroundColor: '#f5f5f5',
+                  borderBottom: '1px solid #e0e0e0',
+                  padding: '10px 16px',
+                }}
+              >
+                <Typography
+                  variant="body1"
+                  sx={{
+                    fontWeight: 'bold',
+                    color: '#424242',
+                  }}
+                >
+                  Instructions
+                </Typography>
+              </AccordionSummary>
+              <AccordionDetails
+                sx={{
+                  backgroundColor: '#ffffff',
+                  padding: '16px',
+                  borderRadius: '0 0 8px 8px',
+                  boxShadow: 'inset 0px 1px 2px rgba(0, 0, 0, 0.1)',
+                }}
+              >
+                <Typography
+                  variant="body2"
+                  sx={{
+                    textAlign: 'left',
+                    color: '#333',
+                    lineHeight: 1.6,
+                  }}
+                >
+                  Notifications are posted as JSON in the format UltraDNS sends them, e.g.{' '}
+                  <code>{'{"telemetryEvents": [...]}'}</code>, one event per request, or several
+                  when events queue up.
+                  <br />
+                  Enter the URL of any HTTPS endpoint that accepts JSON POST requests.
+                </Typography>
+              </AccordionDetails>
+            </Accordion>
+          )}
+
         </Box>
       </Container>
     );
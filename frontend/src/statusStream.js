@@ -0,0 +1,64 @@
+import axios from 'axios';
+
+// Follow /api/status through its server-sent event stream. fetch() is used
+// instead of EventSource so the X-Api-Token header can be sent. Reconnects
+// with backoff, fetching /api/status once per attempt while the stream is down.
+// Returns a function that closes the stream.
+export function subscribeStatus(onStatus) {
+  let controller = null;
+  let closed = false;
+  let delay = 1000;
+
+  const connect = async () => {
+    if (closed) return;
+    controller = new AbortController();
+    try {
+      const response = await fetch('/api/status/stream', {
+        headers: { 'X-Api-Token': axios.defaults.headers.common['X-Api-Token'] },
+        credentials: 'same-origin',
+        signal: controller.signal,
+      });
+      if (!response.ok) {
+        throw new Error(`Status stream returned ${response.status}`);
+      }
+      delay = 1000;
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        let end;
+        while ((end = buffer.indexOf('\n\n')) >= 0) {
+          const data = buffer
+            .slice(0, end)
+            .split('\n')
+            .filter((line) => line.startsWith('data:'))
+            .map((line) => line.slice(5).trim())
+            .join('\n');
+          buffer = buffer.slice(end + 2);
+          if (data) onStatus(JSON.parse(data));
+        }
+      }
+    } catch (err) {
+      if (closed) return;
+      console.error('Status stream failed:', err);
+      try {
+        const { data } = await axios.get('/api/status');
+        onStatus(data);
+      } catch (statusErr) {
+        console.error('Failed to fetch status:', statusErr);
+      }
+    }
+    if (!closed) {
+      setTimeout(connect, delay);
+      delay = Math.min(delay * 2, 30000);
+    }
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    if (controller) controller.abort();
+  };
+}